@@ -1,9 +1,65 @@
-from bot.algorithms import SummedNearestNeighbour, CodeNamesSolverAlgorithm, MeanIndividualDistance
-from bot.distance import Cosine, DotProduct
-from bot.guess import Guess
-from bot.scorer import EmbeddingScorer
-from bot.solver import SolverBuilder
-from bot.threshold import Threshold
-import bot.utils
+# Public names are imported lazily, on first access, so that `import bot` (and with it every `import bot.<module>`)
+# only costs what the caller actually uses
+import importlib
+from typing import TYPE_CHECKING
 
+_EXPORTS = {
+    "SummedNearestNeighbour": "bot.algorithms",
+    "CodeNamesSolverAlgorithm": "bot.algorithms",
+    "MeanIndividualDistance": "bot.algorithms",
+    "LRUCache": "bot.cache",
+    "SolverCache": "bot.cache",
+    "CandidateStream": "bot.candidates",
+    "Cosine": "bot.distance",
+    "DotProduct": "bot.distance",
+    "Euclidian": "bot.distance",
+    "Euclidean": "bot.distance",
+    "EmbeddingMatrix": "bot.embeddings",
+    "Guess": "bot.guess",
+    "GuessList": "bot.guess",
+    "BruteForceIndex": "bot.index",
+    "IVFIndex": "bot.index",
+    "LegalityIndex": "bot.legality",
+    "QuantizedMatrix": "bot.quantization",
+    "EmbeddingScorer": "bot.scorer",
+    "SolverBuilder": "bot.solver",
+    "SolveStats": "bot.stats",
+    "Threshold": "bot.threshold",
+    "ThresholdTable": "bot.threshold",
+    "CalibrationTable": "bot.threshold",
+}
+_SUBMODULES = {"algorithms", "cache", "candidates", "distance", "embeddings", "guess", "index", "legality", "parsing",
+               "quantization", "scorer", "solver", "stats", "threshold", "utils"}
 
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from bot.algorithms import SummedNearestNeighbour, CodeNamesSolverAlgorithm, MeanIndividualDistance
+    from bot.cache import LRUCache, SolverCache
+    from bot.candidates import CandidateStream
+    from bot.distance import Cosine, DotProduct, Euclidian, Euclidean
+    from bot.embeddings import EmbeddingMatrix
+    from bot.guess import Guess, GuessList
+    from bot.index import BruteForceIndex, IVFIndex
+    from bot.legality import LegalityIndex
+    from bot.quantization import QuantizedMatrix
+    from bot.scorer import EmbeddingScorer
+    from bot.solver import SolverBuilder
+    from bot.stats import SolveStats
+    from bot.threshold import Threshold, ThresholdTable, CalibrationTable
+
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f"bot.{name}")
+    else:
+        raise AttributeError(f"module 'bot' has no attribute '{name}'")
+    # Cache it, so __getattr__ only runs on first access
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(_EXPORTS) | _SUBMODULES)
@@ -1,48 +1,743 @@
+from __future__ import annotations
+
+import copy
+import heapq
 import itertools
 import logging
-from operator import itemgetter
+from typing import Callable
 
 import numpy as np
 
-from bot.distance import Cosine, DotProduct
+from bot.candidates import CandidateStream
+from bot.distance import Cosine, DotProduct, squared_norms
+from bot.embeddings import EmbeddingMatrix
+from bot.cache import SolverCache
+from bot.guess import GuessBatch, GuessList
+from bot.index import NearestNeighbourIndex
+from bot.legality import combination_mask
+from bot.quantization import QuantizedMatrix
 from bot.scorer import Guess, EmbeddingScorer
-from bot.utils import remove_keys_from_dict, get_top_n_sorted
+from bot.stats import DISABLED, SolveStats
+from bot.utils import get_top_n_sorted, get_top_n_sorted_by_column
+
+# Per-word similarities are computed differently here than in the scorer, so allow for rounding when bounding
+_BOUND_SLACK = 1e-6
+# Vocabulary blocks are a multiple of this many rows. BLAS picks kernels (and so rounding) by matrix shape, and tiny
+# blocks would get different ones; see _block_rows
+_BLOCK_ALIGNMENT = 1024
 
 
 class CodeNamesSolverAlgorithm:
-    def __init__(self, model: dict, threshold: float, distance_metric=Cosine, search_space_multiplier: int = 10):
+    def __init__(self, model: EmbeddingMatrix, threshold: float, distance_metric=Cosine,
+                 search_space_multiplier: int = 10, *, batched: bool = True, branch_and_bound: bool = False,
+                 bound_tolerance: float = 0., index: NearestNeighbourIndex = None, cache: SolverCache = None,
+                 max_block_bytes: int = 2 ** 26, instrument: bool = False, on_stats: Callable = None,
+                 quantized: QuantizedMatrix = None, filter_illegal: bool = True, adaptive_depth: bool = True):
+        """
+        :param max_block_bytes: Memory for the vocabulary blocks of candidate searches (see _stream_top_candidates),
+        and with adaptive_depth for the candidates buffered per board (see CandidateStream.next_depth). None for one
+        block and no limit. Branch and bound doesn't use it for blocks
+        :param instrument: Record a SolveStats per solve, returned as the stats attribute of the result (a GuessList)
+        :param on_stats: Called with the SolveStats of every solve, e.g. to export them. Implies instrument
+        :param quantized: QuantizedMatrix of model. Batched candidates are then found on it, and only the candidates
+        of each combination are re-scored in full precision
+        :param filter_illegal: Mask out clues that are illegal for a combination's words (see LegalityIndex) while
+        searching for candidates, rather than in the scorer, so that illegal clues don't take candidate slots
+        :param adaptive_depth: Stream candidates to the scorer until the top n over the whole vocabulary is settled
+        (see CandidateStream); search_space_multiplier then only sets the first fetch. Otherwise, n *
+        search_space_multiplier candidates per combination are scored
+        """
         self.model = model
         self.distance_metric = distance_metric
         self.threshold = threshold
         self.search_space_multiplier = search_space_multiplier
+        self.batched = batched
+        self.branch_and_bound = branch_and_bound
+        self.bound_tolerance = bound_tolerance
+        self.index = index
+        self.cache = cache
+        self.max_block_bytes = max_block_bytes
+        self.instrument = instrument
+        self.on_stats = on_stats
+        self.quantized = quantized
+        self.filter_illegal = filter_illegal
+        self.adaptive_depth = adaptive_depth
+        self.stats = DISABLED
+        self.subsets_visited = 0
         self.logger = logging.getLogger(__name__)
 
     def solve(self, words_to_hit: list, words_to_avoid: list = None, n: int = 10) -> list:
         """Main algorithm solve method that algorithms should all utilise.
-        Loops through word combinations (e.g. [cat, dog, wolf], [cat, dog], [cat, wolf] etc.) and computes similarity.
-        Builds list of guesses and then finds top n.
+        Finds candidate clues for word combinations (e.g. [cat, dog, wolf], [cat, dog], [cat, wolf] etc.) and then
+        the top n guesses among them.
 
         :param words_to_hit: List of words to connect
         :param words_to_avoid: List of words to avoid connecting
         :param n: Number of solutions to return
-        :return: Pruned list of guess objects
+        :return: Pruned list of guess objects. A GuessList carrying the SolveStats if instrumented
         """
+        self.stats = self._new_stats()
+        with self.stats.time("solve"):
+            guesses = self._solve_cached(words_to_hit, words_to_avoid, n)
+        return self._report(guesses)
+
+    def _solve_cached(self, words_to_hit: list, words_to_avoid: list, n: int) -> list:
+        if self.cache is None:
+            return self._solve(words_to_hit, words_to_avoid, n)
+
+        key = self.cache.result_key(self, words_to_hit, words_to_avoid, n)
+        guesses = self.cache.get_result(key)
+        if guesses is None:
+            guesses = self._solve(words_to_hit, words_to_avoid, n)
+            self.cache.put_result(key, guesses)
+        else:
+            self.stats.count("result_cache_hits")
+        return guesses
+
+    def _new_stats(self) -> SolveStats:
+        return SolveStats() if self.instrument or self.on_stats is not None else DISABLED
+
+    def _report(self, guesses: list) -> list:
+        """Attaches self.stats to a result and hands them to on_stats. A no-op unless instrumented."""
+        if not self.stats.enabled:
+            return guesses
+        if self.on_stats is not None:
+            self.on_stats(self.stats)
+        return GuessList(guesses, self.stats)
+
+    def _solve(self, words_to_hit: list, words_to_avoid: list, n: int) -> list:
         if not words_to_hit:
             words_to_avoid = []
 
+        if self.branch_and_bound:
+            return self._solve_branch_and_bound(words_to_hit, words_to_avoid, n)
+        return self._get_top_guesses(self._get_candidates(words_to_hit, n), words_to_avoid, n)
+
+    def solve_thresholds(self, words_to_hit: list, thresholds: list, words_to_avoid: list = None,
+                         n: int = 10) -> list:
+        """solve for several thresholds at once. Candidates don't depend on the threshold, so they and their
+        similarities to the words to hit (and avoid) are computed once and each threshold is applied as a filter.
+        Branch and bound prunes with the threshold, so it falls back to one solve per threshold.
+
+        :param words_to_hit: List of words to connect
+        :param thresholds: Thresholds to use in place of self.threshold
+        :param words_to_avoid: List of words to avoid connecting
+        :param n: Number of solutions to return
+        :return: List with the solve result of each threshold. GuessLists sharing one SolveStats if instrumented
+        """
+        if self.branch_and_bound:
+            results = []
+            for threshold in thresholds:
+                solver = copy.copy(self)
+                solver.threshold = threshold
+                results.append(solver.solve(words_to_hit, words_to_avoid, n))
+            return results
+
+        self.stats = self._new_stats()
+        with self.stats.time("solve"):
+            if not words_to_hit:
+                words_to_avoid = []
+            scorer = self._get_scorer(self._get_candidates(words_to_hit, n), words_to_avoid, n)
+            results = scorer.top_n_guesses_by_threshold(thresholds)
+        if not self.stats.enabled:
+            return results
+        if self.on_stats is not None:
+            self.on_stats(self.stats)
+        return [GuessList(guesses, self.stats) for guesses in results]
+
+    def solve_many(self, boards: list, n: int = 10) -> list:
+        """solve for many boards at once. The words to hit of all boards are stacked into one query matrix, so each
+        block of the vocabulary is multiplied against all of them in a single matrix product rather than once per
+        board. Each board's columns are then combined and scored as in solve, so results are identical to solving one
+        by one. Only the batched exact path is shared: with branch_and_bound, an index or batched=False, boards are
+        solved one by one. With a cache, results are looked up and stored per board; candidates aren't.
+
+        :param boards: List of dicts with "words_to_hit" and optionally "words_to_avoid"
+        :param n: Number of solutions to return per board
+        :return: List with the solve result of each board. GuessLists sharing one SolveStats if instrumented
+        """
+        if self.branch_and_bound or self.index is not None or not self.batched:
+            return [self.solve(board["words_to_hit"], board.get("words_to_avoid"), n) for board in boards]
+
+        self.stats = self._new_stats()
+        with self.stats.time("solve"):
+            results = self._solve_many(boards, n)
+        if not self.stats.enabled:
+            return results
+        if self.on_stats is not None:
+            self.on_stats(self.stats)
+        return [GuessList(guesses, self.stats) for guesses in results]
+
+    def _solve_many(self, boards: list, n: int) -> list:
+        results = [None] * len(boards)
+        pending = []
+        for board_ix, board in enumerate(boards):
+            words_to_hit, words_to_avoid = board["words_to_hit"], board.get("words_to_avoid")
+            key = None
+            if self.cache is not None:
+                key = self.cache.result_key(self, words_to_hit, words_to_avoid, n)
+                results[board_ix] = self.cache.get_result(key)
+                if results[board_ix] is not None:
+                    self.stats.count("result_cache_hits")
+                    continue
+            if not any(word in self.model for word in words_to_hit):
+                results[board_ix] = self._solve(words_to_hit, words_to_avoid, n)
+                if key is not None:
+                    self.cache.put_result(key, results[board_ix])
+                continue
+            known_words, rows = self._get_known_words(words_to_hit)
+            with self.stats.time("combinations"):
+                combinations, membership = self._get_combination_membership(len(known_words))
+            self.stats.count("combinations", len(combinations))
+            pending.append((board_ix, key, known_words, rows, combinations, membership, words_to_avoid))
+
+        candidates = self._stream_top_candidates([(rows, membership) for _, _, _, rows, _, membership, _ in pending],
+                                                 n * self.search_space_multiplier)
+        scorers = []
+        for (board_ix, key, known_words, rows, combinations, membership, words_to_avoid), \
+                (candidate_rows, candidate_scores) in zip(pending, candidates):
+            guesses = self._candidates(candidate_rows, candidate_scores, self._words_of(known_words, combinations), n,
+                                       scan=lambda columns, start, handed_out, rows=rows, membership=membership:
+                                       self._scan_vocabulary(rows, membership[:, columns], start, handed_out))
+            scorers.append((board_ix, key, rows, membership, self._get_scorer(guesses, words_to_avoid, n)))
+
+        if not self.adaptive_depth:
+            for board_ix, key, _, _, scorer in scorers:
+                results[board_ix] = scorer.top_n_guesses()
+                if key is not None:
+                    self.cache.put_result(key, results[board_ix])
+            return results
+
+        # Boards are scored in lock step, so the combinations that run out of candidates on all boards are refilled in
+        # one pass over the vocabulary. Those scanning it (see CandidateStream.scan_refill) are refilled per board
+        while scorers:
+            refills = []
+            for board_ix, key, rows, membership, scorer in scorers:
+                columns = scorer.advance()
+                if len(columns):
+                    refills.append(((board_ix, key, rows, membership, scorer), columns))
+                    continue
+                results[board_ix] = scorer.pulled_top_n_guesses()[0]
+                if key is not None:
+                    self.cache.put_result(key, results[board_ix])
+            scorers = [board for board, _ in refills]
+            with self.stats.time("candidate_refills"):
+                refills = [(board, board[-1].stream.scan_refill(columns)) for board, columns in refills]
+            refills = [(board, columns) for board, columns in refills if len(columns)]
+            if refills:
+                depths = [scorer.stream.next_depth(columns) for (*_, scorer), columns in refills]
+                with self.stats.time("candidate_refills"):
+                    refilled = self._stream_top_candidates(
+                        [(rows, membership[:, columns]) for (_, _, rows, membership, _), columns in refills], depths,
+                        [scorer.stream.handed_out(columns) for (*_, scorer), columns in refills]
+                    )
+                self.stats.count("candidate_refills", len(refills))
+                for ((*_, scorer), columns), (candidate_rows, candidate_scores), depth in zip(refills, refilled, depths):
+                    scorer.stream.extend(columns, candidate_rows, candidate_scores, depth)
+        return results
+
+    def _get_candidates(self, words_to_hit: list, n: int) -> CandidateStream | GuessBatch | list:
+        if self.index is not None:
+            return self._solve_with_index(words_to_hit, n)
+        if self.batched:
+            return self._solve_batched(words_to_hit, n)
+        return self._solve_per_combination(words_to_hit, n)
+
+    def _solve_per_combination(self, words_to_hit: list, n: int) -> CandidateStream | GuessBatch | list:
+        """Computes candidates for each word combination separately, one pass over the vocabulary per combination.
+
+        :param words_to_hit: List of words to connect
+        :param n: Number of solutions to return
+        :return: CandidateStream, or GuessBatch without adaptive_depth
+        """
+        known_words, _ = self._get_known_words(words_to_hit)
+        if not known_words:
+            return []
+
+        with self.stats.time("combinations"):
+            words_combinations = self._get_word_combinations(known_words)
+        self.stats.count("combinations", len(words_combinations))
+        candidate_rows, candidate_scores = self._compute_candidates(words_combinations,
+                                                                    n * self.search_space_multiplier)
+        return self._candidates(candidate_rows, candidate_scores, words_combinations, n,
+                                lambda columns, depth, handed_out: self._without_handed_out(
+                                    lambda k: self._compute_candidates(
+                                        [words_combinations[column] for column in columns.tolist()], k),
+                                    depth, handed_out))
+
+    def _compute_candidates(self, words_combinations: list, k: int) -> tuple:
+        """The k best clues of each combination, with _compute.
+
+        :param words_combinations: Combinations of words to connect
+        :param k: Number of candidates per combination
+        :return: (len(words_combinations), k) rows and scores, sorted by descending score, -inf where there are none
+        """
+        candidate_rows = np.zeros(shape=(len(words_combinations), min(k, len(self.model))), dtype=np.intp)
+        candidate_scores = np.full(shape=candidate_rows.shape, fill_value=-np.inf)
+        for combination_id, words in enumerate(words_combinations):
+            with self.stats.time("compute"):
+                rows, similarities = self._compute(words, k)
+            self.stats.count("vocabulary_passes")
+            candidate_rows[combination_id, :len(rows)] = rows
+            candidate_scores[combination_id, :len(rows)] = similarities
+        return candidate_rows, candidate_scores
+
+    def _solve_batched(self, words_to_hit: list, n: int) -> CandidateStream | GuessBatch | list:
+        """Computes candidates for all word combinations at once. Similarities between the vocabulary and each word
+        to hit are found in a single pass, then combined into per-combination scores with a subset-membership matrix.
+        The vocabulary is processed in blocks of at most self.max_block_bytes (see _stream_top_candidates). With a
+        cache, only combinations whose candidates aren't cached are computed.
+
+        :param words_to_hit: List of words to connect
+        :param n: Number of solutions to return
+        :return: CandidateStream, or GuessBatch without adaptive_depth
+        """
+        known_words, rows = self._get_known_words(words_to_hit)
+        if not known_words:
+            return []
+
+        with self.stats.time("combinations"):
+            combinations, membership = self._get_combination_membership(len(known_words))
+        self.stats.count("combinations", len(combinations))
+        k = n * self.search_space_multiplier
+        candidate_rows = np.empty(shape=(len(combinations), min(k, len(self.model))), dtype=np.intp)
+        candidate_scores = np.empty(shape=candidate_rows.shape, dtype=float)
+        missing = np.arange(len(combinations))
+        if self.cache is not None:
+            keys = [self.cache.candidate_key(self, tuple(known_words[i] for i in combination), k)
+                    for combination in combinations]
+            cached = [self.cache.get_candidates(key) for key in keys]
+            missing = np.array([column for column, hit in enumerate(cached) if hit is None], dtype=np.intp)
+            self.stats.count("candidate_cache_hits", len(combinations) - len(missing))
+            for column, hit in enumerate(cached):
+                if hit is not None:
+                    candidate_rows[column], candidate_scores[column] = hit
+
+        if len(missing):
+            top_rows, top_scores = self._stream_top_candidates([(rows, membership[:, missing])], k)[0]
+            candidate_rows[missing], candidate_scores[missing] = top_rows, top_scores
+            if self.cache is not None:
+                for column, top_row, top_score in zip(missing, top_rows, top_scores):
+                    self.cache.put_candidates(keys[column], top_row, top_score)
+
+        return self._candidates(candidate_rows, candidate_scores, self._words_of(known_words, combinations), n,
+                                lambda columns, depth, handed_out: self._stream_top_candidates(
+                                    [(rows, membership[:, columns])], depth, [handed_out])[0],
+                                lambda columns, start, handed_out: self._scan_vocabulary(
+                                    rows, membership[:, columns], start, handed_out))
+
+    def _solve_with_index(self, words_to_hit: list, n: int) -> CandidateStream | GuessBatch | list:
+        """Computes candidates for all word combinations with self.index. Each combination becomes one query vector
+        whose inner products with the indexed vectors are the combination's scores (see _combination_queries).
+
+        :param words_to_hit: List of words to connect
+        :param n: Number of solutions to return
+        :return: CandidateStream, or GuessBatch without adaptive_depth
+        """
+        known_words, rows = self._get_known_words(words_to_hit)
+        if not known_words:
+            return []
+
+        with self.stats.time("combinations"):
+            combinations, membership = self._get_combination_membership(len(known_words))
+        self.stats.count("combinations", len(combinations))
+        queries = self._combination_queries(rows, membership)
+        masked_rows, masked = self._masked_clues(rows, membership)
+        candidate_rows, candidate_scores = self._search_index(queries, masked_rows, masked,
+                                                              n * self.search_space_multiplier)
+        return self._candidates(candidate_rows, candidate_scores, self._words_of(known_words, combinations), n,
+                                lambda columns, depth, handed_out: self._without_handed_out(
+                                    lambda k: self._search_index(queries[columns], masked_rows, masked[:, columns], k),
+                                    depth, handed_out))
+
+    def _search_index(self, queries: np.array, masked_rows: np.array, masked: np.array, k: int) -> tuple:
+        """The k best clues of each combination found by self.index, without the ones masked for it.
+
+        :param queries: (n_combinations, dim) _combination_queries
+        :param masked_rows: Rows masked for some combination, see _masked_clues
+        :param masked: Boolean (len(masked_rows), n_combinations) matrix, True where the row is masked
+        :param k: Number of candidates per combination
+        :return: (n_combinations, k) rows and scores, sorted by descending score
+        """
+        # Ask for extra rows so there are still enough once each combination's masked clues are dropped
+        with self.stats.time("index_search"):
+            candidate_rows, candidate_scores = self.index.search(queries, min(k + len(masked_rows), len(self.model)))
+        positions = np.minimum(np.searchsorted(masked_rows, candidate_rows), len(masked_rows) - 1)
+        is_masked = (masked_rows[positions] == candidate_rows) & masked[positions, np.arange(len(queries))[:, None]]
+        candidate_scores[is_masked] = -np.inf
+        order = np.argsort(-candidate_scores, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(candidate_rows, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+    def _solve_branch_and_bound(self, words_to_hit: list, words_to_avoid: list, n: int) -> list:
+        """Best-first branch and bound over word combinations. Combinations are grown one word at a time (in
+        words_to_hit order, so each is generated once) and a combination is only expanded if some clue clears threshold
+        for all of its words (the scorer drops everything else), and if an upper bound on the score of it and any
+        combination grown from it reaches the current n-th best score. Returns the same top n as exhaustive search
+        unless bound_tolerance > 0, in which case guesses within bound_tolerance of the n-th best score may be missed.
+        The number of combinations actually computed is kept in self.subsets_visited.
+        This path ignores max_block_bytes: it keeps (vocabulary size, len(words_to_hit)) dot products, similarities
+        and threshold masks in memory for the whole search, since bounds are recomputed from them for every
+        combination it grows.
+
+        :param words_to_hit: List of words to connect
+        :param words_to_avoid: List of words to avoid connecting
+        :param n: Number of solutions to return
+        :return: Pruned list of guess objects
+        """
+        self.subsets_visited = 0
+        known_words, rows = self._get_known_words(words_to_hit)
+        if not known_words or n <= 0:
+            return []
+
+        with self.stats.time("dot_products"):
+            dots, sq_norms = self._word_dot_products(rows)
+            word_dots = self._word_gram(rows)
+        self.stats.count("vocabulary_passes")
+        # Per-word similarities, as checked against threshold by the scorer
+        word_sims = self.distance_metric.from_dot_products(dots, sq_norms, sq_norms[rows])
+        connected = word_sims > self.threshold - _BOUND_SLACK
+
         guesses = []
-        words_combinations = self._get_word_combinations(words_to_hit)
-        for words in words_combinations:
-            try:
-                for solution in self._compute(words, n):
-                    clue, similarity = solution
-                    guess = Guess(clue=clue, similarity=similarity, linked_words=words)
-                    guesses.append(guess)
-            except TypeError:
-                self.logger.error("Probably can't find source word in embeddings...")
+        top_scores = []
+        queue = []
+        self._push_children(queue, (), np.ones(len(self.model), dtype=bool), word_sims, connected, rows)
+        while queue:
+            negative_bound, _, combination = heapq.heappop(queue)
+            if len(top_scores) == n and -negative_bound < top_scores[0] + self.bound_tolerance:
+                # Queue is ordered by bound, so nothing left can make the top n
+                break
+
+            self.subsets_visited += 1
+            membership = np.zeros(shape=(len(known_words), 1), dtype=bool)
+            membership[list(combination)] = True
+            scores = self._combination_scores(dots, sq_norms, word_dots, sq_norms[rows], membership)
+            combination_guesses = self._get_scorer(
+                self._candidates_from_scores(scores, rows, known_words, [combination], membership, n), words_to_avoid, n
+            ).top_n_guesses()
+            guesses.extend(combination_guesses)
+            for guess in combination_guesses:
+                if len(top_scores) < n:
+                    heapq.heappush(top_scores, guess.score)
+                else:
+                    heapq.heappushpop(top_scores, guess.score)
+
+            feasible = connected[:, list(combination)].all(axis=1)
+            feasible[rows[list(combination)]] = False
+            self._push_children(queue, combination, feasible, word_sims, connected, rows)
 
+        self.stats.count("subsets_visited", self.subsets_visited)
+        self.logger.debug(f"Branch and bound visited {self.subsets_visited} of {2 ** len(known_words) - 1} "
+                          f"word combinations")
         return self._get_top_guesses(guesses, words_to_avoid, n)
 
+    def _push_children(self, queue: list, combination: tuple, feasible: np.array, word_sims: np.array,
+                       connected: np.array, rows: np.array):
+        """Pushes each combination grown from combination by one (later) word onto the queue, keyed by the upper
+        bound of it and its own children. Children that no clue connects to all of their words are dropped.
+        """
+        start = combination[-1] + 1 if combination else 0
+        for position in range(start, len(rows)):
+            child = combination + (position,)
+            child_feasible = feasible & connected[:, position]
+            child_feasible[rows[position]] = False
+            if not child_feasible.any():
+                continue
+            bound = self._subtree_upper_bound(word_sims[child_feasible], child, connected[child_feasible])
+            heapq.heappush(queue, (-bound, len(queue), child))
+
+    def _subtree_upper_bound(self, word_sims: np.array, combination: tuple, connected: np.array) -> float:
+        """Upper bound on the score (similarity * sqrt(num_words_linked)) of any guess for combination or for a
+        combination grown from it with later words. Valid when the similarity is the mean of the per-word similarities,
+        as for MeanIndividualDistance: the sum over combination is bounded by its best clue, and each added word by its
+        best similarity to a clue that still connects.
+
+        :param word_sims: Per-word similarities of the clues that connect to all words in combination
+        :param combination: Positions of the words in the combination
+        :param connected: Boolean per-word threshold mask of the same clues
+        :return: Upper bound on score
+        """
+        combination_sum = word_sims[:, list(combination)].sum(axis=1).max()
+        extensions = np.where(connected[:, combination[-1] + 1:], word_sims[:, combination[-1] + 1:], -np.inf)
+        extension_bounds = np.sort(extensions.max(axis=0))[::-1]
+        extension_bounds = extension_bounds[np.isfinite(extension_bounds)]
+        sums = combination_sum + np.concatenate([[0], np.cumsum(extension_bounds)])
+        sizes = len(combination) + np.arange(len(sums))
+        return float((sums / np.sqrt(sizes)).max())
+
+    def _get_known_words(self, words_to_hit: list) -> tuple:
+        """Drops words that aren't in the embeddings, since no combination including them can be computed.
+
+        :param words_to_hit: List of words to connect
+        :return: Words found in the embeddings, their rows
+        """
+        known_words = [word for word in words_to_hit if word in self.model]
+        if len(known_words) < len(words_to_hit):
+            self.logger.error("Probably can't find source word in embeddings...")
+        return known_words, self.model.rows(known_words)
+
+    def _stream_top_candidates(self, boards: list, k: int | list, handed_out: list = None) -> list:
+        """The k best clues of each combination of each board, excluding the clues masked for it (see _masked_clues).
+        The vocabulary is streamed in blocks (see _block_rows): each block is multiplied against the distinct words to
+        hit of all boards at once, scored per board and merged into running top candidates. Extra
+        memory is bounded by self.max_block_bytes rather than growing with vocabulary size.
+
+        :param boards: List of (rows of the words to hit, membership matrix) pairs
+        :param k: Number of candidates per combination, or a list with the number for each board
+        :param handed_out: List with the clues of each board to leave out as well, see CandidateStream.handed_out
+        :return: List with (n_combinations, k) candidate rows and scores of each board, sorted by descending score
+        """
+        if not boards:
+            return []
+        ks = k if isinstance(k, list) else [k] * len(boards)
+        columns = {}
+        for rows, _ in boards:
+            for row in rows.tolist():
+                columns.setdefault(row, len(columns))
+        all_rows = np.fromiter(columns, dtype=np.intp, count=len(columns))
+        board_columns = [[columns[row] for row in rows.tolist()] for rows, _ in boards]
+        word_dots = [self._word_gram(rows) for rows, _ in boards]
+        masks = [self._masked_clues(rows, membership) for rows, membership in boards]
+        top = [(np.empty((membership.shape[1], 0), dtype=np.intp), np.empty((membership.shape[1], 0)))
+               for _, membership in boards]
+
+        block_rows = self._block_rows(len(all_rows), max(membership.shape[1] for _, membership in boards))
+        for start in range(0, len(self.model), block_rows):
+            stop = self._block_stop(start, block_rows)
+            with self.stats.time("dot_products"):
+                dots, sq_norms = self._block_dot_products(all_rows, start, stop)
+            self.stats.count("vocabulary_blocks")
+            for board_ix, (rows, membership) in enumerate(boards):
+                with self.stats.time("combination_scores"):
+                    scores = self._combination_scores(dots[:, board_columns[board_ix]], sq_norms,
+                                                      word_dots[board_ix], self.model.sq_norms[rows], membership)
+                    self._mask_block(scores, *masks[board_ix], start)
+                    if handed_out is not None:
+                        self._mask_handed_out(scores, handed_out[board_ix], start)
+
+                with self.stats.time("top_k"):
+                    top[board_ix] = self._merge_top_candidates(*top[board_ix], scores, start, ks[board_ix])
+            if stop == len(self.model):
+                break
+        self.stats.count("vocabulary_passes")
+        with self.stats.time("top_k"):
+            top = [self._sort_candidates(*board_top) for board_top in top]
+
+        if self.quantized is not None:
+            with self.stats.time("rerank"):
+                top = [self._rerank_candidates(rows, membership, gram, *board_top)
+                       for (rows, membership), gram, board_top in zip(boards, word_dots, top)]
+        return top
+
+    def _scan_vocabulary(self, rows: np.array, membership: np.array, start: int, handed_out: list) -> tuple:
+        """Scores of every clue of the vocabulary block from row start on, as _stream_top_candidates scores them but
+        in full precision, for a CandidateStream to scan (see CandidateStream.scan_refill).
+
+        :param rows: Rows of the words to hit
+        :param membership: Boolean (len(rows), n_combinations) combination membership matrix
+        :param start: First row of the block
+        :param handed_out: Clues of each combination to leave out, see CandidateStream.handed_out
+        :return: Rows of the block, (n_combinations, block size) scores, -inf for masked and handed out clues, and
+        the row after the block
+        """
+        stop = self._block_stop(start, self._block_rows(len(rows), membership.shape[1]))
+        with self.stats.time("dot_products"):
+            dots, sq_norms = self._word_dot_products(rows, start, stop)
+        self.stats.count("vocabulary_blocks")
+        with self.stats.time("combination_scores"):
+            scores = self._combination_scores(dots, sq_norms, self._word_gram(rows), self.model.sq_norms[rows],
+                                              membership)
+            self._mask_block(scores, *self._masked_clues(rows, membership), start)
+            self._mask_handed_out(scores, handed_out, start)
+        if stop == len(self.model):
+            self.stats.count("vocabulary_passes")
+        return np.arange(start, stop), scores.T, stop
+
+    def _rerank_candidates(self, rows: np.array, membership: np.array, word_dots: np.array, candidate_rows: np.array,
+                           candidate_scores: np.array) -> tuple:
+        """Re-scores candidates found on self.quantized in full precision and sorts them again.
+
+        :param rows: Rows of the words to hit
+        :param membership: Boolean (len(rows), n_combinations) combination membership matrix
+        :param word_dots: _word_gram of rows
+        :param candidate_rows: (n_combinations, n_candidates) rows of candidate clues
+        :param candidate_scores: Their approximate scores, -inf where masked out
+        :return: Candidate rows and full precision scores, sorted by descending score
+        """
+        distinct_rows, positions = np.unique(candidate_rows, return_inverse=True)
+        self.stats.count("reranked_clues", len(distinct_rows))
+        dots = DotProduct.pairwise(self.model.vectors[distinct_rows], self.model.vectors[rows])
+        scores = self._combination_scores(dots, self.model.sq_norms[distinct_rows], word_dots,
+                                          self.model.sq_norms[rows], membership)
+        scores = scores[positions.reshape(candidate_rows.shape), np.arange(len(candidate_rows))[:, None]]
+        scores[~np.isfinite(candidate_scores)] = -np.inf
+        order = np.argsort(-scores, axis=1, kind="stable")
+        return np.take_along_axis(candidate_rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def _block_stop(self, start: int, block_rows: int) -> int:
+        """End of the vocabulary block of block_rows rows from start. A short remainder is folded into the last block
+        rather than computed on its own."""
+        stop = min(start + block_rows, len(self.model))
+        return len(self.model) if len(self.model) - stop < _BLOCK_ALIGNMENT else stop
+
+    @staticmethod
+    def _mask_block(scores: np.array, masked_rows: np.array, masked: np.array, start: int):
+        """Masks out the clues of a vocabulary block masked for each combination (see _masked_clues), in place.
+
+        :param scores: (block size, n_combinations) scores of vocabulary rows start onwards
+        :param masked_rows: Sorted rows masked for some combination
+        :param masked: Boolean (len(masked_rows), n_combinations) matrix, True where the row is masked
+        :param start: First row of the block
+        """
+        first, last = np.searchsorted(masked_rows, [start, start + len(scores)])
+        block_masked_rows = masked_rows[first:last] - start
+        scores[block_masked_rows] = np.where(masked[first:last], -np.inf, scores[block_masked_rows])
+
+    def _block_rows(self, n_words: int, n_combinations: int) -> int:
+        """Vocabulary rows per block of _stream_top_candidates, so that a block's dot products and (a few copies of)
+        its scores fit in self.max_block_bytes. A multiple of _BLOCK_ALIGNMENT, so that blocks are large enough to
+        get the same BLAS kernels as one product over the whole vocabulary would.
+        """
+        if self.max_block_bytes is None:
+            return len(self.model)
+        row_bytes = self.model.vectors.itemsize * (n_words + 3 * n_combinations)
+        return max(1, self.max_block_bytes // row_bytes // _BLOCK_ALIGNMENT) * _BLOCK_ALIGNMENT
+
+    @staticmethod
+    def _merge_top_candidates(rows: np.array, scores: np.array, block_scores: np.array, start: int, k: int) -> tuple:
+        """Top k of (n_combinations, _) candidates and a block of the vocabulary, in no particular order: they are
+        only partitioned, and once a combination has k candidates only the block scores above its k-th best are
+        gathered, so that merging a block costs about the same however deep k is (see _sort_candidates).
+
+        :param rows: Rows of the candidates so far
+        :param scores: Their scores
+        :param block_scores: (block size, n_combinations) scores of vocabulary rows start onwards
+        :param start: First row of the block
+        :param k: Number of candidates per combination
+        :return: (n_combinations, at most k) rows and scores
+        """
+        if k <= 0:
+            return rows, scores
+        # Partitioning runs along contiguous memory, so work on one row per combination
+        block_scores = np.ascontiguousarray(block_scores.T)
+        better = None
+        if rows.shape[1] >= k:
+            # Ties go to the candidates so far, which come from earlier rows
+            better = block_scores > scores.min(axis=1, keepdims=True)
+            counts = np.count_nonzero(better, axis=1)
+            width = int(counts.max(initial=0))
+            if not width:
+                return rows, scores
+        if better is not None and width < block_scores.shape[1]:
+            positions, offsets = np.nonzero(better)
+            ranks = np.arange(len(positions)) - np.repeat(np.cumsum(counts) - counts, counts)
+            block_rows = np.zeros(shape=(len(block_scores), width), dtype=rows.dtype)
+            block_rows[positions, ranks] = offsets + start
+            block_top = np.full(shape=(len(block_scores), width), fill_value=-np.inf, dtype=block_scores.dtype)
+            block_top[positions, ranks] = block_scores[positions, offsets]
+            block_scores = block_top
+        elif block_scores.shape[1] > k:
+            top = np.argpartition(block_scores, -k, axis=1)[:, -k:]
+            block_rows, block_scores = top + start, np.take_along_axis(block_scores, top, axis=1)
+        else:
+            block_rows = np.broadcast_to(np.arange(start, start + block_scores.shape[1]), block_scores.shape)
+        rows, scores = np.hstack([rows, block_rows]), np.hstack([scores, block_scores])
+        if rows.shape[1] <= k:
+            return rows, scores
+        top = np.argpartition(scores, -k, axis=1)[:, -k:]
+        return np.take_along_axis(rows, top, axis=1), np.take_along_axis(scores, top, axis=1)
+
+    @staticmethod
+    def _sort_candidates(rows: np.array, scores: np.array) -> tuple:
+        """(n_combinations, _) candidates sorted by descending score, ties by row, as one block would sort them."""
+        order = np.lexsort((rows, -scores), axis=1)
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def _candidates_from_scores(self, scores: np.array, rows: np.array, words: list, combinations: list,
+                                membership: np.array, n: int) -> CandidateStream | GuessBatch:
+        """Turns batched scores into candidates: the best clues of each combination, excluding the clues masked for
+        it (see _candidates).
+
+        :param scores: (vocabulary size, n_combinations) array of scores, masked in place
+        :param rows: Rows of words
+        :param words: Words to connect
+        :param combinations: Combinations of positions in words, one per column of scores
+        :param membership: Boolean (len(words), n_combinations) combination membership matrix
+        :param n: Number of solutions to return
+        :return: CandidateStream, or GuessBatch without adaptive_depth
+        """
+        masked_rows, masked = self._masked_clues(rows, membership)
+        scores[masked_rows] = np.where(masked, -np.inf, scores[masked_rows])
+        block_rows = self._block_rows(len(words), len(combinations))
+
+        def scan(columns: np.array, start: int, handed_out: list) -> tuple:
+            stop = self._block_stop(start, block_rows)
+            return np.arange(start, stop), self._mask_handed_out(scores[start:stop, columns], handed_out, start).T, stop
+
+        return self._candidates(*self._top_k_by_column(scores, n * self.search_space_multiplier),
+                                self._words_of(words, combinations), n,
+                                lambda columns, depth, handed_out: self._top_k_by_column(
+                                    self._mask_handed_out(scores[:, columns], handed_out), depth), scan)
+
+    @staticmethod
+    def _top_k_by_column(scores: np.array, k: int) -> tuple:
+        """(n_combinations, k) rows and scores of the k best clues of each column of scores, sorted by descending
+        score."""
+        top_rows = get_top_n_sorted_by_column(scores, k)
+        return top_rows.T, np.take_along_axis(scores, top_rows, axis=0).T
+
+    @staticmethod
+    def _mask_handed_out(scores: np.array, handed_out: list, start: int = 0) -> np.array:
+        """Masks out clues handed out already (see CandidateStream.handed_out) in (block size, n_combinations) scores of
+        vocabulary rows start onwards, in place."""
+        for position, handed_rows in enumerate(handed_out):
+            first, last = np.searchsorted(handed_rows, [start, start + len(scores)])
+            scores[handed_rows[first:last] - start, position] = -np.inf
+        return scores
+
+    def _without_handed_out(self, search: Callable, depth: int, handed_out: list) -> tuple:
+        """The depth best candidates of combinations that weren't handed out already (see
+        CandidateStream.handed_out), from a search that can't leave them out while searching: it is asked for as many
+        more candidates as any combination had handed out, which are then dropped.
+
+        :param search: Called with a number of candidates k, returns (n_combinations, k) rows and scores sorted by
+        descending score
+        :param depth: Number of candidates per combination
+        :param handed_out: Rows handed out of each combination
+        :return: (n_combinations, depth) rows and scores, sorted by descending score
+        """
+        extra = max((len(handed_rows) for handed_rows in handed_out), default=0)
+        candidate_rows, candidate_scores = search(min(depth + extra, len(self.model)))
+        is_handed_out = np.array([np.isin(rows, handed_rows) for rows, handed_rows in zip(candidate_rows, handed_out)],
+                                 dtype=bool).reshape(candidate_rows.shape)
+        candidate_scores = np.where(is_handed_out, -np.inf, candidate_scores)
+        order = np.argsort(-candidate_scores, axis=1, kind="stable")[:, :depth]
+        return np.take_along_axis(candidate_rows, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+    def _candidates(self, candidate_rows: np.array, candidate_scores: np.array, combinations: list, n: int,
+                    fetch: Callable = None, scan: Callable = None) -> CandidateStream | GuessBatch:
+        """Per-combination candidates as handed to the scorer: a CandidateStream with adaptive_depth, otherwise a
+        GuessBatch of all of them, ordered by combination and then by descending score. Candidates scored -inf (masked
+        out) are dropped.
+
+        :param candidate_rows: (n_combinations, k) rows of candidate clues, sorted by descending score
+        :param candidate_scores: Scores of candidate_rows
+        :param combinations: Linked words of each combination, one per row of candidate_rows
+        :param n: Number of solutions to return
+        :param fetch: Finds deeper candidates for the stream, see CandidateStream
+        :param scan: Scores the vocabulary block by block for the stream, see CandidateStream
+        :return: CandidateStream or GuessBatch
+        """
+        stream = CandidateStream(combinations, candidate_rows, candidate_scores, candidate_rows.shape[1],
+                                 len(self.model), n, fetch,
+                                 lambda threshold: self._min_clue_similarity(combinations, threshold),
+                                 self.max_block_bytes, scan)
+        return stream if self.adaptive_depth else stream.batch()
+
+    @staticmethod
+    def _words_of(words: list, combinations: list) -> list:
+        """Combinations of positions in words as combinations of words."""
+        return [tuple(words[i] for i in combination) for combination in combinations]
+
     @staticmethod
     def _get_word_combinations(words_to_hit: list) -> list:
         """
@@ -53,9 +748,127 @@ class CodeNamesSolverAlgorithm:
         return list(itertools.chain(*map(lambda x: itertools.combinations(words_to_hit, x),
                                          range(1, len(words_to_hit) + 1))))
 
+    @classmethod
+    def _get_combination_membership(cls, n_words: int) -> tuple:
+        """Combinations of word positions (same order as _get_word_combinations) and a boolean
+        (n_words, n_combinations) matrix saying which words belong to which combination.
+
+        :param n_words: Number of words to connect
+        :return: List of combinations of positions, membership matrix
+        """
+        combinations = cls._get_word_combinations(list(range(n_words)))
+        membership = np.zeros(shape=(n_words, len(combinations)), dtype=bool)
+        for column, combination in enumerate(combinations):
+            membership[list(combination), column] = True
+        return combinations, membership
+
+    def _word_dot_products(self, rows: np.array, start: int = 0, stop: int = None) -> tuple:
+        """Dot products between the words in a block of the vocabulary and the words at rows, plus squared norms of
+        the block. Everything the batched scores are built from, besides _word_gram.
+
+        :param rows: Rows of the words to hit
+        :param start: First row of the block
+        :param stop: End of the block, the end of the vocabulary by default
+        :return: (block size, len(rows)) dot products, squared norms of the block
+        """
+        vectors = self.model.vectors[start:stop]
+        if len(rows) == 1:
+            # BLAS hands a single column to a matrix-vector kernel that rounds differently, so pad to two to get the
+            # same bits as when the row is one column of a larger product (see solve_many)
+            dots = DotProduct.pairwise(vectors, self.model.vectors[np.repeat(rows, 2)])[:, :1]
+        else:
+            dots = DotProduct.pairwise(vectors, self.model.vectors[rows])
+        return dots, self.model.sq_norms[start:stop]
+
+    def _block_dot_products(self, rows: np.array, start: int, stop: int) -> tuple:
+        """_word_dot_products of a vocabulary block of _stream_top_candidates, approximated on self.quantized if set.
+        """
+        if self.quantized is None:
+            return self._word_dot_products(rows, start, stop)
+        return self.quantized.dot_products(self.model.vectors[rows], start, stop), self.quantized.sq_norms[start:stop]
+
+    def _word_gram(self, rows: np.array) -> np.array:
+        """Dot products between the words at rows."""
+        vectors = self.model.vectors[rows]
+        return DotProduct.pairwise(vectors, vectors)
+
     def _compute(self, *args, **kwargs):
         raise NotImplementedError
 
+    def _min_clue_similarity(self, combinations: list, threshold: float) -> np.array:
+        """Similarity (score) to each combination that a clue must exceed to be connected to each of its words, as
+        _check_all_connected checks with threshold. Candidates come best first, so a combination's remaining ones can
+        be skipped once they don't exceed it.
+
+        :param combinations: Linked words of each combination
+        :param threshold: Threshold of _check_all_connected
+        :return: Bound per combination, -inf where the algorithm gives none
+        """
+        return np.full(len(combinations), -np.inf)
+
+    def _combination_queries(self, rows: np.array, membership: np.array) -> np.array:
+        """One query vector per combination such that its inner products with the vectors of a
+        NearestNeighbourIndex (built for self.distance_metric) are the combination's scores.
+
+        :param rows: Rows of the words to hit
+        :param membership: Boolean (len(rows), n_combinations) combination membership matrix
+        :return: (n_combinations, dim) array of queries
+        """
+        raise NotImplementedError
+
+    def _combination_scores(self, dots: np.array, sq_norms: np.array, word_dots: np.array,
+                            word_sq_norms: np.array, membership: np.array) -> np.array:
+        """Scores every word in a block of the vocabulary against every combination, given the output of
+        _word_dot_products and _word_gram.
+
+        :param dots: (block size, n_words) dot products with the words to hit
+        :param sq_norms: Squared norms of the block
+        :param word_dots: (n_words, n_words) dot products between the words to hit
+        :param word_sq_norms: Squared norms of the words to hit
+        :param membership: Boolean (n_words, n_combinations) combination membership matrix
+        :return: (block size, n_combinations) array of scores
+        """
+        raise NotImplementedError
+
+    def _exclude_words(self, similarities: np.array, words: list) -> np.array:
+        """Masks out words (typically the words to connect), and with filter_illegal every clue illegal for them, so
+        they can't be picked as a clue. Done in place by setting their similarities to -inf rather than copying the
+        vocabulary without them.
+
+        :param similarities: 1D array of similarities, one per row of the vocabulary
+        :param words: Words to exclude
+        :return: Masked similarities
+        """
+        if self.filter_illegal:
+            similarities[self.model.legality.illegal_mask(words)] = -np.inf
+        else:
+            similarities[self.model.rows(words)] = -np.inf
+        return similarities
+
+    def _masked_clues(self, rows: np.array, membership: np.array) -> tuple:
+        """Rows that can't be a clue for some combination: its own words, and with filter_illegal every clue
+        illegal for one of its words (see LegalityIndex).
+
+        :param rows: Rows of the words to hit
+        :param membership: Boolean (len(rows), n_combinations) combination membership matrix
+        :return: Sorted distinct rows, boolean (len(rows), n_combinations) matrix, True where the row is masked for the
+        combination
+        """
+        if self.filter_illegal:
+            return self.model.legality.combination_mask(self.model.words[rows].tolist(), membership)
+        return combination_mask([rows[position:position + 1] for position in range(len(rows))], membership)
+
+    def _top_candidates(self, similarities: np.array, k: int) -> tuple:
+        """Finds the k most similar (non-excluded) words of the vocabulary.
+
+        :param similarities: 1D array of similarities, one per row of the vocabulary
+        :param k: Number of candidates
+        :return: Rows and similarities of the candidates, sorted by descending similarity
+        """
+        indices = get_top_n_sorted(similarities, k)
+        indices = indices[np.isfinite(similarities[indices])]
+        return indices, similarities[indices]
+
     def _get_top_guesses(self, guesses: list, words_to_avoid: list, n: int) -> list:
         """
 
@@ -64,65 +877,139 @@ class CodeNamesSolverAlgorithm:
         :param n: Number of solutions to return
         :return: Scored list of solutions
         """
+        return self._get_scorer(guesses, words_to_avoid, n).top_n_guesses()
+
+    def _get_scorer(self, guesses: list, words_to_avoid: list, n: int) -> EmbeddingScorer:
         return EmbeddingScorer(guesses=guesses,
                                embeddings=self.model,
                                distance_metric=self.distance_metric,
                                words_to_avoid=words_to_avoid,
                                n=n,
-                               threshold=self.threshold
-                               ).top_n_guesses()
+                               threshold=self.threshold,
+                               stats=self.stats,
+                               prefiltered=self.filter_illegal
+                               )
 
 
 class MeanIndividualDistance(CodeNamesSolverAlgorithm):
-    def __init__(self, model: dict, threshold: float, search_space_multiplier: int = 10, distance_metric=Cosine):
-        super().__init__(model, threshold, distance_metric, search_space_multiplier)
+    def __init__(self, model: EmbeddingMatrix, threshold: float, search_space_multiplier: int = 10,
+                 distance_metric=Cosine, **kwargs):
+        """
+        :param kwargs: Options of CodeNamesSolverAlgorithm
+        """
+        super().__init__(model, threshold, distance_metric=distance_metric,
+                         search_space_multiplier=search_space_multiplier, **kwargs)
 
-    def _compute(self, words: list, n) -> list:
+    def _compute(self, words: list, k: int) -> tuple:
         # Fetch embeddings for words of relevance
-        embeddings_of_words_to_hit = np.array([self.model.get(word, np.array) for word in list(words)])
-        # Remove words_to_hit from potential matches
-        potential_match_embeddings = remove_keys_from_dict(self.model, words)
-        # And convert to array
-        potential_match_embeddings_array = np.vstack(list(potential_match_embeddings.values()))
-        # Calculate cosine similarities between each candidate and each word to hit
-        sims = self.distance_metric(potential_match_embeddings_array, embeddings_of_words_to_hit).distance()
+        rows = self.model.rows(words)
+        # Calculate cosine similarities between each word in the vocabulary and each word to hit
+        sims = self.distance_metric.pairwise(self.model.vectors, self.model.vectors[rows],
+                                             self.model.sq_norms, self.model.sq_norms[rows])
         # Average to get mean similarity of each candidate to all words to hit
-        mean_sims = sims.T.mean(axis=0)
-        # Get top n
-        indices = get_top_n_sorted(mean_sims, n * self.search_space_multiplier)
-        # Index matches against original list
-        matched_words = itemgetter(*indices)(list(potential_match_embeddings.keys()))
-        # Fetch also the numerical similarities
-        sims = mean_sims[indices]
-        return list(zip(matched_words, sims))
+        mean_sims = sims.mean(axis=1)
+        # Mask words_to_hit out of potential matches
+        mean_sims = self._exclude_words(mean_sims, words)
+        # Get top k
+        return self._top_candidates(mean_sims, k)
+
+    def _min_clue_similarity(self, combinations: list, threshold: float) -> np.array:
+        # A mean of similarities that all exceed threshold exceeds it too
+        return np.full(len(combinations), threshold - _BOUND_SLACK * max(1., abs(threshold)))
+
+    def _combination_scores(self, dots: np.array, sq_norms: np.array, word_dots: np.array,
+                            word_sq_norms: np.array, membership: np.array) -> np.array:
+        # Similarities between each word in the vocabulary and each word to hit
+        sims = self.distance_metric.from_dot_products(dots, sq_norms, word_sq_norms)
+        # Mean similarity to the words of each combination
+        weights = (membership / membership.sum(axis=0)).astype(sims.dtype)
+        return sims @ weights
+
+    def _combination_queries(self, rows: np.array, membership: np.array) -> np.array:
+        vectors = self.model.vectors[rows]
+        if self.distance_metric is Cosine:
+            # Mean cosine similarity is the inner product of a unit vector with the mean of the unit word vectors
+            vectors = vectors / np.sqrt(self.model.sq_norms[rows])[:, None]
+        weights = (membership / membership.sum(axis=0)).astype(vectors.dtype)
+        return weights.T @ vectors
 
 
 class SummedNearestNeighbour(CodeNamesSolverAlgorithm):
-    def __init__(self, model: dict, threshold: float, search_space_multiplier: int = 10, distance_metric=Cosine):
-        super().__init__(model, threshold, distance_metric, search_space_multiplier)
+    def __init__(self, model: EmbeddingMatrix, threshold: float, search_space_multiplier: int = 10,
+                 distance_metric=Cosine, **kwargs):
+        """
+        :param kwargs: Options of CodeNamesSolverAlgorithm
+        """
+        super().__init__(model, threshold, distance_metric=distance_metric,
+                         search_space_multiplier=search_space_multiplier, **kwargs)
 
-    def _compute(self, words: list, n: int) -> list:
+    def _compute(self, words: list, k: int) -> tuple:
         """Computes nearest neighbors (best guesses) for a single combination of words. Uses sum of embedding vectors
         of words to hit and finds the nearest word to this summed vector.
 
         :param words: Words to connect.
-        :return: List of best guesses for a single combination of words.
+        :param k: Number of best guesses
+        :return: Rows and similarities of the best guesses for a single combination of words.
         """
 
         # Fetch embeddings for words of relevance
-        embeddings_of_words_to_hit = np.array([self.model.get(word, np.array) for word in list(words)])
+        embeddings_of_words_to_hit = self.model.vectors[self.model.rows(words)]
         # Get sum of fetched embeddings
         target_vector = np.mean(embeddings_of_words_to_hit, axis=0)
-        # Remove words_to_hit from potential matches
-        potential_match_embeddings = remove_keys_from_dict(self.model, words)
-        # Convert to array
-        embeddings_as_array = np.array(list(potential_match_embeddings.values()))
         # Find nearest
-        similarities = np.squeeze(self.distance_metric(target_vector, embeddings_as_array).distance())
-        # Get top n matches
-        indices = get_top_n_sorted(similarities, n * self.search_space_multiplier)
-        # Index matches against original list
-        matched_words = itemgetter(*indices)(list(potential_match_embeddings.keys()))
-        # Fetch also the numerical similarities
-        sims = similarities[indices]
-        return list(zip(matched_words, sims))
+        similarities = self.distance_metric.pairwise(target_vector[None, :], self.model.vectors,
+                                                     key_sq_norms=self.model.sq_norms)[0]
+        # Mask words_to_hit out of potential matches
+        similarities = self._exclude_words(similarities, words)
+        # Get top k matches
+        return self._top_candidates(similarities, k)
+
+    def _min_clue_similarity(self, combinations: list, threshold: float) -> np.array:
+        if self.distance_metric is DotProduct:
+            # The dot product with the mean vector is the mean of the dot products
+            return np.full(len(combinations), threshold - _BOUND_SLACK * max(1., abs(threshold)))
+        if self.distance_metric is not Cosine:
+            return super()._min_clue_similarity(combinations, threshold)
+
+        # A clue x with cosine similarity above threshold to each word w has x.w / |x| > threshold * |w|, so averaged
+        # over the words, its cosine similarity to their mean vector m exceeds threshold * mean(|w|) / |m|
+        words = list(dict.fromkeys(word for combination in combinations for word in combination if word in self.model))
+        positions = {word: position for position, word in enumerate(words)}
+        known = np.array([all(word in positions for word in combination) for combination in combinations], dtype=bool)
+        membership = np.zeros(shape=(len(words), len(combinations)), dtype=bool)
+        for column, combination in enumerate(combinations):
+            membership[[positions[word] for word in combination if word in positions], column] = True
+        rows = self.model.rows(words)
+        weights = membership / np.maximum(membership.sum(axis=0), 1)
+        mean_norms = np.sqrt(self.model.sq_norms[rows].astype(float)) @ weights
+        target_norms = np.sqrt(np.maximum(((self._word_gram(rows).astype(float) @ weights) * weights).sum(axis=0), 0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bounds = threshold * mean_norms / target_norms
+        bounds -= _BOUND_SLACK * np.maximum(1., np.abs(bounds))
+        return np.where(known & np.isfinite(bounds), bounds, -np.inf)
+
+    def _combination_scores(self, dots: np.array, sq_norms: np.array, word_dots: np.array,
+                            word_sq_norms: np.array, membership: np.array) -> np.array:
+        weights = (membership / membership.sum(axis=0)).astype(dots.dtype)
+        # Dot products with each combination's mean vector are the means of the dot products with its words...
+        target_dots = dots @ weights
+        # ...and the mean vectors' squared norms follow from the dot products between the words to hit
+        target_sq_norms = ((word_dots @ weights) * weights).sum(axis=0)
+        return self.distance_metric.from_dot_products(target_dots, sq_norms, target_sq_norms)
+
+    def _combination_queries(self, rows: np.array, membership: np.array) -> np.array:
+        weights = (membership / membership.sum(axis=0)).astype(self.model.dtype)
+        targets = weights.T @ self.model.vectors[rows]
+        if self.distance_metric is Cosine:
+            targets /= np.sqrt(squared_norms(targets))[:, None]
+        return targets
+
+    def _subtree_upper_bound(self, word_sims: np.array, combination: tuple, connected: np.array) -> float:
+        if self.distance_metric is DotProduct:
+            # Dot product with the mean vector is the mean of the dot products, so the mean bound holds
+            return super()._subtree_upper_bound(word_sims, combination, connected)
+        if self.distance_metric is Cosine:
+            # Similarity is at most 1, so only the number of words that can still be linked matters
+            extensions = connected[:, combination[-1] + 1:].any(axis=0).sum()
+            return float(np.sqrt(len(combination) + extensions))
+        return np.inf
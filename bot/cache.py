@@ -0,0 +1,122 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from bot.guess import Guess
+
+
+class LRUCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = None):
+        """Least recently used cache bounded by number of entries and (optionally) by approximate size in bytes.
+
+        :param max_entries: Maximum number of entries
+        :param max_bytes: Maximum total size of the values, as estimated by estimate_nbytes
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        nbytes = estimate_nbytes(value)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while len(self._entries) > self.max_entries or \
+                    (self.max_bytes is not None and self.nbytes > self.max_bytes):
+                self.nbytes -= self._entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    @property
+    def stats(self) -> dict:
+        return {"entries": len(self), "bytes": self.nbytes, "hits": self.hits, "misses": self.misses}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SolverCache:
+    def __init__(self, max_results: int = 1024, max_result_bytes: int = 64 * 2 ** 20, max_candidates: int = 8192,
+                 max_candidate_bytes: int = 256 * 2 ** 20):
+        """Memoizes CodeNamesSolverAlgorithm.solve. Holds two LRU caches:
+         - results: top n guesses per (model, algorithm, metric, settings that change results such as index or
+           quantization, threshold, words to hit, words to avoid, n)
+         - candidates: candidate clues and similarities per word combination, which don't depend on threshold or
+           words to avoid, so are shared between boards (e.g. a board and the same board minus a guessed word)
+
+        Models are identified by EmbeddingMatrix.name, so share a cache only between models with distinct names.
+        Cached values are immutable: results are handed out as fresh Guess objects and candidate arrays are read only.
+        """
+        self.results = LRUCache(max_results, max_result_bytes)
+        self.candidates = LRUCache(max_candidates, max_candidate_bytes)
+
+    @staticmethod
+    def _solver_key(solver) -> tuple:
+        return (solver.model.name, type(solver).__name__, solver.distance_metric.__name__,
+                solver.search_space_multiplier, None if solver.quantized is None else solver.quantized.dtype.name,
+                solver.filter_illegal, solver.adaptive_depth, None if solver.index is None else solver.index.key,
+                solver.branch_and_bound, solver.bound_tolerance)
+
+    def result_key(self, solver, words_to_hit: list, words_to_avoid: list, n: int) -> tuple:
+        # Words to hit in order, since the linked words of the guesses follow it
+        return (*self._solver_key(solver), solver.threshold, tuple(words_to_hit), frozenset(words_to_avoid or ()), n)
+
+    def candidate_key(self, solver, words: tuple, k: int) -> tuple:
+        return (*self._solver_key(solver), frozenset(words), k)
+
+    def get_result(self, key: tuple):
+        result = self.results.get(key)
+        if result is None:
+            return None
+        return [Guess(clue=clue, similarity=similarity, linked_words=linked_words, score=score)
+                for clue, similarity, linked_words, score in result]
+
+    def put_result(self, key: tuple, guesses: list):
+        self.results.put(key, tuple((guess.clue, guess.similarity, tuple(guess.linked_words), guess.score)
+                                    for guess in guesses))
+
+    def get_candidates(self, key: tuple):
+        return self.candidates.get(key)
+
+    def put_candidates(self, key: tuple, rows: np.array, scores: np.array):
+        rows, scores = rows.copy(), scores.copy()
+        rows.flags.writeable = False
+        scores.flags.writeable = False
+        self.candidates.put(key, (rows, scores))
+
+    @property
+    def stats(self) -> dict:
+        return {"results": self.results.stats, "candidates": self.candidates.stats}
+
+
+def estimate_nbytes(value) -> int:
+    """Approximate memory used by value, following tuples/lists and counting numpy buffers."""
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value) + (0 if value.base is None else value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(item) for item in value)
+    return sys.getsizeof(value)
@@ -0,0 +1,261 @@
+import copy
+from typing import Callable
+
+import numpy as np
+
+from bot.guess import GuessBatch
+
+# Bytes a fetch takes per buffered candidate, in temporaries while merging blocks (see _merge_top_candidates), as a
+# multiple of the candidate's own
+_FETCH_OVERHEAD = 4
+
+
+class CandidateStream:
+    def __init__(self, combinations: list, candidate_rows: np.array, candidate_scores: np.array, depth: int,
+                 vocabulary_size: int, first: int, fetch: Callable = None, min_similarity: Callable = None,
+                 max_bytes: int = None, scan: Callable = None):
+        """Candidate clues of every word combination of a board, handed out best first per combination (see
+        EmbeddingScorer.advance). When a combination's buffer runs out, it gets a buffer of its own with its next
+        best candidates, the ones not handed out yet, from fetch or extend. Each refill goes four times deeper than the
+        last one, as long as all buffers together fit in max_bytes. Past that, a combination scans the rest of the
+        vocabulary block by block instead (see scan_refill).
+
+        :param combinations: Linked words of each combination
+        :param candidate_rows: (n_combinations, depth) rows of the best clues of each combination, sorted by
+        descending score, -inf where there are none
+        :param candidate_scores: Their similarities
+        :param depth: Number of clues asked for per combination
+        :param vocabulary_size: Most clues a combination can have
+        :param first: Clues handed out per combination at first
+        :param fetch: Called with (columns, depth, handed_out), returns the best rows and similarities of combinations
+        columns as above, leaving out the clues handed out already (see handed_out)
+        :param min_similarity: Called with a threshold, returns the similarity per combination a clue must exceed to
+        be connected to all its words
+        :param max_bytes: Most bytes of buffered candidates, counting what fetching them takes, None for no limit
+        :param scan: Called with (columns, start, handed_out), returns the rows of a block of the vocabulary from row
+        start on, the (len(columns), block size) similarities of combinations columns to them, -inf for the clues
+        masked out or handed out already, and the row after the block. Without it, combinations past max_bytes
+        take more refills of the deepest buffers that fit
+        """
+        self.combinations = combinations
+        self.vocabulary_size = vocabulary_size
+        self.first = first
+        self.fetch = fetch
+        self.min_similarity = min_similarity
+        self.max_bytes = max_bytes
+        self.scan = scan
+        self._floors = {}
+        self.sizes = np.array([len(words) for words in combinations], dtype=np.intp)
+        # Shared by restarted streams, so never changed in place
+        self._first_rows, self._first_scores, self._first_depth = candidate_rows, candidate_scores, depth
+        self.consumed = self.spent = self.available = self.depth = self.complete = self.paged = None
+        self.scan_start = None
+        self._start()
+
+    def _start(self):
+        """Hands out the first candidates from the start."""
+        n_combinations = len(self)
+        # Handed out of the current buffer, and of the buffers before it
+        self.consumed = np.zeros(n_combinations, dtype=np.intp)
+        self.spent = np.zeros(n_combinations, dtype=np.intp)
+        # Candidates are sorted, so masked ones (-inf) come last
+        self.available = np.isfinite(self._first_scores).sum(axis=1)
+        self.depth = np.full(n_combinations, self._first_depth, dtype=np.intp)
+        # Fewer candidates than asked for means the vocabulary has no more
+        self.complete = (self.available < self.depth) | (self.depth >= self.vocabulary_size)
+        # Combinations refilled since, with their own buffer, and the sorted rows handed out of their earlier buffers
+        self.paged = np.zeros(n_combinations, dtype=bool)
+        self._pages = {}
+        self._spent_rows = {}
+        # Next row of the vocabulary each combination scans, -1 for those that don't
+        self.scan_start = np.full(n_combinations, -1, dtype=np.intp)
+        self._next_scores = self._scores_at(np.arange(n_combinations), self.consumed)
+        self._last_scores = np.full(n_combinations, np.inf)
+
+    def restart(self) -> "CandidateStream":
+        """A stream of the same candidates from the start, e.g. to score them again. It refills its own buffers."""
+        stream = copy.copy(self)
+        stream._start()
+        return stream
+
+    def floors(self, threshold: float) -> np.array:
+        """min_similarity of threshold, computed once per threshold."""
+        if threshold not in self._floors:
+            self._floors[threshold] = np.full(len(self), -np.inf) if self.min_similarity is None else \
+                self.min_similarity(threshold)
+        return self._floors[threshold]
+
+    def __len__(self) -> int:
+        return len(self.combinations)
+
+    @property
+    def remaining(self) -> np.array:
+        """Buffered clues not handed out yet, per combination."""
+        return self.available - self.consumed
+
+    def _buffer(self, column: int) -> tuple:
+        """Rows and similarities of the current buffer of combination column."""
+        if self.paged[column]:
+            return self._pages[column]
+        return self._first_rows[column], self._first_scores[column]
+
+    def _scores_at(self, columns: np.array, ranks: np.array) -> np.array:
+        """Similarity at ranks of the current buffers of combinations columns, -inf past their available clues."""
+        scores = np.full(len(columns), -np.inf)
+        valid = ranks < self.available[columns]
+        first = valid & ~self.paged[columns]
+        scores[first] = self._first_scores[columns[first], ranks[first]]
+        for position in np.flatnonzero(valid & self.paged[columns]).tolist():
+            scores[position] = self._pages[columns[position]][1][ranks[position]]
+        return scores
+
+    def upper_bounds(self) -> np.array:
+        """Similarity of the best clue not handed out yet, per combination: the next buffered one, or when the buffer
+        is used up the last one handed out. Combinations scanning the vocabulary keep the last one handed out before
+        the scan. -inf for combinations that have no more.
+        """
+        return np.where(self.remaining > 0, self._next_scores,
+                        np.where(self.complete, -np.inf, self._last_scores))
+
+    def pull(self, columns: np.array) -> GuessBatch:
+        """Hands out the next buffered clues of combinations columns: first self.first per combination, then as many
+        as were handed out before.
+
+        :param columns: Combinations to pull from
+        :return: GuessBatch, ordered by combination and then by descending similarity, except for the blocks of the
+        combinations scanning the vocabulary
+        """
+        consumed = self.consumed[columns]
+        counts = np.minimum(np.maximum(self.spent[columns] + consumed, self.first), self.remaining[columns])
+        stops = np.cumsum(counts)
+        combination_ids = np.repeat(columns, counts)
+        ranks = np.arange(stops[-1] if len(stops) else 0) - np.repeat(stops - counts - consumed, counts)
+
+        clue_rows = np.empty(len(combination_ids), dtype=self._first_rows.dtype)
+        similarity = np.empty(len(combination_ids), dtype=float)
+        first = ~self.paged[combination_ids]
+        clue_rows[first] = self._first_rows[combination_ids[first], ranks[first]]
+        similarity[first] = self._first_scores[combination_ids[first], ranks[first]]
+        for position in np.flatnonzero(self.paged[columns]).tolist():
+            rows, scores = self._pages[columns[position]]
+            start, stop = consumed[position], consumed[position] + counts[position]
+            clue_rows[stops[position] - counts[position]:stops[position]] = rows[start:stop]
+            similarity[stops[position] - counts[position]:stops[position]] = scores[start:stop]
+
+        self.consumed[columns] += counts
+        # The bounds of scanning combinations stay as the scan started
+        sorted_columns = self.scan_start[columns] < 0
+        pulled = (counts > 0) & sorted_columns
+        self._last_scores[columns[pulled]] = similarity[stops[pulled] - 1]
+        self._next_scores[columns[sorted_columns]] = self._scores_at(columns[sorted_columns],
+                                                                     self.consumed[columns[sorted_columns]])
+        return GuessBatch(clue_rows=clue_rows, similarity=similarity, combination_ids=combination_ids,
+                          combinations=self.combinations)
+
+    def batch(self) -> GuessBatch:
+        """Every clue of the first buffers at once, as a search of fixed depth returns them."""
+        combination_ids, ranks = np.nonzero(np.isfinite(self._first_scores))
+        return GuessBatch(clue_rows=self._first_rows[combination_ids, ranks],
+                          similarity=self._first_scores[combination_ids, ranks].astype(float),
+                          combination_ids=combination_ids,
+                          combinations=self.combinations)
+
+    def handed_out(self, columns: np.array) -> list:
+        """Clues handed out so far of combinations columns, to leave out of their next candidates.
+
+        :return: List with the sorted rows of each combination
+        """
+        handed_out = []
+        for column in columns.tolist():
+            rows = np.sort(self._buffer(column)[0][:self.consumed[column]])
+            if column in self._spent_rows:
+                # Merging two sorted runs, which a stable sort does in linear time
+                rows = np.sort(np.concatenate([self._spent_rows[column], rows]), kind="stable")
+            handed_out.append(rows)
+        return handed_out
+
+    def _wanted_depth(self, columns: np.array) -> int:
+        """Four times the deepest buffer of combinations columns, so that a combination needing many candidates takes
+        few passes over the vocabulary, and at most the vocabulary."""
+        return min(4 * int(self.depth[columns].max(initial=1)), self.vocabulary_size)
+
+    def next_depth(self, columns: np.array) -> int:
+        """Depth of the next buffers of combinations columns: _wanted_depth, but with max_bytes at most what keeps all
+        buffers, and the temporaries of fetching them, within it (and at least self.first)."""
+        depth = self._wanted_depth(columns)
+        if self.max_bytes is not None:
+            others = self.paged.copy()
+            others[columns] = False
+            buffered = self._first_rows.size + int(self.depth[others].sum())
+            item_bytes = _FETCH_OVERHEAD * (self._first_rows.itemsize + self._first_scores.itemsize)
+            depth = min(depth, max((self.max_bytes // item_bytes - buffered) // max(len(columns), 1), self.first))
+        return depth
+
+    def refill(self, columns: np.array):
+        """Refills the buffers of combinations columns, with scan_refill or else with self.fetch (see next_depth)."""
+        columns = self.scan_refill(columns)
+        if len(columns):
+            depth = self.next_depth(columns)
+            self.extend(columns, *self.fetch(columns, depth, self.handed_out(columns)), depth)
+
+    def scan_refill(self, columns: np.array) -> np.array:
+        """Refills the buffers of the combinations of columns that scan the vocabulary with its next block: those
+        whose next_depth would be cut short by max_bytes start scanning, once self.scan is set. Every clue of a block
+        not handed out yet is buffered, unsorted, so the combination's upper bound stays the last similarity handed
+        out before the scan, and it is complete at the end of the vocabulary. One pass over the vocabulary then
+        replaces the many refills that buffers of bounded depth would need.
+
+        :param columns: Combinations to refill
+        :return: The others, to refill with self.fetch or extend
+        """
+        if self.scan is None or not len(columns):
+            return columns
+        paging = columns[self.scan_start[columns] < 0]
+        if len(paging) and self.next_depth(paging) < self._wanted_depth(paging):
+            for column, handed_rows in zip(paging.tolist(), self.handed_out(paging)):
+                self._spent_rows[column] = handed_rows
+            self.spent[paging] += self.consumed[paging]
+            self.consumed[paging] = 0
+            self.available[paging] = 0
+            self._next_scores[paging] = self._last_scores[paging]
+            self.scan_start[paging] = 0
+
+        scanning = columns[self.scan_start[columns] >= 0]
+        starts = self.scan_start[scanning]
+        for start in np.unique(starts).tolist():
+            group = scanning[starts == start]
+            rows, scores, stop = self.scan(group, start, [self._spent_rows[column] for column in group.tolist()])
+            for column, column_scores in zip(group.tolist(), scores):
+                finite = np.isfinite(column_scores)
+                self._pages[column] = (rows[finite], column_scores[finite])
+            self.paged[group] = True
+            self.spent[group] += self.consumed[group]
+            self.consumed[group] = 0
+            self.depth[group] = len(rows)
+            self.available[group] = np.isfinite(scores).sum(axis=1)
+            self.scan_start[group] = stop
+            self.complete[group] = stop >= self.vocabulary_size
+        return columns[self.scan_start[columns] < 0]
+
+    def extend(self, columns: np.array, rows: np.array, scores: np.array, depth: int):
+        """Gives combinations columns new buffers with their next candidates. Only these are allocated; the clues
+        handed out of the old buffers are kept aside (see handed_out).
+
+        :param columns: Combinations refilled
+        :param rows: (len(columns), depth) rows of their best clues that weren't handed out yet (see handed_out),
+        sorted by descending score
+        :param scores: Their similarities
+        :param depth: Number of clues asked for per combination
+        """
+        for column, spent_rows, column_rows, column_scores in zip(columns.tolist(), self.handed_out(columns), rows,
+                                                                  scores):
+            self._spent_rows[column] = spent_rows
+            self._pages[column] = (np.array(column_rows), np.array(column_scores))
+        self.paged[columns] = True
+        self.spent[columns] += self.consumed[columns]
+        self.consumed[columns] = 0
+        self.depth[columns] = depth
+        self.available[columns] = np.isfinite(scores).sum(axis=1)
+        self.complete[columns] = (self.available[columns] < depth) | \
+            (self.spent[columns] + depth >= self.vocabulary_size)
+        self._next_scores[columns] = self._scores_at(columns, self.consumed[columns])
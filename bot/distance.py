@@ -1,35 +1,77 @@
 import numpy as np
 
 
-class Cosine:
-    def __init__(self, array1: np.array, array2: np.array):
-        self.array1 = array1
-        self.array2 = array2
+def squared_norms(array: np.array) -> np.array:
+    return np.einsum("ij,ij->i", array, array)
 
-    def distance(self):
-        if self.array1.ndim == 1:
-            self.array1 = self.array1.reshape(1, self.array1.shape[0])
-        if self.array2.ndim == 1:
-            self.array2 = self.array2.reshape(1, self.array2.shape[0])
-        sumyy = (self.array2 ** 2).sum(1)
-        sumxx = (self.array1 ** 2).sum(1, keepdims=1)
-        sumxy = self.array1.dot(self.array2.T)
-        return (sumxy / np.sqrt(sumxx)) / np.sqrt(sumyy)
 
+class Metric:
+    """Metric kernel. pairwise compares every query with every key in one matrix product; squared norms can be passed
+    in when they are already known (e.g. EmbeddingMatrix.sq_norms) so they aren't recomputed on every call.
+
+    The instance API (Metric(array1, array2).distance()) is kept for one-off comparisons.
+    """
+    uses_norms = True
 
-class DotProduct:
     def __init__(self, array1: np.array, array2: np.array):
         self.array1 = array1
         self.array2 = array2
 
-    def distance(self):
-        return np.dot(self.array1, self.array2.T)
+    def distance(self) -> np.array:
+        return self.pairwise(np.atleast_2d(self.array1), np.atleast_2d(self.array2))
 
+    @classmethod
+    def pairwise(cls, queries: np.array, keys: np.array, query_sq_norms: np.array = None,
+                 key_sq_norms: np.array = None) -> np.array:
+        """Compares every query with every key.
+
+        :param queries: 2D array of query vectors
+        :param keys: 2D array of key vectors
+        :param query_sq_norms: Squared norms of queries, computed if not given
+        :param key_sq_norms: Squared norms of keys, computed if not given
+        :return: (len(queries), len(keys)) array
+        """
+        dots = queries @ keys.T
+        if not cls.uses_norms:
+            return cls.from_dot_products(dots, None, None)
+        if query_sq_norms is None:
+            query_sq_norms = squared_norms(queries)
+        if key_sq_norms is None:
+            key_sq_norms = squared_norms(keys)
+        return cls.from_dot_products(dots, query_sq_norms, key_sq_norms)
+
+    @staticmethod
+    def from_dot_products(dots: np.array, sq_norms1: np.array, sq_norms2: np.array) -> np.array:
+        """Metric from precomputed dot products and squared norms.
+
+        :param dots: Dot products, shape (len(sq_norms1), len(sq_norms2))
+        :param sq_norms1: Squared norms of the row vectors
+        :param sq_norms2: Squared norms of the column vectors
+        :return: Same shape as dots
+        """
+        raise NotImplementedError
+
+
+class Cosine(Metric):
+    @staticmethod
+    def from_dot_products(dots: np.array, sq_norms1: np.array, sq_norms2: np.array) -> np.array:
+        return (dots / np.sqrt(sq_norms1)[:, None]) / np.sqrt(sq_norms2)
+
+
+class DotProduct(Metric):
+    uses_norms = False
+
+    @staticmethod
+    def from_dot_products(dots: np.array, sq_norms1: np.array, sq_norms2: np.array) -> np.array:
+        return dots
+
+
+class Euclidian(Metric):
+    @staticmethod
+    def from_dot_products(dots: np.array, sq_norms1: np.array, sq_norms2: np.array) -> np.array:
+        """Euclidian distances via |a-b|^2 = |a|^2 + |b|^2 - 2ab.
+        """
+        return np.sqrt(np.maximum(sq_norms1[:, None] + sq_norms2 - 2 * dots, 0))
 
-class Euclidian:
-    def __init__(self, array1: np.array, array2: np.array):
-        self.array1 = array1
-        self.array2 = array2
 
-    def distance(self):
-        return np.linalg.norm((self.array1 - self.array2), axis=1)
+Euclidean = Euclidian
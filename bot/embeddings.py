@@ -0,0 +1,194 @@
+import hashlib
+import json
+import mmap
+import os
+
+import numpy as np
+
+from bot.distance import squared_norms
+from bot.legality import LegalityIndex
+
+CACHE_FORMAT_VERSION = 1
+
+
+class EmbeddingMatrix:
+    def __init__(self, vectors: np.array, words: np.array, name: str = ''):
+        """Contiguous embedding store. Row i of vectors is the embedding of words[i].
+
+        :param vectors: 2D row-major array of shape (vocabulary size, embedding dimension)
+        :param words: 1D array mapping row -> word
+        :param name: Name of the embeddings, used for logging and caching
+        """
+        self.vectors = vectors
+        self.words = words
+        self.index = {word: row for row, word in enumerate(words.tolist())}
+        self.name = name
+        # Checksum of the file the embeddings were parsed from, if known (see checksums)
+        self.source_sha256 = None
+        self._sq_norms = None
+        self._legality = None
+        self._vocabulary_sha256 = None
+
+    @classmethod
+    def from_dict(cls, embeddings: dict, dtype=np.float32, name: str = ''):
+        """Builds the store from a word -> vector dict (as returned by the get_embeddings_*_style parsers).
+
+        :param embeddings: Dict of word -> 1D array
+        :param dtype: Float type of the matrix. np.float32 (default) or np.float64
+        :param name: Name of the embeddings
+        :return: EmbeddingMatrix
+        """
+        words = np.array(list(embeddings.keys()))
+        dim = len(next(iter(embeddings.values()))) if embeddings else 0
+        vectors = np.empty(shape=(len(words), dim), dtype=dtype)
+        for row, embedding in enumerate(embeddings.values()):
+            vectors[row] = embedding
+        return cls(vectors=vectors, words=words, name=name)
+
+    @classmethod
+    def load(cls, path: str, name: str = '', mmap: bool = True):
+        """Opens a store written by save. With mmap the matrix is memory-mapped read only, so loading is near
+        instant and processes opening the same file share its pages.
+
+        :param path: Cache path (without extension) used with save
+        :param name: Name of the embeddings
+        :param mmap: Memory-map the matrix rather than reading it into memory
+        :return: EmbeddingMatrix
+        """
+        # Plain ndarray view over the mapping; np.memmap's subclass hooks slow down every operation on it
+        vectors = np.load(f"{path}.npy", mmap_mode="r" if mmap else None).view(np.ndarray)
+        with open(f"{path}.vocab", "r", encoding="utf-8") as file:
+            text = file.read()
+        # An empty vocabulary is written as an empty file, not one empty word
+        words = np.array(text.split("\n") if text else [], dtype=str)
+        embeddings = cls(vectors=vectors, words=words, name=name)
+        embeddings.source_sha256 = cls.read_header(path).get("source_sha256")
+        return embeddings
+
+    @staticmethod
+    def read_header(path: str) -> dict:
+        """Reads the header of a store written by save. Returns an empty dict if there is none.
+
+        :param path: Cache path (without extension)
+        :return: Header dict
+        """
+        try:
+            with open(f"{path}.json", "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, path: str, vectors_file: str = None, **metadata):
+        """Writes the store as a raw .npy matrix, a .vocab sidecar (one word per line) and a .json header holding
+        dimension, dtype and any extra metadata (e.g. source checksum). Files are written atomically.
+
+        :param path: Cache path (without extension)
+        :param vectors_file: .npy file already holding self.vectors (e.g. written by parse_embeddings), moved into
+        place rather than writing the matrix again
+        :param metadata: Extra header fields
+        """
+        header = {
+            "format_version": CACHE_FORMAT_VERSION,
+            "rows": len(self),
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            **metadata
+        }
+        # Invalidate any existing cache first so readers never pair a new matrix with an old header
+        if os.path.exists(f"{path}.json"):
+            os.remove(f"{path}.json")
+        if vectors_file is None:
+            _write_atomic(f"{path}.npy", lambda file: np.save(file, np.ascontiguousarray(self.vectors)), "wb")
+        else:
+            os.replace(vectors_file, f"{path}.npy")
+        _write_atomic(f"{path}.vocab", lambda file: file.write("\n".join(self.words.tolist())), "w")
+        # Header goes last so a half-written cache is never picked up
+        EmbeddingMatrix.write_header(path, header)
+
+    @staticmethod
+    def write_header(path: str, header: dict):
+        """Writes (or replaces) the header of a store, atomically.
+
+        :param path: Cache path (without extension)
+        :param header: Header dict, as read by read_header
+        """
+        _write_atomic(f"{path}.json", lambda file: json.dump(header, file), "w")
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    @property
+    def dtype(self):
+        return self.vectors.dtype
+
+    @property
+    def sq_norms(self) -> np.array:
+        """Squared norms of every row, computed once and reused by the metric kernels."""
+        if self._sq_norms is None:
+            self._sq_norms = squared_norms(self.vectors)
+        return self._sq_norms
+
+    @sq_norms.setter
+    def sq_norms(self, sq_norms: np.array):
+        """Sets norms that are already known (e.g. QuantizedMatrix.sq_norms), so a memory-mapped matrix isn't read
+        in full to compute them."""
+        self._sq_norms = sq_norms
+
+    @property
+    def checksums(self) -> dict:
+        """Source checksum and checksum of the vocabulary in row order, saved with the files derived from these
+        embeddings (QuantizedMatrix, NearestNeighbourIndex) and checked when they are loaded. The source checksum is
+        empty if it isn't known."""
+        if self._vocabulary_sha256 is None:
+            self._vocabulary_sha256 = hashlib.sha256("\n".join(self.words.tolist()).encode("utf-8")).hexdigest()
+        return {"source_sha256": self.source_sha256 or "", "vocabulary_sha256": self._vocabulary_sha256}
+
+    @property
+    def legality(self) -> LegalityIndex:
+        """LegalityIndex of the vocabulary, built on first use and shared by every solver of these embeddings."""
+        if self._legality is None:
+            self._legality = LegalityIndex(self.words, self.index)
+        return self._legality
+
+    def advise_random_access(self):
+        """Tells the kernel that rows of a memory-mapped matrix are read at random (e.g. only the candidates found on
+        a QuantizedMatrix), so that reading one row doesn't read ahead the pages after it. A no-op if the matrix isn't
+        memory-mapped or madvise isn't supported.
+        """
+        base = self.vectors
+        while base is not None and not isinstance(base, mmap.mmap):
+            base = getattr(base, "base", None)
+        if base is not None and hasattr(mmap, "MADV_RANDOM"):
+            base.madvise(mmap.MADV_RANDOM)
+
+    def rows(self, words: list) -> np.array:
+        """Row indices of words. Raises KeyError if a word is not in the vocabulary.
+
+        :param words: Words to look up
+        :return: 1D array of row indices
+        """
+        return np.array([self.index[word] for word in words], dtype=np.intp)
+
+    def get(self, word: str, default=None):
+        row = self.index.get(word)
+        if row is None:
+            return default
+        return self.vectors[row]
+
+    def __getitem__(self, word: str) -> np.array:
+        return self.vectors[self.index[word]]
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.index
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+
+def _write_atomic(path: str, write, mode: str):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    encoding = None if "b" in mode else "utf-8"
+    with open(tmp_path, mode, encoding=encoding) as file:
+        write(file)
+    os.replace(tmp_path, path)
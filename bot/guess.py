@@ -1,6 +1,8 @@
 from dataclasses import field, dataclass, asdict
 from typing import Optional
 
+import numpy as np
+
 
 @dataclass
 class Guess:
@@ -19,3 +21,68 @@ class Guess:
     def as_dict(self):
         data = asdict(self)
         return {key: value for key, value in data.items() if value is not None}
+
+
+@dataclass
+class GuessBatch:
+    """Columnar equivalent of a list of Guess objects. Guess i has clue embeddings.words[clue_rows[i]], similarity
+    similarity[i] and linked words combinations[combination_ids[i]].
+    """
+    clue_rows: np.array
+    similarity: np.array
+    combination_ids: np.array
+    combinations: list
+
+    @classmethod
+    def from_guesses(cls, guesses: list, embeddings):
+        combination_ids = {}
+        for guess in guesses:
+            combination_ids.setdefault(tuple(guess.linked_words), len(combination_ids))
+        return cls(clue_rows=embeddings.rows([guess.clue for guess in guesses]),
+                   similarity=np.array([guess.similarity for guess in guesses], dtype=float),
+                   combination_ids=np.array([combination_ids[tuple(guess.linked_words)] for guess in guesses],
+                                            dtype=np.intp),
+                   combinations=list(combination_ids.keys()))
+
+    @classmethod
+    def concatenate(cls, batches: list, combinations: list):
+        """Guesses of batches one after another. Every batch indexes into the same combinations."""
+        return cls(clue_rows=np.concatenate([batch.clue_rows for batch in batches] + [np.empty(0, dtype=np.intp)]),
+                   similarity=np.concatenate([batch.similarity for batch in batches] + [np.empty(0)]),
+                   combination_ids=np.concatenate([batch.combination_ids for batch in batches] +
+                                                  [np.empty(0, dtype=np.intp)]),
+                   combinations=combinations)
+
+    @property
+    def num_words_linked(self) -> np.array:
+        return np.array([len(words) for words in self.combinations], dtype=np.intp)[self.combination_ids]
+
+    def to_guesses(self, embeddings, scores: np.array = None) -> list:
+        """Builds Guess objects, optionally with scores.
+
+        :param embeddings: EmbeddingMatrix the clue rows index into
+        :param scores: Scores, one per guess
+        :return: List of Guess objects
+        """
+        clues = embeddings.words[self.clue_rows].tolist()
+        similarities = self.similarity.tolist()
+        scores = [.0] * len(self) if scores is None else np.asarray(scores).tolist()
+        return [Guess(clue=clue, similarity=similarity, linked_words=self.combinations[combination_id], score=score)
+                for clue, similarity, combination_id, score
+                in zip(clues, similarities, self.combination_ids.tolist(), scores)]
+
+    def __getitem__(self, ixs):
+        return GuessBatch(clue_rows=self.clue_rows[ixs],
+                          similarity=self.similarity[ixs],
+                          combination_ids=self.combination_ids[ixs],
+                          combinations=self.combinations)
+
+    def __len__(self) -> int:
+        return len(self.clue_rows)
+
+
+class GuessList(list):
+    """List of Guess objects returned by an instrumented solve, with the SolveStats of that solve."""
+    def __init__(self, guesses=(), stats=None):
+        super().__init__(guesses)
+        self.stats = stats
@@ -0,0 +1,206 @@
+import logging
+import os
+
+import numpy as np
+
+from bot.distance import Cosine, DotProduct, squared_norms
+from bot.embeddings import EmbeddingMatrix
+from bot.utils import get_top_n_sorted_by_column
+
+
+class NearestNeighbourIndex:
+    """Maximum inner product search over an EmbeddingMatrix. With Cosine the stored vectors are unit normalised, so
+    inner products with a query are that query's (scaled) cosine similarities; with DotProduct they are stored as is.
+    """
+    name = "index"
+
+    def __init__(self):
+        self.metric = None
+        self.vectors = None
+        # EmbeddingMatrix.checksums of the indexed embeddings
+        self.checksums = {}
+        self.logger = logging.getLogger(__name__)
+
+    def build(self, embeddings: EmbeddingMatrix, metric=Cosine):
+        """Builds the index over embeddings for metric.
+
+        :param embeddings: EmbeddingMatrix to index
+        :param metric: Cosine or DotProduct
+        :return: self
+        """
+        if metric not in (Cosine, DotProduct):
+            raise ValueError(f"{type(self).__name__} supports Cosine and DotProduct, not {metric.__name__}")
+        self.metric = metric
+        self.vectors = self._prepare_vectors(embeddings, metric)
+        self.checksums = embeddings.checksums
+        return self
+
+    def search(self, queries: np.array, k: int) -> tuple:
+        """Finds the k rows with the largest inner product with each query.
+
+        :param queries: (n_queries, dim) array
+        :param k: Number of rows to return per query
+        :return: (n_queries, k) rows and inner products, sorted by descending inner product. Padded with row -1 and
+        score -inf when fewer than k rows are found
+        """
+        raise NotImplementedError
+
+    @property
+    def settings(self) -> dict:
+        """Parameters identifying the index, used to name and validate saved indexes."""
+        return {}
+
+    @property
+    def key(self) -> tuple:
+        """Parameters that affect search results, used to tell apart the cached results of solvers (see
+        SolverCache)."""
+        return (type(self).__name__, *sorted(self.settings.items()))
+
+    @property
+    def is_built(self) -> bool:
+        return self.vectors is not None
+
+    def cache_path(self, embedding_path: str, metric=Cosine) -> str:
+        """Where the index for embeddings at embedding_path is saved, next to the embeddings."""
+        settings = "_".join(f"{key}{value}" for key, value in self.settings.items())
+        return f"{embedding_path}.{self.name}_{metric.__name__.lower()}_{settings}.npz"
+
+    def save(self, path: str):
+        raise NotImplementedError
+
+    def load(self, path: str, embeddings: EmbeddingMatrix, metric=Cosine) -> bool:
+        """Loads an index saved by save if it was built over embeddings (same shape, source and vocabulary) for metric
+        with self.settings.
+
+        :return: Whether it was loaded. Never if the source of embeddings isn't known
+        """
+        return False
+
+    @staticmethod
+    def _prepare_vectors(embeddings: EmbeddingMatrix, metric) -> np.array:
+        if metric is Cosine:
+            return embeddings.vectors / np.sqrt(embeddings.sq_norms)[:, None]
+        return embeddings.vectors
+
+
+class BruteForceIndex(NearestNeighbourIndex):
+    """Exact search, one matrix product against the whole vocabulary. The reference for approximate indexes."""
+    name = "brute"
+
+    def search(self, queries: np.array, k: int) -> tuple:
+        scores = (self.vectors @ queries.T.astype(self.vectors.dtype))
+        rows = get_top_n_sorted_by_column(scores, k)
+        return rows.T, np.take_along_axis(scores, rows, axis=0).T
+
+    def save(self, path: str):
+        pass
+
+
+class IVFIndex(NearestNeighbourIndex):
+    """Inverted file index. Rows are clustered with k-means into n_lists lists; a query only scores the rows of the
+    n_probe lists whose centroids it has the largest inner product with.
+    """
+    name = "ivf"
+
+    def __init__(self, n_lists: int = None, n_probe: int = 8, n_iter: int = 10, train_size: int = 50000,
+                 seed: int = 0):
+        """
+        :param n_lists: Number of k-means clusters. Defaults to 4 * sqrt(vocabulary size)
+        :param n_probe: Number of lists searched per query. Higher is slower with better recall
+        :param n_iter: k-means iterations
+        :param train_size: Number of rows k-means is trained on
+        :param seed: Seed for k-means initialisation and sampling
+        """
+        super().__init__()
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.train_size = train_size
+        self.seed = seed
+        self.centroids = None
+        self.list_rows = None
+        self.list_offsets = None
+
+    @property
+    def settings(self) -> dict:
+        # n_probe only affects search, so an index is reusable across n_probe values. 0 lists means the default
+        return {"lists": self.n_lists or 0, "iter": self.n_iter, "train": self.train_size, "seed": self.seed}
+
+    @property
+    def key(self) -> tuple:
+        return (*super().key, ("probe", self.n_probe))
+
+    def build(self, embeddings: EmbeddingMatrix, metric=Cosine):
+        super().build(embeddings, metric)
+        n_lists = self.n_lists or int(4 * np.sqrt(len(embeddings)))
+        self.centroids = self._train(self.vectors, max(1, min(n_lists, len(embeddings))))
+        self._fill_lists(self._assign(self.vectors, self.centroids))
+        self.logger.info(f"Built IVF index with {len(self.centroids)} lists over {len(embeddings)} words")
+        return self
+
+    def search(self, queries: np.array, k: int) -> tuple:
+        queries = queries.astype(self.vectors.dtype)
+        n_probe = min(self.n_probe, len(self.centroids))
+        probes = get_top_n_sorted_by_column(self.centroids @ queries.T, n_probe).T
+
+        rows = np.full(shape=(len(queries), k), fill_value=-1, dtype=np.intp)
+        scores = np.full(shape=(len(queries), k), fill_value=-np.inf, dtype=self.vectors.dtype)
+        for query_ix, (query, lists) in enumerate(zip(queries, probes)):
+            candidates = np.concatenate([self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]]
+                                         for i in lists])
+            candidate_scores = self.vectors[candidates] @ query
+            top = np.argsort(-candidate_scores, kind="stable")[:k]
+            rows[query_ix, :len(top)] = candidates[top]
+            scores[query_ix, :len(top)] = candidate_scores[top]
+        return rows, scores
+
+    def save(self, path: str):
+        np.savez(path, centroids=self.centroids, list_rows=self.list_rows, list_offsets=self.list_offsets,
+                 n_vectors=len(self.vectors), dim=self.vectors.shape[1], metric=self.metric.__name__,
+                 **self.settings, **self.checksums)
+
+    def load(self, path: str, embeddings: EmbeddingMatrix, metric=Cosine) -> bool:
+        if not os.path.exists(path) or not embeddings.source_sha256:
+            return False
+        with np.load(path) as data:
+            expected = {"n_vectors": len(embeddings), "dim": embeddings.dim, "metric": metric.__name__,
+                        **self.settings, **embeddings.checksums}
+            if any(key not in data or data[key].item() != value for key, value in expected.items()):
+                return False
+            self.centroids = data["centroids"]
+            self.list_rows = data["list_rows"]
+            self.list_offsets = data["list_offsets"]
+        self.metric = metric
+        self.vectors = self._prepare_vectors(embeddings, metric)
+        self.checksums = embeddings.checksums
+        return True
+
+    def _train(self, vectors: np.array, n_lists: int) -> np.array:
+        """k-means on a sample of vectors."""
+        rng = np.random.default_rng(self.seed)
+        sample = vectors[np.sort(rng.choice(len(vectors), min(len(vectors), self.train_size), replace=False))]
+        centroids = sample[rng.choice(len(sample), min(n_lists, len(sample)), replace=False)].copy()
+        for _ in range(self.n_iter):
+            assignment = self._assign(sample, centroids)
+            counts = np.bincount(assignment, minlength=len(centroids))
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            non_empty = counts > 0
+            centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+            # Re-seed empty lists with random rows
+            centroids[~non_empty] = sample[rng.choice(len(sample), (~non_empty).sum())]
+        return centroids
+
+    @staticmethod
+    def _assign(vectors: np.array, centroids: np.array, block_size: int = 16384) -> np.array:
+        """Nearest (L2) centroid of each vector, in blocks to bound memory."""
+        centroid_sq_norms = squared_norms(centroids)
+        assignment = np.empty(len(vectors), dtype=np.intp)
+        for start in range(0, len(vectors), block_size):
+            block = vectors[start:start + block_size]
+            assignment[start:start + block_size] = np.argmin(centroid_sq_norms - 2 * block @ centroids.T, axis=1)
+        return assignment
+
+    def _fill_lists(self, assignment: np.array):
+        self.list_rows = np.argsort(assignment, kind="stable")
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=len(self.centroids)))])
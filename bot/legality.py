@@ -0,0 +1,110 @@
+import numpy as np
+
+
+class LegalityIndex:
+    def __init__(self, words: np.array, index: dict = None, max_suffix_bytes: int = 16, cache_size: int = 2 ** 16):
+        """Which words of a vocabulary are illegal clues for a word: those that contain it or are contained in it
+        (catfish and fish are illegal for each other, and a word for itself), as checked by
+        EmbeddingScorer._check_all_legal. Built once per vocabulary, so candidate searches can mask illegal clues out
+        before picking their top candidates.
+
+        Words containing a word are found in a sorted array of every suffix of every word (its first
+        max_suffix_bytes UTF-8 bytes): they are the suffixes starting with the word. Words contained in a word are its
+        substrings that are in the vocabulary.
+
+        :param words: 1D array of the vocabulary, row -> word
+        :param index: Word -> row mapping of words (e.g. EmbeddingMatrix.index), built if not given
+        :param max_suffix_bytes: Bytes of each suffix kept. Longer words are matched on their first bytes and checked
+        :param cache_size: Number of words whose illegal rows are remembered
+        """
+        self.words = words
+        self.index = index if index is not None else {word: row for row, word in enumerate(words.tolist())}
+        self.max_suffix_bytes = max_suffix_bytes
+        self.cache_size = cache_size
+        self._cache = {}
+        self.suffixes, self.suffix_rows = self._sorted_suffixes(words, max_suffix_bytes)
+
+    @staticmethod
+    def _sorted_suffixes(words: np.array, max_suffix_bytes: int) -> tuple:
+        """Every suffix of every word truncated to max_suffix_bytes, sorted, and the row of the word of each."""
+        encoded = np.array([word.encode("utf-8") for word in words.tolist()], dtype=bytes)
+        if not len(encoded) or not encoded.itemsize:
+            return np.empty(0, dtype=f"S{max_suffix_bytes}"), np.empty(0, dtype=np.int32)
+        lengths = np.char.str_len(encoded)
+        codes = encoded.view(np.uint8).reshape(len(encoded), encoded.itemsize)
+        suffixes, rows = [], []
+        for offset in range(encoded.itemsize):
+            offset_rows = np.flatnonzero(lengths > offset)
+            width = min(max_suffix_bytes, encoded.itemsize - offset)
+            block = np.zeros(shape=(len(offset_rows), max_suffix_bytes), dtype=np.uint8)
+            block[:, :width] = codes[offset_rows, offset:offset + width]
+            suffixes.append(block)
+            rows.append(offset_rows.astype(np.int32))
+        suffixes = np.concatenate(suffixes).view(f"S{max_suffix_bytes}").ravel()
+        order = np.argsort(suffixes, kind="stable")
+        return suffixes[order], np.concatenate(rows)[order]
+
+    def illegal_rows(self, word: str) -> np.array:
+        """Sorted rows of the vocabulary words that contain word or are contained in it (including word itself)."""
+        rows = self._cache.get(word)
+        if rows is not None:
+            return rows
+
+        encoded = word.encode("utf-8")
+        prefix = encoded[:self.max_suffix_bytes]
+        if prefix:
+            # Suffixes starting with prefix sort between prefix and prefix with its last byte incremented. UTF-8 has
+            # no 0xff bytes, so that increment never overflows
+            end = prefix[:-1] + bytes([prefix[-1] + 1])
+            start, stop = np.searchsorted(self.suffixes, [prefix, end])
+            containing = self.suffix_rows[start:stop]
+        else:
+            containing = np.empty(0, dtype=np.int32)
+        if len(encoded) > self.max_suffix_bytes:
+            containing = np.array([row for row in np.unique(containing).tolist() if word in self.words[row]],
+                                  dtype=np.int32)
+        contained = [self.index[substring] for substring in
+                     {word[start:stop] for start in range(len(word)) for stop in range(start + 1, len(word) + 1)}
+                     if substring in self.index]
+        rows = np.union1d(containing, np.array(contained, dtype=np.int32)).astype(np.intp)
+        rows.flags.writeable = False
+
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[word] = rows
+        return rows
+
+    def illegal_mask(self, words: list) -> np.array:
+        """Boolean mask of the vocabulary, True for rows that are illegal clues for any of words."""
+        mask = np.zeros(len(self.words), dtype=bool)
+        for word in words:
+            mask[self.illegal_rows(word)] = True
+        return mask
+
+    def combination_mask(self, words: list, membership: np.array) -> tuple:
+        """Rows that are illegal clues for some combination of words, and for which combinations.
+
+        :param words: Words to connect
+        :param membership: Boolean (len(words), n_combinations) combination membership matrix
+        :return: See combination_mask
+        """
+        return combination_mask([self.illegal_rows(word) for word in words], membership)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+
+def combination_mask(word_rows: list, membership: np.array) -> tuple:
+    """Combines rows masked per word into rows masked per combination: a row is masked for a combination if it is
+    masked for any of its words.
+
+    :param word_rows: Masked rows of each word
+    :param membership: Boolean (len(word_rows), n_combinations) combination membership matrix
+    :return: Sorted distinct rows, boolean (len(rows), n_combinations) matrix, True where the row is masked for the
+    combination
+    """
+    rows = np.unique(np.concatenate(word_rows)).astype(np.intp) if word_rows else np.empty(0, dtype=np.intp)
+    masked_for_word = np.zeros(shape=(len(rows), len(word_rows)), dtype=bool)
+    for position, masked in enumerate(word_rows):
+        masked_for_word[np.searchsorted(rows, masked), position] = True
+    return rows, masked_for_word @ membership
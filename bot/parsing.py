@@ -0,0 +1,179 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Union
+
+import numpy as np
+
+from bot.embeddings import EmbeddingMatrix
+
+STYLES = ("glove", "postspec", "paragram")
+
+
+def parse_embeddings(path: str, style: str = "glove", keep: Union[Iterable, Callable] = None, dtype=np.float32,
+                     workers: int = None, output_path: str = None, name: str = '',
+                     chunk_bytes: int = 2 ** 23) -> EmbeddingMatrix:
+    """Parses text embeddings straight into a preallocated matrix. Produces exactly what
+    EmbeddingMatrix.from_dict(get_embeddings_<style>_style(path)) would, without building a dict of vectors.
+
+    The file is split into byte ranges (on line boundaries) that are parsed in two passes, in parallel worker
+    processes: the first finds the words to keep and their lines, the second parses those lines' vectors directly into
+    their rows of the output. Rows that aren't kept are never converted to floats.
+
+    :param path: Path to the text embeddings
+    :param style: File format, one of STYLES (as read by the get_embeddings_*_style parsers)
+    :param keep: Words to keep, as a collection or a predicate on the word (picklable if workers > 1). All words of the
+    style by default
+    :param dtype: Float type of the matrix
+    :param workers: Number of worker processes. Defaults to the number of CPUs; 1 parses in this process
+    :param output_path: Write the matrix to this .npy file and memory-map it, rather than holding it in memory
+    :param name: Name of the embeddings
+    :param chunk_bytes: Approximate size of the byte ranges handed to workers
+    :return: EmbeddingMatrix
+    """
+    if style not in STYLES:
+        raise ValueError(f"Unknown embeddings style {style}, expected one of {STYLES}")
+    if keep is not None and not callable(keep):
+        keep = frozenset(keep).__contains__
+    workers = workers or os.cpu_count() or 1
+    ranges = _get_byte_ranges(path, style, max(workers, -(-os.path.getsize(path) // chunk_bytes)))
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(ranges) > 1 else None
+    try:
+        # Pass 1: kept words and the offsets of their lines
+        scans = _map(executor, _scan_range, [(path, start, end, style, keep) for start, end in ranges])
+        words, targets, dim = _assign_rows(scans)
+
+        # Pass 2: vectors, written straight into their rows
+        if executor is None and output_path is None:
+            vectors = np.empty(shape=(len(words), dim), dtype=dtype)
+            for (start, end), (_, offsets, _), chunk_targets in zip(ranges, scans, targets):
+                _parse_range(path, start, end, offsets, chunk_targets, vectors)
+        else:
+            vectors_path = output_path or _temporary_path()
+            # Only the header and the file size are written here; workers fill in their rows
+            np.lib.format.open_memmap(vectors_path, mode="w+", dtype=dtype, shape=(len(words), dim)).flush()
+            _map(executor, _parse_range_into_file,
+                 [(path, start, end, offsets, chunk_targets, vectors_path)
+                  for (start, end), (_, offsets, _), chunk_targets in zip(ranges, scans, targets)])
+            if output_path is None:
+                vectors = np.load(vectors_path)
+                os.remove(vectors_path)
+            else:
+                vectors = np.load(vectors_path, mmap_mode="r").view(np.ndarray)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return EmbeddingMatrix(vectors=vectors, words=np.array(words), name=name)
+
+
+def _temporary_path() -> str:
+    file, path = tempfile.mkstemp(suffix=".npy")
+    os.close(file)
+    return path
+
+
+def _map(executor, func, args: list) -> list:
+    if executor is None:
+        return [func(*arg) for arg in args]
+    return list(executor.map(func, *zip(*args)))
+
+
+def _get_byte_ranges(path: str, style: str, n_ranges: int) -> list:
+    """Splits the file into about n_ranges byte ranges, each starting at the beginning of a line."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as file:
+        first = len(file.readline()) if style == "paragram" else 0
+        boundaries = [first]
+        for target in np.linspace(first, size, n_ranges + 1)[1:-1].astype(np.int64).tolist():
+            if target <= boundaries[-1]:
+                continue
+            file.seek(target)
+            file.readline()
+            if file.tell() >= size:
+                break
+            boundaries.append(file.tell())
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries[:-1], boundaries[1:]) if end > start]
+
+
+def _read_word(line: bytes, style: str):
+    """The word a line holds in style, or None if the style's parser skips it."""
+    if style == "paragram":
+        return line.strip().split(b" ", 1)[0].decode("latin")
+    tokens = line.split(None, 1)
+    if not tokens:
+        return None
+    word = tokens[0].decode("utf-8")
+    if style == "glove":
+        return word if all(c.isalpha() for c in word) else None
+    parts = word.split("_")
+    return parts[1] if parts[0] == "en" and len(parts) > 1 else None
+
+
+def _scan_range(path: str, start: int, end: int, style: str, keep: Callable) -> tuple:
+    """Pass 1 over one byte range.
+
+    :return: Kept words, offsets of their lines (relative to start), dimension of the first kept line (or None)
+    """
+    with open(path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    words, offsets, dim = [], [], None
+    offset = 0
+    for line in data.split(b"\n"):
+        word = _read_word(line, style) if line else None
+        if word is not None and (keep is None or keep(word)):
+            if dim is None:
+                dim = len(line.split()) - 1
+            words.append(word)
+            offsets.append(offset)
+        offset += len(line) + 1
+    return words, np.array(offsets, dtype=np.int64), dim
+
+
+def _assign_rows(scans: list) -> tuple:
+    """Rows of the kept lines of every range, in file order. A repeated word keeps the row of its first occurrence
+    and the vector of its last, like the dict the get_embeddings_*_style parsers build.
+
+    :return: Words (row -> word), per range an array with the row each kept line is written to (-1 if it's overwritten
+    by a later occurrence), dimension
+    """
+    rows = {}
+    last = {}
+    for chunk_ix, (words, _, _) in enumerate(scans):
+        for line_ix, word in enumerate(words):
+            rows.setdefault(word, len(rows))
+            last[word] = (chunk_ix, line_ix)
+    targets = [np.full(len(words), -1, dtype=np.intp) for words, _, _ in scans]
+    for word, (chunk_ix, line_ix) in last.items():
+        targets[chunk_ix][line_ix] = rows[word]
+    dim = next((dim for _, _, dim in scans if dim is not None), 0)
+    return list(rows), targets, dim
+
+
+def _parse_range(path: str, start: int, end: int, offsets: np.array, targets: np.array, vectors: np.array):
+    """Pass 2 over one byte range: parses the kept lines' vectors into their rows of vectors."""
+    offsets, targets = offsets[targets >= 0], targets[targets >= 0]
+    if not len(targets):
+        return
+    with open(path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    values = []
+    for offset in offsets.tolist():
+        line_end = data.find(b"\n", offset)
+        line = data[offset:line_end if line_end >= 0 else len(data)].split(None, 1)
+        values.append(line[1] if len(line) > 1 else b"")
+    # One float64 parse for the whole range (then cast, as the dict parsers do), rather than one array per line
+    parsed = np.fromstring(b" ".join(values), dtype=np.float64, sep=" ")
+    if parsed.size != len(targets) * vectors.shape[1]:
+        raise ValueError(f"Lines in bytes {start}-{end} of {path} don't all have {vectors.shape[1]} values")
+    vectors[targets] = parsed.reshape(len(targets), vectors.shape[1])
+
+
+def _parse_range_into_file(path: str, start: int, end: int, offsets: np.array, targets: np.array,
+                           vectors_path: str):
+    vectors = np.load(vectors_path, mmap_mode="r+")
+    _parse_range(path, start, end, offsets, targets, vectors)
+    vectors.flush()
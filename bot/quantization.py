@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+
+from bot.embeddings import EmbeddingMatrix
+
+QUANTIZED_DTYPES = ("float16", "int8")
+
+
+class QuantizedMatrix:
+    """Compressed copy of an EmbeddingMatrix's vectors, used to find candidate clues with a fraction of the memory.
+    float16 halves float32 storage; int8 quarters it, each row being stored as round(row / scale) with its own scale
+    (its largest absolute value / 127). Squared norms are those of the full precision rows, so that with the
+    EmbeddingMatrix memory-mapped its pages are only read for the candidates that are re-scored.
+    """
+    def __init__(self, vectors: np.array, sq_norms: np.array, scales: np.array = None, checksums: dict = None):
+        """
+        :param vectors: (vocabulary size, dim) float16 or int8 array
+        :param sq_norms: Squared norms of the full precision rows
+        :param scales: Scale of each row, for int8
+        :param checksums: EmbeddingMatrix.checksums of the embeddings quantized
+        """
+        self.vectors = vectors
+        self.sq_norms = sq_norms
+        self.scales = scales
+        self.checksums = checksums or {}
+
+    @classmethod
+    def from_embeddings(cls, embeddings: EmbeddingMatrix, dtype: str = "int8", block_rows: int = 2 ** 16):
+        """Quantizes embeddings block by block, so a memory-mapped matrix is never read into memory at once.
+
+        :param embeddings: EmbeddingMatrix to compress
+        :param dtype: One of QUANTIZED_DTYPES
+        :param block_rows: Rows converted at a time
+        :return: QuantizedMatrix
+        """
+        if dtype not in QUANTIZED_DTYPES:
+            raise ValueError(f"Unknown quantized dtype {dtype}, expected one of {QUANTIZED_DTYPES}")
+        vectors = np.empty(shape=(len(embeddings), embeddings.dim), dtype=dtype)
+        scales = np.empty(len(embeddings), dtype=np.float32) if dtype == "int8" else None
+        for start in range(0, len(embeddings), block_rows):
+            block = np.asarray(embeddings.vectors[start:start + block_rows], dtype=np.float32)
+            if scales is None:
+                vectors[start:start + block_rows] = block
+                continue
+            block_scales = np.abs(block).max(axis=1, initial=0) / 127
+            block_scales[block_scales == 0] = 1
+            vectors[start:start + block_rows] = np.rint(block / block_scales[:, None])
+            scales[start:start + block_rows] = block_scales
+        return cls(vectors=vectors, sq_norms=embeddings.sq_norms, scales=scales, checksums=embeddings.checksums)
+
+    def dot_products(self, queries: np.array, start: int = 0, stop: int = None, chunk_rows: int = 4096) -> np.array:
+        """Approximate dot products between a block of rows and queries. Rows are converted to float32 chunk_rows at
+        a time into one buffer, so converting doesn't take more memory than the products themselves.
+
+        :param queries: (n_queries, dim) full precision query vectors
+        :param start: First row of the block
+        :param stop: End of the block, the last row by default
+        :param chunk_rows: Rows converted at a time
+        :return: (block size, n_queries) float32 array
+        """
+        vectors = self.vectors[start:stop]
+        queries = queries.T.astype(np.float32)
+        dots = np.empty(shape=(len(vectors), queries.shape[1]), dtype=np.float32)
+        buffer = np.empty(shape=(min(chunk_rows, len(vectors)), vectors.shape[1]), dtype=np.float32)
+        for chunk_start in range(0, len(vectors), chunk_rows):
+            chunk = vectors[chunk_start:chunk_start + chunk_rows]
+            np.copyto(buffer[:len(chunk)], chunk, casting="unsafe")
+            np.matmul(buffer[:len(chunk)], queries, out=dots[chunk_start:chunk_start + len(chunk)])
+        if self.scales is not None:
+            dots *= self.scales[start:stop, None]
+        return dots
+
+    @property
+    def dtype(self):
+        return self.vectors.dtype
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes + self.sq_norms.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    @staticmethod
+    def cache_path(embedding_path: str, embeddings: EmbeddingMatrix, dtype: str) -> str:
+        """Where the quantized copy of embeddings, loaded from embedding_path, is saved (without extension), next to
+        the embeddings. Named after their dtype and vocabulary, so each set of embeddings of a file has its own."""
+        vocabulary = embeddings.checksums["vocabulary_sha256"][:12]
+        return f"{embedding_path}.quantized_{np.dtype(dtype).name}.{embeddings.dtype.name}.vocab{vocabulary}"
+
+    def save(self, path: str):
+        """Writes the vectors as a .npy matrix (so they can be memory-mapped) and the norms, scales, shape and
+        checksums as a .npz, written last so a half-written copy is never loaded.
+
+        :param path: Path without extension
+        """
+        if os.path.exists(f"{path}.npz"):
+            os.remove(f"{path}.npz")
+        np.save(f"{path}.npy", self.vectors)
+        np.savez(f"{path}.npz", sq_norms=self.sq_norms,
+                 scales=np.empty(0, dtype=np.float32) if self.scales is None else self.scales,
+                 n_vectors=len(self.vectors), dim=self.vectors.shape[1], **self.checksums)
+
+    @classmethod
+    def load(cls, path: str, embeddings: EmbeddingMatrix, dtype: str, mmap: bool = True):
+        """Loads a QuantizedMatrix saved by save if it was quantized from embeddings (same shape, source and
+        vocabulary) with dtype. With mmap the vectors are memory-mapped read only, so processes loading the same file
+        share them.
+
+        :param path: Path without extension used with save
+        :return: QuantizedMatrix, or None if there is none at path, it doesn't match or the source of embeddings isn't
+        known
+        """
+        if not os.path.exists(f"{path}.npz") or not embeddings.source_sha256:
+            return None
+        with np.load(f"{path}.npz") as data:
+            expected = {"n_vectors": len(embeddings), "dim": embeddings.dim, **embeddings.checksums}
+            if any(key not in data or data[key].item() != value for key, value in expected.items()):
+                return None
+            sq_norms = data["sq_norms"]
+            scales = data["scales"] if dtype == "int8" else None
+        vectors = np.load(f"{path}.npy", mmap_mode="r" if mmap else None).view(np.ndarray)
+        if vectors.dtype != np.dtype(dtype) or vectors.shape != (len(embeddings), embeddings.dim) or \
+                sq_norms.dtype != embeddings.dtype:
+            return None
+        return cls(vectors=vectors, sq_norms=sq_norms, scales=scales, checksums=embeddings.checksums)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
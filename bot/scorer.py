@@ -1,19 +1,40 @@
 from __future__ import annotations
 
-from operator import itemgetter
-
 import numpy as np
 
+from bot.candidates import CandidateStream
 from bot.distance import Cosine
-from bot.guess import Guess
+from bot.embeddings import EmbeddingMatrix
+from bot.guess import Guess, GuessBatch
+from bot.stats import DISABLED, SolveStats
 from bot.utils import get_top_n_sorted
 
 
 class EmbeddingScorer:
-    def __init__(self, guesses: list, embeddings: dict, words_to_avoid: list, n: int, threshold: float,
-                 distance_metric=Cosine, metric: str = "similarity",
-                 incorrect_words_threshold_multiplier: float = 1):
+    def __init__(self, guesses: list | GuessBatch | CandidateStream, embeddings: EmbeddingMatrix, words_to_avoid: list,
+                 n: int, threshold: float, distance_metric=Cosine, metric: str = "similarity",
+                 incorrect_words_threshold_multiplier: float = 1, stats: SolveStats = None, prefiltered: bool = False):
+        """
+        :param guesses: Guesses to score, or a CandidateStream to pull them from as needed (see advance)
+        :param prefiltered: Guesses are already known to be legal (illegal clues were masked out while searching for
+        candidates, see LegalityIndex), so _check_all_legal is skipped
+        """
+        self.stats = stats or DISABLED
+        self.prefiltered = prefiltered
+        self.stream = None
+        if isinstance(guesses, CandidateStream):
+            # Pulling doesn't use up the caller's stream
+            self.stream = guesses.restart()
+            guesses = guesses.batch()[:0]
+        elif not isinstance(guesses, GuessBatch):
+            guesses = GuessBatch.from_guesses(guesses, embeddings)
         self.guesses = guesses
+        # Of a stream: (guesses, (n_thresholds, len(guesses)) mask of those kept, scores) of the guesses of every batch
+        # pulled that some threshold kept, and the best scores kept so far per threshold
+        self._pulled = []
+        self._best = None
+        self._thresholds = None
+        self._linked = None
         self.embeddings = embeddings
         self.words_to_avoid = words_to_avoid
         self.distance_metric = distance_metric
@@ -22,86 +43,262 @@ class EmbeddingScorer:
         self.threshold = threshold
         self.incorrect_words_threshold = incorrect_words_threshold_multiplier
 
-    def _score_single(self, guess: Guess) -> Guess:
-        """Takes metric of choice (from class) and multiplies by log of number of words linked.
+    def _scores(self) -> np.array:
+        """Takes metric of choice (from class) and multiplies by square root of number of words linked.
 
-        :param guess: Single Guess object
-        :return: Updated guess object
+        :return: Score of each guess
         """
-        guess.score = getattr(guess, self.metric) * np.sqrt(guess.num_words_linked)
-        return guess
+        return getattr(self.guesses, self.metric) * np.sqrt(self.guesses.num_words_linked)
+
+    def _similarities(self, clue_rows: np.array, words: list) -> np.array:
+        """Similarities between clues and words, computed in one go.
+
+        :param clue_rows: Rows of the clues
+        :param words: Words to compare against
+        :return: (len(clue_rows), len(words)) array of similarities
+        """
+        word_rows = self.embeddings.rows(words)
+        return self.distance_metric.pairwise(self.embeddings.vectors[clue_rows], self.embeddings.vectors[word_rows],
+                                             self.embeddings.sq_norms[clue_rows], self.embeddings.sq_norms[word_rows])
+
+    def _linked_words(self) -> tuple:
+        """Distinct linked words and a boolean (n_combinations, n_words) matrix saying which belong to which
+        combination. Kept while the combinations stay the same, as they do for every batch pulled from a stream.
+        """
+        if self._linked is not None and self._linked[0] is self.guesses.combinations:
+            return self._linked[1:]
+        words = list(dict.fromkeys(word for combination in self.guesses.combinations for word in combination))
+        positions = {word: position for position, word in enumerate(words)}
+        membership = np.zeros(shape=(len(self.guesses.combinations), len(words)), dtype=bool)
+        for combination_id, combination in enumerate(self.guesses.combinations):
+            membership[combination_id, [positions[word] for word in combination]] = True
+        self._linked = (self.guesses.combinations, words, membership)
+        return words, membership
 
     @staticmethod
-    def _check_all_legal(guess: Guess) -> Guess:
-        """Check if clue is legal (e.g. fish -> catfish)
+    def _check_all_legal(clues: np.array, words: list) -> np.array:
+        """Check if clues are legal (e.g. fish -> catfish)
 
-        :return: Guess object
+        :param clues: Distinct clues
+        :param words: Linked words
+        :return: Boolean (len(clues), len(words)) array, True where the clue is illegal for the word
         """
-        if all(map(lambda word: True if (word not in guess.clue and guess.clue not in word) else False,
-                   guess.linked_words)):
-            return guess
+        clues = clues[:, None]
+        words = np.array(words, dtype=str)[None, :]
+        return (np.char.find(clues, words) >= 0) | (np.char.find(words, clues) >= 0)
 
-    def _check_all_connected(self, guess: Guess) -> Guess:
-        """Check if all words are sufficiently similar to the clue based on self.threshold and cosine similarity.
+    def _check_all_connected(self, sims: np.array) -> np.array:
+        """Check if clues are sufficiently similar to the linked words based on self.threshold.
 
-        :param guess: Guess object
-        :return: Guess object
+        :param sims: Similarities between clues and linked words
+        :return: Boolean array, True where the clue is connected to the word
         """
-        if all(self.distance_metric(self.embeddings.get(word, 0),
-                                    self.embeddings.get(guess.clue)
-                                    ).distance() > self.threshold
-               for word in guess.linked_words):
-            return guess
+        return sims > self.threshold
 
-    def _check_incorrect_matches(self, guess: Guess) -> Guess:
+    def _check_incorrect_matches(self, clue_rows: np.array) -> np.array:
         """Checks against opponents, neutral and bomb words (all contained in self.words_to_avoid). Akin to
-        _check_all_connected, finds cosine similarity between clue and aforementioned anti-words and if any
-        over threshold returns None. Threshold is set to be more liberal.
-
-        :param guess: Guess object
-        :return: Guess object
-        """
-        if self.words_to_avoid:
-            if all(self.distance_metric(self.embeddings.get(word, 0),
-                                        self.embeddings.get(guess.clue)
-                                        ).distance() < (self.threshold * self.incorrect_words_threshold)
-                   for word in self.words_to_avoid):
-                return guess
-        else:
-            return guess
+        _check_all_connected, finds similarity between clues and aforementioned anti-words. Threshold is set to be more
+        liberal.
+
+        :param clue_rows: Rows of the distinct clues
+        :return: Boolean array, True where no word to avoid is too close to the clue
+        """
+        words_to_avoid = [word for word in self.words_to_avoid or [] if word in self.embeddings]
+        if not words_to_avoid:
+            return np.ones(len(clue_rows), dtype=bool)
+        sims = self._similarities(clue_rows, words_to_avoid)
+        return (sims < (self.threshold * self.incorrect_words_threshold)).all(axis=1)
 
     def _preprocess(self):
-        """Runs preprocessing steps to filter out bad guesses. Currently, check if all words sufficiently connected to
-        clue, if all clues are legal and if all words are sufficiently dissimilar to incorrect matches.
+        """Runs preprocessing steps to filter out bad guesses (see _keep)."""
+        self.guesses = self.guesses[self._keep()]
+
+    def _keep(self) -> np.array:
+        """Checks if all words sufficiently connected to clue, if all clues are legal and if all words are
+        sufficiently dissimilar to incorrect matches. All checks are done once per distinct clue, against every linked
+        word at once, and then broadcast to the guesses as masks.
+
+        :return: Boolean array, True where the guess passes every check
+        """
+        stats = self.stats
+        clue_rows, clue_ixs = np.unique(self.guesses.clue_rows, return_inverse=True)
+        words, membership = self._linked_words()
+        linked = membership[self.guesses.combination_ids]
+        stats.count("scorer_guesses_in", len(self.guesses))
+        stats.count("scorer_distinct_clues", len(clue_rows))
+
+        with stats.time("scorer_connected"):
+            connected = self._check_all_connected(self._similarities(clue_rows, words))
+            keep = (connected[clue_ixs] | ~linked).all(axis=1)
+        if stats.enabled:
+            stats.count("scorer_after_connected", np.count_nonzero(keep))
+        if not self.prefiltered:
+            with stats.time("scorer_legal"):
+                illegal = self._check_all_legal(self.embeddings.words[clue_rows], words)
+                keep &= ~(illegal[clue_ixs] & linked).any(axis=1)
+        if stats.enabled:
+            stats.count("scorer_after_legal", np.count_nonzero(keep))
+        with stats.time("scorer_incorrect_matches"):
+            keep &= self._check_incorrect_matches(clue_rows)[clue_ixs]
+        if stats.enabled:
+            stats.count("scorer_after_incorrect_matches", np.count_nonzero(keep))
+        return keep
+
+    def _threshold_margins(self) -> tuple:
+        """Threshold-independent form of _preprocess. A guess passes _check_all_connected for threshold t iff its
+        least similar linked word is above t, and _check_incorrect_matches iff its most similar word to avoid is below
+        t * incorrect_words_threshold, so both checks reduce to one comparison per guess and threshold.
+
+        :return: Boolean array, True where the guess is legal; similarity of each guess to its least similar linked
+        word; similarity of each guess to its most similar word to avoid
+        """
+        clue_rows, clue_ixs = np.unique(self.guesses.clue_rows, return_inverse=True)
+        words, membership = self._linked_words()
+        linked = membership[self.guesses.combination_ids]
+
+        sims = self._similarities(clue_rows, words)[clue_ixs]
+        # np.min/np.max propagate nan, which then fails every comparison as in _preprocess
+        min_linked_sims = np.where(linked, sims, np.inf).min(axis=1, initial=np.inf)
+        if self.prefiltered:
+            legal = np.ones(len(clue_ixs), dtype=bool)
+        else:
+            legal = ~(self._check_all_legal(self.embeddings.words[clue_rows], words)[clue_ixs] & linked).any(axis=1)
+
+        words_to_avoid = [word for word in self.words_to_avoid or [] if word in self.embeddings]
+        if words_to_avoid:
+            max_avoid_sims = self._similarities(clue_rows, words_to_avoid).max(axis=1)[clue_ixs]
+        else:
+            max_avoid_sims = np.full(len(clue_ixs), -np.inf)
+        return legal, min_linked_sims, max_avoid_sims
+
+    def _keep_by_threshold(self, thresholds: list) -> np.array:
+        """_keep for every threshold in thresholds, from one _threshold_margins.
+
+        :return: Boolean (len(thresholds), len(self.guesses)) array
+        """
+        with self.stats.time("scorer_margins"):
+            legal, min_linked_sims, max_avoid_sims = self._threshold_margins()
+        self.stats.count("scorer_guesses_in", len(self.guesses))
+        return np.array([legal & (min_linked_sims > threshold) &
+                         (max_avoid_sims < threshold * self.incorrect_words_threshold) for threshold in thresholds],
+                        dtype=bool).reshape(len(thresholds), len(self.guesses))
+
+    def top_n_guesses_by_threshold(self, thresholds: list) -> list:
+        """top_n_guesses for every threshold in thresholds. Similarities and legality are computed once, then each
+        threshold is applied as a filter over them. Of a stream, candidates are pulled until every threshold's top n
+        is settled.
+
+        :param thresholds: Thresholds to use in place of self.threshold
+        :return: List with a list of Guess objects per threshold, as top_n_guesses would return
+        """
+        if self.stream is not None:
+            return self._top_n_streamed(thresholds)
+        keep = self._keep_by_threshold(thresholds)
+        scores = self._scores()
+        results = []
+        for threshold_keep in keep:
+            kept_scores = scores[threshold_keep]
+            ixs = get_top_n_sorted(kept_scores, self.n)
+            results.append(self.guesses[threshold_keep][ixs].to_guesses(self.embeddings, kept_scores[ixs]))
+        return results
+
+    def advance(self, thresholds: list = None) -> np.array:
+        """Scores candidates pulled from self.stream, in growing batches per combination, until no combination can
+        still place a guess in the top n: the best clue it has left either can't pass _check_all_connected (see
+        CandidateStream.floors), or scores under the n-th best guess kept so far. Scores are similarity *
+        sqrt(number of words linked), so the best clue left bounds the scores of all the others.
+
+        :param thresholds: Thresholds to settle the top n of, in place of self.threshold (see
+        top_n_guesses_by_threshold). The same on every call
+        :return: Combinations that could still place a guess but have no buffered clues left. Empty once the top n
+        is settled, otherwise refill them (CandidateStream.refill or extend) and call again
+        """
+        stream = self.stream
+        self._thresholds = [self.threshold] if thresholds is None else list(thresholds)
+        if self._best is None:
+            self._best = [np.empty(0)] * len(self._thresholds)
+        if self.n <= 0:
+            return np.empty(0, dtype=np.intp)
+        floors = [stream.floors(threshold) for threshold in self._thresholds]
+        score_factors = np.sqrt(stream.sizes)
+        while True:
+            bounds = stream.upper_bounds()
+            pending = np.zeros(len(stream), dtype=bool)
+            for floor, best in zip(floors, self._best):
+                nth_best = best[self.n - 1] if len(best) >= self.n else -np.inf
+                pending |= (bounds > floor) & (bounds * score_factors >= nth_best)
+            columns = np.flatnonzero(pending & (stream.remaining > 0))
+            if not len(columns):
+                return np.flatnonzero(pending & ~stream.complete)
+
+            self.guesses = stream.pull(columns)
+            self.stats.count("scorer_pulls")
+            # Guesses that can't be connected or place in the top n for any threshold, as combinations are skipped
+            similarity = self.guesses.similarity
+            combination_ids = self.guesses.combination_ids
+            promising = np.zeros(len(self.guesses), dtype=bool)
+            for floor, best in zip(floors, self._best):
+                nth_best = best[self.n - 1] if len(best) >= self.n else -np.inf
+                promising |= (similarity > floor[combination_ids]) & \
+                    (similarity * score_factors[combination_ids] >= nth_best)
+            self.guesses = self.guesses[promising]
+            if thresholds is None:
+                keep = self._keep()[None]
+            else:
+                keep = self._keep_by_threshold(thresholds)
+            scores = self._scores()
+            # Only guesses kept for some threshold can make a top n
+            kept = keep.any(axis=0)
+            self._pulled.append((self.guesses[kept], keep[:, kept], scores[kept]))
+            self._best = [np.sort(np.concatenate([best, scores[threshold_keep]]))[::-1][:self.n]
+                          for best, threshold_keep in zip(self._best, keep)]
+
+    def pulled_top_n_guesses(self) -> list:
+        """Top n guesses of the candidates pulled by advance, per threshold it was called with.
+
+        :return: List with a list of Guess objects per threshold
         """
-        preprocessing_steps = [
-            self._check_all_connected,
-            self._check_incorrect_matches,
-            self._check_all_legal
-        ]
+        results = []
+        for threshold_ix in range(len(self._thresholds) if self._thresholds is not None else 0):
+            guesses = GuessBatch.concatenate([guesses[keep[threshold_ix]] for guesses, keep, _ in self._pulled],
+                                             self.stream.combinations)
+            scores = np.concatenate([scores[keep[threshold_ix]] for _, keep, scores in self._pulled] + [np.empty(0)])
+            # In the order the whole batch would have been scored in: by combination, then by descending similarity
+            order = np.lexsort((-guesses.similarity, guesses.combination_ids))
+            guesses, scores = guesses[order], scores[order]
+            ixs = get_top_n_sorted(scores, self.n)
+            results.append(guesses[ixs].to_guesses(self.embeddings, scores[ixs]))
+        return results
 
-        for step in preprocessing_steps:
-            self.guesses = list(map(step, self.guesses))
-            self.guesses = list(filter(None, self.guesses))
+    def _top_n_streamed(self, thresholds: list = None) -> list:
+        """advance until the top n is settled, refilling the stream with its fetch in between."""
+        while True:
+            with self.stats.time("scorer_streamed"):
+                columns = self.advance(thresholds)
+            if not len(columns):
+                return self.pulled_top_n_guesses()
+            with self.stats.time("candidate_refills"):
+                self.stream.refill(columns)
+            self.stats.count("candidate_refills")
 
-    def _top_n(self) -> np.array:
-        """Scores guesses, gets scores from guess object and then find indices of top n
+    def _top_n(self) -> tuple:
+        """Scores guesses and then find indices of top n
 
-        :return: Indices of top scores
+        :return: Indices of top scores, all scores
         """
-        scored_guesses = list(map(self._score_single, self.guesses))
-        scores = np.array(list(map(lambda guess: guess.score, scored_guesses)))
+        scores = self._scores()
         top_ixs = get_top_n_sorted(scores, self.n)
-        return top_ixs
+        return top_ixs, scores
 
     def top_n_guesses(self) -> list:
-        """Gets top n guess objects using _top_n method
+        """Gets top n guess objects using _top_n method. Of a stream, candidates are pulled only until the top n is
+        settled (see advance). Fewer than n if fewer guesses pass the filters.
 
         :return: list of Guess objects that score highest.
         """
+        if self.stream is not None:
+            return self._top_n_streamed()[0]
         self._preprocess()
-        try:
-            ixs = self._top_n()
-            return list(itemgetter(*ixs)(self.guesses))
-        except:
-            return list()
+        with self.stats.time("scorer_top_n"):
+            ixs, scores = self._top_n()
+            return self.guesses[ixs].to_guesses(self.embeddings, scores[ixs])
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+STATUS_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                  500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ServiceOverloaded(Exception):
+    pass
+
+
+class RollingStats:
+    def __init__(self, window: int = 10000):
+        """Percentiles over the last window recorded values (e.g. latencies).
+
+        :param window: Number of values kept
+        """
+        self.values = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, value: float):
+        self.values.append(value)
+        self.count += 1
+
+    def summary(self, percentiles: tuple = (50, 90, 99)) -> dict:
+        """Total count, and percentiles and maximum over the window."""
+        if not self.values:
+            return {"count": self.count}
+        values = np.array(self.values)
+        return {"count": self.count, **{f"p{p}": float(value) for p, value in
+                                        zip(percentiles, np.percentile(values, percentiles))},
+                "max": float(values.max())}
+
+
+class SolverService:
+    def __init__(self, solvers: dict, max_queue: int = 256, max_batch: int = 64, max_wait: float = .002):
+        """Serves solves from warm solvers. Concurrent requests are queued and coalesced: each batch of requests for
+        the same solver and n is answered with one solve_many, run on a single worker thread so the event loop never
+        blocks on BLAS (and solvers, which aren't thread safe, are only ever used by that thread).
+
+        :param solvers: Name -> CodeNamesSolverAlgorithm. Requests pick one by name, the first by default
+        :param max_queue: Requests waiting at most. Further requests are rejected with ServiceOverloaded
+        :param max_batch: Requests coalesced into one batch at most
+        :param max_wait: Seconds the batcher waits for more requests once it has one
+        """
+        if not solvers:
+            raise ValueError("SolverService needs at least one solver")
+        self.solvers = solvers
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.latency_ms = RollingStats()
+        self.batch_sizes = RollingStats()
+        self.rejected = 0
+        self._queue = None
+        self._batcher = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="solver")
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        """Starts the batcher on the running event loop."""
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._batcher = asyncio.get_running_loop().create_task(self._run_batcher())
+
+    async def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    async def solve(self, words_to_hit: list, words_to_avoid: list = None, n: int = 10, solver: str = None) -> list:
+        """Queues a solve and waits for its batch.
+
+        :return: List of Guess objects
+        """
+        solver = solver or next(iter(self.solvers))
+        if solver not in self.solvers:
+            raise KeyError(f"Unknown solver {solver}, expected one of {list(self.solvers)}")
+        for name, words in (("words_to_hit", words_to_hit), ("words_to_avoid", words_to_avoid or [])):
+            if not isinstance(words, (list, tuple)) or not all(isinstance(word, str) for word in words):
+                raise TypeError(f"{name} must be a list of strings")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((solver, int(n), {"words_to_hit": list(words_to_hit),
+                                                     "words_to_avoid": list(words_to_avoid or [])},
+                                    future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ServiceOverloaded(f"{self.max_queue} requests already waiting")
+        return await future
+
+    async def _run_batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), max(0., deadline - loop.time())))
+                except asyncio.TimeoutError:
+                    break
+            self.batch_sizes.record(len(batch))
+
+            groups = {}
+            for request in batch:
+                groups.setdefault(request[:2], []).append(request)
+            for (solver, n), requests in groups.items():
+                try:
+                    results = await loop.run_in_executor(self._executor, self.solvers[solver].solve_many,
+                                                         [board for _, _, board, _, _ in requests], n)
+                except Exception as e:
+                    self.logger.exception(f"Batch of {len(requests)} solves failed")
+                    for _, _, _, future, _ in requests:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                now = time.perf_counter()
+                for (_, _, _, future, queued_at), result in zip(requests, results):
+                    self.latency_ms.record((now - queued_at) * 1000)
+                    if not future.done():
+                        future.set_result(result)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "latency_ms": self.latency_ms.summary(),
+            "batch_size": self.batch_sizes.summary(),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "rejected": self.rejected,
+            "solvers": list(self.solvers)
+        }
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080, unix_socket: str = None):
+        """Serves HTTP on host:port, or on unix_socket if given, until cancelled:
+         - POST /solve with a JSON body {"words_to_hit": [...], "words_to_avoid": [...], "n": 10, "solver": name}
+           answers {"guesses": [Guess.as_dict(), ...]}, or 503 when the queue is full
+         - GET /stats answers latency percentiles, batch sizes, queue length and rejections
+         - GET /health answers {"status": "ok"}
+        """
+        self.start()
+        if unix_socket:
+            server = await asyncio.start_unix_server(self._handle_connection, path=unix_socket)
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+        self.logger.info(f"Serving {', '.join(self.solvers)} on {unix_socket or f'http://{host}:{port}'}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.close()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await read_http_message(reader, is_request=True)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, response = await self._route(method, path, body)
+                await write_http_message(writer, f"HTTP/1.1 {status} {STATUS_REASONS.get(status, '')}", response)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as e:
+            await write_http_message(writer, f"HTTP/1.1 400 {STATUS_REASONS[400]}", {"error": str(e)})
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes) -> tuple:
+        """Status and JSON response of one request."""
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/stats":
+            return 200, self.stats
+        if path != "/solve":
+            return 404, {"error": f"No route {path}"}
+        if method != "POST":
+            return 405, {"error": "Use POST /solve"}
+        try:
+            query = json.loads(body or b"{}")
+            guesses = await self.solve(query["words_to_hit"], query.get("words_to_avoid"), query.get("n", 10),
+                                       query.get("solver"))
+        except ServiceOverloaded as e:
+            return 503, {"error": str(e)}
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": f"Bad request: {e!r}"}
+        except Exception as e:
+            return 500, {"error": repr(e)}
+        return 200, {"guesses": [guess.as_dict() for guess in guesses]}
+
+
+class ServiceClient:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080, unix_socket: str = None):
+        """Minimal HTTP client of SolverService, keeping one connection open.
+
+        :param host: Host of the service
+        :param port: Port of the service
+        :param unix_socket: Path of the service's unix socket, instead of host and port
+        """
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self._reader = None
+        self._writer = None
+
+    async def request(self, method: str, path: str, body: dict = None) -> tuple:
+        """Sends one request.
+
+        :return: Status code, decoded JSON response
+        """
+        if self._writer is None:
+            if self.unix_socket:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.unix_socket)
+            else:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        await write_http_message(self._writer, f"{method} {path} HTTP/1.1", body, host=self.host)
+        response = await read_http_message(self._reader, is_request=False)
+        if response is None:
+            raise ConnectionError("Service closed the connection")
+        status, _, _, response_body = response
+        return int(status), json.loads(response_body)
+
+    async def solve(self, words_to_hit: list, words_to_avoid: list = None, n: int = 10, solver: str = None) -> tuple:
+        body = {"words_to_hit": words_to_hit, "words_to_avoid": words_to_avoid or [], "n": n}
+        if solver:
+            body["solver"] = solver
+        return await self.request("POST", "/solve", body)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._reader = self._writer = None
+
+
+async def read_http_message(reader: asyncio.StreamReader, is_request: bool, max_body: int = 2 ** 20):
+    """Reads one HTTP/1.1 message with a Content-Length body.
+
+    :return: (method, path, headers, body) for requests or (status, reason, headers, body) for responses, None if the
+    connection was closed before a message started
+    """
+    start_line = await reader.readline()
+    if not start_line.strip():
+        return None
+    parts = start_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+    if len(parts) < 2:
+        raise ValueError(f"Malformed start line {start_line!r}")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > max_body:
+        raise ValueError(f"Body of {length} bytes is over {max_body}")
+    body = await reader.readexactly(length) if length else b""
+    first, second = parts[0], parts[1]
+    return (first, second.split("?", 1)[0], headers, body) if is_request else (second, parts[2:], headers, body)
+
+
+async def write_http_message(writer: asyncio.StreamWriter, start_line: str, body: dict = None, host: str = None):
+    payload = b"" if body is None else json.dumps(body).encode("utf-8")
+    headers = [start_line, f"Content-Length: {len(payload)}"]
+    if host:
+        headers.append(f"Host: {host}")
+    if body is not None:
+        headers.append("Content-Type: application/json")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + payload)
+    await writer.drain()
+
+
+def serve(solvers: dict, host: str = "127.0.0.1", port: int = 8080, unix_socket: str = None, **kwargs):
+    """Runs a SolverService over solvers until interrupted.
+
+    :param kwargs: SolverService parameters (max_queue, max_batch, max_wait)
+    """
+    service = SolverService(solvers, **kwargs)
+    try:
+        asyncio.run(service.serve(host, port, unix_socket))
+    except KeyboardInterrupt:
+        pass
@@ -1,20 +1,32 @@
 import logging
-from typing import Type, Callable
+from typing import Type, Callable, Iterable
+
+import numpy as np
 
 from bot.algorithms import MeanIndividualDistance, CodeNamesSolverAlgorithm
+from bot.cache import SolverCache
 from bot.distance import DotProduct, Cosine
+from bot.embeddings import EmbeddingMatrix
+from bot.index import NearestNeighbourIndex
+from bot.quantization import QuantizedMatrix
 from bot.threshold import Threshold
-from bot.utils import get_embeddings_glove_style, EmbeddingsDataLoader
+from bot.utils import get_embeddings_glove_style, EmbeddingsDataLoader, file_checksum
 
 
 class SolverBuilder:
-    def __init__(self, model=None, method: str = ''):
+    def __init__(self, model: EmbeddingMatrix = None, method: str = '', embedding_path: str = None):
+        if isinstance(model, dict):
+            model = EmbeddingMatrix.from_dict(model, name=method)
         self.model = model
         self.method = method
+        self.embedding_path = embedding_path
+        self._quantized = {}
         self.logger = logging.getLogger(__name__)
 
     def build(self, algorithm: Type[CodeNamesSolverAlgorithm] = MeanIndividualDistance, threshold: float = 0.3,
-              distance_metric=Cosine, strategy: str = None, conf_path: str = None) -> CodeNamesSolverAlgorithm:
+              distance_metric=Cosine, strategy: str = None, conf_path: str = None,
+              index: NearestNeighbourIndex = None, cache: SolverCache = None,
+              quantization: str = None) -> CodeNamesSolverAlgorithm:
         """Base builder class, main interface for solving Codenames. Typically, built with one of class methods.
 
         :param conf_path: Path to conf that contains .csv with cols for threshold, algorithm, distance, strategy, model
@@ -23,6 +35,11 @@ class SolverBuilder:
         :param strategy: Str from risky, quite_risky, moderate, quite_conservative, conservative. Controls how close
         words need to be connected. If not included, defaults to threshold that equates to moderate
         :param threshold: Akin to strategy, controls how close words need to be connected
+        :param index: Nearest neighbour index (e.g. IVFIndex()) used to find candidate clues instead of scoring the
+        whole vocabulary. Built on first use and saved next to the embeddings
+        :param cache: SolverCache memoizing solve results and per-combination candidates. Can be shared by solvers
+        :param quantization: "float16" or "int8" to find candidate clues on a compressed copy of the embeddings and
+        re-score only those in full precision. Built on first use and saved next to the embeddings
         :return: CodeNamesSolverAlgorithm class that can solve for search words
         """
 
@@ -36,10 +53,66 @@ class SolverBuilder:
             }
             threshold = Threshold.from_config(**args).threshold
 
-        return algorithm(model=self.model, threshold=threshold, distance_metric=distance_metric)
+        if index is not None:
+            index = self._prepare_index(index, distance_metric)
+        quantized = self._prepare_quantized(quantization) if quantization else None
+
+        return algorithm(model=self.model, threshold=threshold, distance_metric=distance_metric, index=index,
+                         cache=cache, quantized=quantized)
+
+    def _prepare_quantized(self, dtype: str) -> QuantizedMatrix:
+        """Loads the quantized embeddings from next to the embeddings if they were saved there from the same
+        embeddings before, otherwise quantizes and saves them. Either way the model takes its squared norms from them,
+        and is only read at random from then on.
+        """
+        quantized = self._quantized.get(dtype)
+        path = QuantizedMatrix.cache_path(self.embedding_path, self.model, dtype) if self.embedding_path else None
+        if quantized is None and path:
+            self._set_source_checksum()
+            quantized = QuantizedMatrix.load(path, self.model, dtype)
+            if quantized is not None:
+                self.logger.info(f"Loaded {dtype} embeddings from {path}")
+        if quantized is None:
+            quantized = QuantizedMatrix.from_embeddings(self.model, dtype)
+            if path:
+                try:
+                    quantized.save(path)
+                except OSError as e:
+                    self.logger.warning(f"Couldn't save {dtype} embeddings to {path}: {e}")
+        self._quantized[dtype] = quantized
+        self.model.sq_norms = quantized.sq_norms
+        self.model.advise_random_access()
+        return quantized
+
+    def _prepare_index(self, index: NearestNeighbourIndex, distance_metric) -> NearestNeighbourIndex:
+        """Loads index from next to the embeddings if it was saved there before, otherwise builds and saves it."""
+        if index.is_built and index.metric is distance_metric:
+            return index
+
+        path = index.cache_path(self.embedding_path, distance_metric) if self.embedding_path else None
+        if path:
+            self._set_source_checksum()
+        if path and index.load(path, self.model, distance_metric):
+            self.logger.info(f"Loaded {type(index).__name__} from {path}")
+            return index
+
+        index.build(self.model, distance_metric)
+        if path:
+            try:
+                index.save(path)
+            except OSError as e:
+                self.logger.warning(f"Couldn't save {type(index).__name__} to {path}: {e}")
+        return index
+
+    def _set_source_checksum(self):
+        """Checksums the embeddings file if the model wasn't loaded from its binary cache (which records it), so files
+        saved next to it can be checked against it."""
+        if not self.model.source_sha256:
+            self.model.source_sha256 = file_checksum(self.embedding_path)
 
     @classmethod
-    def with_embeddings(cls, embedding_path: str, name: str, embeddings_parser: Callable = get_embeddings_glove_style):
+    def with_embeddings(cls, embedding_path: str, name: str, embeddings_parser: Callable = get_embeddings_glove_style,
+                        dtype=np.float32, cache: bool = True, vocabulary: Iterable = None, workers: int = None):
         """Core component of solver. Feed a path to local embeddings.
          Recommended options:
          - Postspec: https://github.com/cambridgeltl/adversarial-postspec
@@ -54,7 +127,12 @@ class SolverBuilder:
         :param name: Name used for logging and checking thresholds
         :param embeddings_parser: Function to load embeddings. Select from:
             get_embeddings_glove_style, get_embeddings_postspec_style
+        :param dtype: Float type of the embedding matrix. np.float32 (default) halves memory, np.float64 if needed
+        :param cache: Memory-map a binary cache of the embeddings, building it next to embedding_path if needed
+        :param vocabulary: Only load these words, e.g. read_word_list("data/google-10000-english.txt")
+        :param workers: Number of processes parsing the text embeddings, defaults to the number of CPUs
         :return: SolverBuilder
         """
-        embeddings = EmbeddingsDataLoader(embedding_path).get_embeddings(embeddings_parser, name)
-        return cls(embeddings, name.lower())
+        embeddings = EmbeddingsDataLoader(embedding_path).get_embeddings(embeddings_parser, name, dtype, cache,
+                                                                         vocabulary, workers)
+        return cls(embeddings, name.lower(), embedding_path)
@@ -0,0 +1,50 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class SolveStats:
+    """Opt-in instrumentation of one solve: wall time per stage (accumulated when a stage runs more than once, e.g.
+    per vocabulary block) and named counts, such as candidates in and out of each scorer filter or passes over the
+    vocabulary. Stages nest, so e.g. "solve" includes everything else.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.timings = {}
+        self.counts = {}
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.) + time.perf_counter() - start
+
+    def count(self, name: str, value: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def as_dict(self) -> dict:
+        return {"timings": dict(self.timings), "counts": dict(self.counts)}
+
+    def __repr__(self) -> str:
+        timings = ", ".join(f"{stage}={seconds * 1000:.2f}ms" for stage, seconds in self.timings.items())
+        counts = ", ".join(f"{name}={value}" for name, value in self.counts.items())
+        return f"{type(self).__name__}({timings}; {counts})"
+
+
+class _DisabledStats(SolveStats):
+    """Stand-in used when instrumentation is off: records nothing, and its timer is a shared no-op context manager.
+    Counts that take work to compute should be guarded with stats.enabled.
+    """
+    enabled = False
+    _timer = nullcontext()
+
+    def time(self, stage: str):
+        return self._timer
+
+    def count(self, name: str, value: int = 1):
+        pass
+
+
+DISABLED = _DisabledStats()
@@ -1,6 +1,7 @@
+import csv
 import logging
-
-import pandas as pd
+import os
+import threading
 
 
 class Threshold:
@@ -14,17 +15,98 @@ class Threshold:
             logger.info(f"Using {strategy} strategy with threshold: {default_value}")
             return cls(threshold=default_value)
 
-        config = pd.read_csv(conf_path)
-        try:
-            threshold = config[
-                (config["model"] == model) &
-                (config["distance"] == distance.__name__) &
-                (config["strategy"] == strategy) &
-                (config["algorithm"] == algorithm.__name__)].threshold.values[0]
-
-        except IndexError:
+        threshold = ThresholdTable.for_path(conf_path).get(model, distance.__name__, algorithm.__name__, strategy)
+        if threshold is None:
             logger.info(f"Using {strategy} strategy with threshold: {default_value}")
             return cls(threshold=default_value)
 
         logger.info(f"Using {strategy} strategy with threshold: {threshold}")
         return cls(threshold=threshold)
+
+
+class CsvTable:
+    """A csv file parsed once into a dict, shared by everything reading the same path (see for_path) and parsed again
+    only when the file's modification time changes. Subclasses say how rows are keyed in _parse.
+    """
+    _tables = {}
+    _tables_lock = threading.Lock()
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = {}
+        self._mtime_ns = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_path(cls, path: str):
+        """The shared table of this class for path."""
+        key = (cls, os.path.abspath(path))
+        with cls._tables_lock:
+            table = cls._tables.get(key)
+            if table is None:
+                table = cls._tables[key] = cls(path)
+        return table
+
+    def refresh(self) -> dict:
+        """Parses the file again if it changed since it was last parsed.
+
+        :return: The parsed data
+        """
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        if mtime_ns != self._mtime_ns:
+            with self._lock:
+                if mtime_ns != self._mtime_ns:
+                    with open(self.path, "r", newline="") as file:
+                        self.data = self._parse(csv.DictReader(file))
+                    self._mtime_ns = mtime_ns
+        return self.data
+
+    def _parse(self, rows) -> dict:
+        raise NotImplementedError
+
+
+class ThresholdTable(CsvTable):
+    """Thresholds of a params csv (e.g. data/params.csv), keyed by (model, distance, algorithm, strategy)."""
+
+    def get(self, model: str, distance: str, algorithm: str, strategy: str, default: float = None) -> float:
+        return self.refresh().get((model, distance, algorithm, strategy), default)
+
+    def _parse(self, rows) -> dict:
+        thresholds = {}
+        for row in rows:
+            # First row wins, as with the filter this replaces
+            thresholds.setdefault((row["model"], row["distance"], row["algorithm"], row["strategy"]),
+                                  float(row["threshold"]))
+        return thresholds
+
+
+class CalibrationTable(CsvTable):
+    """Calibration data of a csv like data/all_param_data.csv: per (model, distance, algorithm), rows of n, mean,
+    count and word_proportion, sorted by n. Models named after the old builder methods (get_glove_solver) are keyed
+    by the model name used in params csvs (glove).
+    """
+
+    def get(self, model: str, distance: str, algorithm: str) -> list:
+        """Rows of model, distance and algorithm, as dicts sorted by n. Empty if there are none."""
+        return self.refresh().get((model, distance, algorithm), [])
+
+    def word_proportion(self, model: str, distance: str, algorithm: str, n: int, default: float = None) -> float:
+        return next((row["word_proportion"] for row in self.get(model, distance, algorithm) if row["n"] == n),
+                    default)
+
+    @staticmethod
+    def model_name(model: str) -> str:
+        if model.startswith("get_") and model.endswith("_solver"):
+            return model[len("get_"):-len("_solver")]
+        return model
+
+    def _parse(self, rows) -> dict:
+        calibration = {}
+        for row in rows:
+            key = (self.model_name(row["model"]), row["distance"], row["algorithm"])
+            calibration.setdefault(key, []).append({"n": int(row["n"]), "mean": float(row["mean"]),
+                                                    "count": int(row["count"]),
+                                                    "word_proportion": float(row["word_proportion"])})
+        for rows_of_key in calibration.values():
+            rows_of_key.sort(key=lambda row: row["n"])
+        return calibration
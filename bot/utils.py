@@ -1,7 +1,13 @@
+import hashlib
 import logging
+import os
+
+from typing import Iterable
 
 import numpy as np
-from tqdm import tqdm
+
+from bot.embeddings import EmbeddingMatrix, CACHE_FORMAT_VERSION
+from bot.parsing import parse_embeddings
 
 
 class EmbeddingsDataLoader:
@@ -9,26 +15,154 @@ class EmbeddingsDataLoader:
         self.logger = logging.getLogger(__name__)
         self.fpath = fpath
 
-    def get_embeddings(self, func, name: str):
+    def get_embeddings(self, func, name: str, dtype=np.float32, cache: bool = True, vocabulary: Iterable = None,
+                       workers: int = None) -> EmbeddingMatrix:
+        """Loads embeddings into a contiguous EmbeddingMatrix. On first load the text file is parsed and a binary
+        cache is written next to it; later loads memory-map that cache instead of parsing again. The built-in parsers
+        are run with parse_embeddings (in parallel, straight into the cache), other parsers as is.
+
+        :param func: Parser returning a word -> vector dict, e.g. get_embeddings_glove_style
+        :param name: Name used for logging
+        :param dtype: Float type of the embedding matrix. np.float32 (default) or np.float64
+        :param cache: Read from/write to the binary cache
+        :param vocabulary: Only load these words (e.g. read_word_list of data/google-10000-english.txt). Cached
+        separately per vocabulary
+        :param workers: Number of parser processes, defaults to the number of CPUs
+        :return: EmbeddingMatrix
+        """
+        cache_path = self.cache_path(func, dtype, vocabulary)
+        if cache and self._is_cache_valid(cache_path, dtype):
+            self.logger.info(f"Loading {name} embeddings from {cache_path}.npy...")
+            return EmbeddingMatrix.load(cache_path, name=name)
+
         self.logger.info(f"Loading {name} embeddings...")
-        embeddings = func(self.fpath)
+        if cache:
+            try:
+                return self._convert(func, cache_path, dtype, name, vocabulary, workers)
+            except OSError as e:
+                self.logger.warning(f"Couldn't write embeddings cache to {cache_path}.npy: {e}")
+        embeddings = self._parse(func, dtype, name, vocabulary, workers)
         self.logger.info(f"{name} embeddings loaded.")
         return embeddings
 
+    def convert(self, func, dtype=np.float32, vocabulary: Iterable = None, workers: int = None) -> str:
+        """Parses the text embeddings with func and writes the binary cache, replacing any existing one.
+
+        :param func: Parser returning a word -> vector dict, e.g. get_embeddings_glove_style
+        :param dtype: Float type of the embedding matrix
+        :param vocabulary: Only keep these words
+        :param workers: Number of parser processes
+        :return: Cache path (without extension)
+        """
+        cache_path = self.cache_path(func, dtype, vocabulary)
+        self._convert(func, cache_path, dtype, '', vocabulary, workers)
+        return cache_path
+
+    def cache_path(self, func, dtype=np.float32, vocabulary: Iterable = None) -> str:
+        path = f"{self.fpath}.{func.__name__}.{np.dtype(dtype).name}"
+        if vocabulary is not None:
+            path += f".vocab{vocabulary_checksum(vocabulary)[:12]}"
+        return path
+
+    def _parse(self, func, dtype, name: str, vocabulary: Iterable, workers: int,
+               output_path: str = None) -> EmbeddingMatrix:
+        style = PARSER_STYLES.get(func)
+        if style is not None:
+            return parse_embeddings(self.fpath, style, keep=vocabulary, dtype=dtype, workers=workers,
+                                    output_path=output_path, name=name)
+        embeddings = func(self.fpath)
+        if vocabulary is not None:
+            vocabulary = set(vocabulary)
+            embeddings = {word: vector for word, vector in embeddings.items() if word in vocabulary}
+        return EmbeddingMatrix.from_dict(embeddings, dtype=dtype, name=name)
+
+    def _convert(self, func, cache_path: str, dtype, name: str, vocabulary: Iterable,
+                 workers: int) -> EmbeddingMatrix:
+        """Parses into the cache and opens it."""
+        vectors_file = f"{cache_path}.{os.getpid()}.tmp.npy"
+        try:
+            embeddings = self._parse(func, dtype, name, vocabulary, workers, vectors_file)
+            metadata = {} if vocabulary is None else {"vocabulary_sha256": vocabulary_checksum(vocabulary)}
+            embeddings.save(cache_path, vectors_file=vectors_file if os.path.exists(vectors_file) else None,
+                            parser=func.__name__, source_sha256=file_checksum(self.fpath), **self._source_metadata(),
+                            **metadata)
+        finally:
+            if os.path.exists(vectors_file):
+                os.remove(vectors_file)
+        self.logger.info(f"Wrote embeddings cache to {cache_path}.npy")
+        return EmbeddingMatrix.load(cache_path, name=name)
+
+    def _source_metadata(self) -> dict:
+        stat = os.stat(self.fpath)
+        return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+    def _is_cache_valid(self, cache_path: str, dtype) -> bool:
+        """Cache is valid if it was written by this format version with the same dtype and from the same source. The
+        source is compared on size and mtime first; only if those differ is its checksum recomputed, and if it
+        matches the header takes the new mtime so the source isn't checksummed again on every load.
+        """
+        header = EmbeddingMatrix.read_header(cache_path)
+        if header.get("format_version") != CACHE_FORMAT_VERSION or header.get("dtype") != np.dtype(dtype).name:
+            return False
+
+        source = self._source_metadata()
+        if all(header.get(key) == value for key, value in source.items()):
+            return True
+        if header.get("source_size") == source["source_size"] and \
+                header.get("source_sha256") == file_checksum(self.fpath):
+            try:
+                EmbeddingMatrix.write_header(cache_path, {**header, **source})
+            except OSError as e:
+                self.logger.warning(f"Couldn't update the header of {cache_path}.npy: {e}")
+            return True
+
+        self.logger.info(f"{self.fpath} has changed since {cache_path}.npy was written, rebuilding...")
+        return False
+
+
+def file_checksum(path: str, chunk_size: int = 1 << 20) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
 
-def remove_keys_from_dict(dictionary: dict, keys_to_remove: list) -> dict:
-    dictionary_copy = dictionary.copy()
-    for key in keys_to_remove:
-        dictionary_copy.pop(key, None)
-    return dictionary_copy
+def vocabulary_checksum(vocabulary: Iterable) -> str:
+    return hashlib.sha256("\n".join(sorted(set(vocabulary))).encode("utf-8")).hexdigest()
+
+
+def read_word_list(path: str) -> list:
+    """Words of a word list with one word per line, e.g. data/google-10000-english.txt."""
+    with open(path, "r", encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip()]
 
 
 def get_top_n_sorted(values: np.array, n: int = 5) -> np.array:
+    """Indices of the n largest values (all of them if there are fewer), sorted by descending value."""
+    n = min(n, len(values))
+    if n <= 0:
+        return np.empty(0, dtype=np.intp)
     top_n_items = np.argpartition(values, -n)[-n:]
     indices = top_n_items[np.argsort(-values[top_n_items])]
     return indices
 
 
+def get_top_n_sorted_by_column(values: np.array, n: int = 5) -> np.array:
+    """Column-wise get_top_n_sorted.
+
+    :param values: 2D array
+    :param n: Number of rows to return per column
+    :return: Row indices of shape (n, values.shape[1]), sorted by descending value within each column
+    """
+    n = min(n, values.shape[0])
+    # Partitioning runs along contiguous memory, so work on one row per column
+    columns = np.ascontiguousarray(-values.T)
+    top_n_items = np.argpartition(columns, n - 1, axis=1)[:, :n]
+    order = np.argsort(np.take_along_axis(columns, top_n_items, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top_n_items, order, axis=1).T
+
+
 def np_cosine(a, b):
     return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
@@ -71,6 +205,13 @@ def get_embeddings_paragram_style(path: str) -> dict:
     return embeddings
 
 
+PARSER_STYLES = {
+    get_embeddings_glove_style: "glove",
+    get_embeddings_postspec_style: "postspec",
+    get_embeddings_paragram_style: "paragram"
+}
+
+
 def initialise_logger():
     logger = logging.getLogger(__name__)
     logging.basicConfig(level=logging.INFO, format='%(message)8s')
@@ -1,3 +1,9 @@
+import numpy as np
+
+from codenames.colours import Colour
+from codenames.wordlist import WordListBuilder
+
+
 class Board:
     def __init__(self,
                  board_size_x: int = 5,
@@ -13,4 +19,96 @@ class Board:
         self.n_board_words_blue = n_board_words_blue
         self.n_board_words_red = n_board_words_red
         self.n_board_words_grey = n_board_words_grey
-        self.n_board_words_black = n_board_words_black
\ No newline at end of file
+        self.n_board_words_black = n_board_words_black
+
+
+class BoardFactory:
+    def __init__(self, words: list, board: Board = None, seed: int = None, block_boards: int = 4096):
+        """Generates random boards in bulk as fixed-shape arrays: (n_boards, board size) ids into self.vocabulary and
+        (n_boards, board size) Colours. Boards are generated block_boards at a time, each block from its own generator
+        derived from seed and the block's position, so board i is the same whichever range or chunks it's generated
+        in, and any range can be generated without the boards before it.
+
+        :param words: Words to draw from. Each distinct word gets one id
+        :param board: Board size and number of words of each colour. The standard 5x5 board by default
+        :param seed: Seed of the boards. Random if None, but fixed for this factory
+        :param block_boards: Boards per block
+        """
+        self.board = board or Board()
+        self.size = self.board.x * self.board.y
+        self.vocabulary = np.array(list(dict.fromkeys(words)))
+        if len(self.vocabulary) < self.size:
+            raise ValueError(f"{len(self.vocabulary)} distinct words are too few for boards of {self.size}")
+        self.colour_stack = np.repeat(
+            [Colour.BLACK, Colour.GREY, Colour.BLUE, Colour.RED],
+            [self.board.n_board_words_black, self.board.n_board_words_grey, self.board.n_board_words_blue,
+             self.board.n_board_words_red]
+        ).astype(np.int8)
+        if len(self.colour_stack) != self.size:
+            raise ValueError(f"Board has {len(self.colour_stack)} coloured words for {self.size} positions")
+        self.seed = np.random.SeedSequence(seed)
+        self.block_boards = block_boards
+
+    @classmethod
+    def from_word_list(cls, path: str, lower: bool = True, keep=None, **kwargs):
+        """Factory over the words of a word list file (e.g. data/wordlist-eng.txt), read once per process.
+
+        :param path: Path to the word list
+        :param lower: Lowercase the words
+        :param keep: Only draw words in this container, e.g. an EmbeddingMatrix, so that every word has an embedding
+        :param kwargs: BoardFactory parameters
+        :return: BoardFactory
+        """
+        words = WordListBuilder(path=path, lower=lower).get_full_word_list().wordlist
+        if keep is not None:
+            words = [word for word in words if word in keep]
+        return cls(words, **kwargs)
+
+    def boards(self, start: int, stop: int) -> tuple:
+        """Boards start to stop (excluded).
+
+        :return: (stop - start, board size) int32 word ids and (stop - start, board size) int8 Colours
+        """
+        words = np.empty(shape=(max(stop - start, 0), self.size), dtype=np.int32)
+        colours = np.empty(shape=words.shape, dtype=np.int8)
+        for block_ix in range(start // self.block_boards, (stop - 1) // self.block_boards + 1 if stop > start else 0):
+            block_start = block_ix * self.block_boards
+            block_words, block_colours = self._block(block_ix)
+            first, last = max(start, block_start), min(stop, block_start + self.block_boards)
+            words[first - start:last - start] = block_words[first - block_start:last - block_start]
+            colours[first - start:last - start] = block_colours[first - block_start:last - block_start]
+        return words, colours
+
+    def stream(self, n_boards: int, chunk_boards: int = None, start: int = 0):
+        """Yields boards start to start + n_boards in chunks, as (words, colours) pairs (see boards).
+
+        :param chunk_boards: Boards per chunk, block_boards by default
+        """
+        chunk_boards = chunk_boards or self.block_boards
+        for chunk_start in range(start, start + n_boards, chunk_boards):
+            yield self.boards(chunk_start, min(chunk_start + chunk_boards, start + n_boards))
+
+    def words_of(self, ids: np.array) -> np.array:
+        return self.vocabulary[ids]
+
+    def _block(self, block_ix: int) -> tuple:
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed.entropy, spawn_key=(block_ix,)))
+        words = self._sample_without_replacement(rng, self.block_boards, len(self.vocabulary), self.size)
+        colours = rng.permuted(np.broadcast_to(self.colour_stack, (self.block_boards, self.size)), axis=1)
+        return words, colours
+
+    @staticmethod
+    def _sample_without_replacement(rng: np.random.Generator, n: int, population: int, k: int) -> np.array:
+        """n rows of k distinct integers under population, each a uniform random draw."""
+        if population < 4 * k:
+            # Few words: the positions of the k smallest of population random keys
+            keys = rng.random((n, population), dtype=np.float32)
+            return np.argpartition(keys, k - 1, axis=1)[:, :k].astype(np.int32)
+        # Many words: draw with replacement and redraw the (few) rows with a repeat
+        rows = rng.integers(0, population, size=(n, k), dtype=np.int32)
+        redraw = np.arange(n)
+        while len(redraw):
+            sorted_rows = np.sort(rows[redraw], axis=1)
+            redraw = redraw[(sorted_rows[:, 1:] == sorted_rows[:, :-1]).any(axis=1)]
+            rows[redraw] = rng.integers(0, population, size=(len(redraw), k), dtype=np.int32)
+        return rows
@@ -15,20 +15,35 @@ class Game:
         self.state = state
         self.turn = 0
 
+    def guess(self, x: int, y: int, player_id: int) -> int:
+        """Reveals the word at (x, y) for player_id.
+
+        :return: Colour of the word
+        """
+        self.state[x, y] = player_id
+        return self.answers[x, y]
+
+    def landed_on_bomb(self):
+        """Id of the player who revealed the black word, None if nobody has."""
+        revealed_by = self.state[(self.answers == Colour.BLACK) & (self.state != 0)]
+        return int(revealed_by[0]) if len(revealed_by) else None
+
     def _is_finished(self):
         player_1_won = self._check_if_player_has_won(player_id=1)
         player_2_won = self._check_if_player_has_won(player_id=2)
+        return player_1_won or player_2_won
 
     def _check_if_player_has_won(self, player_id: int):
-        guesses = matches_as_set(self.state, player_id)
+        """A player wins once all their words are revealed, by either player, or when the other player reveals the
+        black word. Player ids are the team colours (Colour.BLUE and Colour.RED), as in the word colours.
+        """
+        revealed = set(zip(*(axis.tolist() for axis in np.nonzero(self.state))))
         answers = matches_as_set(self.answers, player_id)
 
-        if answers.issubset(guesses):
-            return True
-        elif self.landed_on_bomb():
-            return
-        else:
-            return
+        bomb_player = self.landed_on_bomb()
+        if bomb_player is not None:
+            return bomb_player != player_id
+        return answers.issubset(revealed)
 
 
 class GameBuilder(Board):
@@ -42,7 +57,7 @@ class GameBuilder(Board):
         game_words = WordListBuilder(path=self.word_path, n_words=self.n_words).build().wordlist
         game_words_array = np.array(game_words).reshape(self.x, self.y)
         word_colours = self._get_word_colours()
-        return Game(words=game_words_array, word_colours=word_colours, state=self.state)
+        return Game(words=game_words_array, word_colours=word_colours, state=self.state.copy())
 
     def _create_colour_stack(self):
         return list(flatten(
@@ -57,10 +72,5 @@ class GameBuilder(Board):
     def _get_word_colours(self):
         colour_stack = self._create_colour_stack()
         random.shuffle(colour_stack)
-        word_colours = np.zeros(shape=(self.x, self.y))
-        for x in range(self.x):
-            for y in range(self.y):
-                colour = colour_stack.pop()
-                word_colours[x, y] = colour
-
-        return word_colours
+        # Filled from the end of the stack, row by row, as when popping colours off it
+        return np.array(colour_stack[::-1], dtype=float).reshape(self.x, self.y)
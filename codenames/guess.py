@@ -0,0 +1,101 @@
+import numpy as np
+
+from bot.distance import Cosine
+from bot.embeddings import EmbeddingMatrix
+
+
+class EmbeddingOperative:
+    def __init__(self, model: EmbeddingMatrix, distance_metric=Cosine, threshold: float = None):
+        """Guesser: ranks the words left on a board by similarity to the clue in an embedding store (typically the
+        bot's own) and guesses the best ones, up to the clue number. Board words without an embedding are never
+        guessed; a clue without one gets no guesses.
+
+        :param model: EmbeddingMatrix
+        :param distance_metric: Similarity to rank by, higher meaning closer (Cosine or DotProduct)
+        :param threshold: Confidence threshold: after the first guess, only words at least this similar to the clue
+        are guessed. None to always guess as many words as the clue number
+        """
+        self.model = model
+        self.distance_metric = distance_metric
+        self.threshold = threshold
+        self._vocabulary = None
+        self._vocabulary_rows = None
+
+    def decode(self, clue: str, board_words: list, number: int) -> list:
+        """Words guessed for clue, in guessing order.
+
+        :param clue: Clue word
+        :param board_words: Words left on the board
+        :param number: Clue number, the most words guessed
+        :return: List of words
+        """
+        return self.decode_many([clue], [board_words], [number])[0]
+
+    def decode_many(self, clues: list, boards: list, numbers: list) -> list:
+        """decode for many (clue, board) pairs at once (see guess_rows).
+
+        :param clues: Clue words
+        :param boards: Lists of words left on each board, of any lengths
+        :param numbers: Clue numbers
+        :return: List with the words guessed for each clue, in guessing order
+        """
+        width = max((len(board) for board in boards), default=0)
+        board_rows = np.full(shape=(len(boards), width), fill_value=-1, dtype=np.intp)
+        for board_rows_of_board, board in zip(board_rows, boards):
+            board_rows_of_board[:len(board)] = [self.model.index.get(word, -1) for word in board]
+        clue_rows = np.array([self.model.index.get(clue, -1) for clue in clues], dtype=np.intp)
+        positions, _ = self.guess_rows(clue_rows, board_rows, np.asarray(numbers))
+        return [[board[position] for position in board_positions if position >= 0]
+                for board, board_positions in zip(boards, positions.tolist())]
+
+    def guess_rows(self, clue_rows: np.array, board_rows: np.array, numbers: np.array) -> tuple:
+        """Batched guessing on embedding rows. The similarities of every distinct clue to every distinct board word are
+        computed with one matrix product and gathered into a (n_clues, board size) matrix, which is ranked row-wise.
+
+        :param clue_rows: Rows of the clues, -1 for clues without an embedding
+        :param board_rows: (len(clue_rows), board size) rows of each board's words, -1 for positions that can't be
+        guessed (no embedding, or already revealed)
+        :param numbers: Clue numbers
+        :return: (len(clue_rows), max(numbers)) board positions guessed in order and their similarities to the clue,
+        padded with -1 and -inf
+        """
+        width = int(max(np.max(numbers, initial=0), 0))
+        if not len(clue_rows) or not width or not board_rows.shape[1]:
+            return (np.full(shape=(len(clue_rows), width), fill_value=-1, dtype=np.intp),
+                    np.full(shape=(len(clue_rows), width), fill_value=-np.inf))
+        distinct_clues, clue_ixs = np.unique(clue_rows, return_inverse=True)
+        distinct_words, word_ixs = np.unique(board_rows, return_inverse=True)
+        similarities = self.distance_metric.pairwise(
+            self.model.vectors[distinct_clues], self.model.vectors[distinct_words],
+            self.model.sq_norms[distinct_clues], self.model.sq_norms[distinct_words]
+        )[clue_ixs.reshape(-1, 1), word_ixs.reshape(board_rows.shape)]
+        similarities[(board_rows < 0) | (clue_rows < 0)[:, None]] = -np.inf
+
+        order = np.argsort(-similarities, axis=1, kind="stable")[:, :width]
+        similarities = np.take_along_axis(similarities, order, axis=1)
+        ranks = np.arange(order.shape[1])
+        keep = (ranks < np.asarray(numbers)[:, None]) & np.isfinite(similarities)
+        if self.threshold is not None:
+            # Similarities are sorted, so this stops at the first word under the threshold
+            keep &= (ranks == 0) | (similarities >= self.threshold)
+        order = np.where(keep, order, -1)
+        return order, np.where(keep, similarities, -np.inf)
+
+    def guess(self, games, game_ixs: np.array, clues: list) -> np.array:
+        """Operative interface of codenames.simulator.Simulator: positions to guess in games game_ixs of a GameBatch.
+
+        :param games: GameBatch being played
+        :param game_ixs: Games to guess in
+        :param clues: Guess (as given by the bot) or None of each game
+        :return: (len(game_ixs), max guesses) board positions in guessing order, padded with -1
+        """
+        if self._vocabulary is not games.vocabulary:
+            self._vocabulary = games.vocabulary
+            self._vocabulary_rows = np.array([self.model.index.get(word, -1) for word in games.vocabulary.tolist()],
+                                             dtype=np.intp)
+        board_rows = np.where(games.revealed[game_ixs], -1, self._vocabulary_rows[games.words[game_ixs]])
+        clue_rows = np.array([-1 if clue is None else self.model.index.get(clue.clue, -1) for clue in clues],
+                             dtype=np.intp)
+        numbers = np.array([0 if clue is None else clue.num_words_linked for clue in clues], dtype=np.intp)
+        positions, _ = self.guess_rows(clue_rows, board_rows, numbers)
+        return positions
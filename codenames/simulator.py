@@ -0,0 +1,264 @@
+import time
+
+import numpy as np
+
+from codenames.board import Board, BoardFactory
+from codenames.colours import Colour
+
+# Red has one word more, so plays first
+TEAMS = (Colour.RED, Colour.BLUE)
+
+
+def opponent(team: int) -> int:
+    return Colour.BLUE if team == Colour.RED else Colour.RED
+
+
+class GameBatch:
+    def __init__(self, words: np.array, colours: np.array, vocabulary: np.array):
+        """Many games of Codenames as stacked arrays, played in lockstep: red plays turn 1, 3, 5... of every game and
+        blue turn 2, 4, 6... Board positions are indices into the flattened board.
+
+        :param words: (n_games, board size) integer ids of each game's words, indexing into vocabulary
+        :param colours: (n_games, board size) Colour of each word
+        :param vocabulary: 1D array of the words ids refer to
+        """
+        self.words = words
+        self.colours = colours
+        self.vocabulary = vocabulary
+        self.revealed = np.zeros(shape=words.shape, dtype=bool)
+        # Colour of the winning team, 0 while the game is going
+        self.winner = np.zeros(len(words), dtype=np.int8)
+        # True where the game was lost by revealing the black word
+        self.bomb = np.zeros(len(words), dtype=bool)
+        self.turns = np.zeros(len(words), dtype=np.int32)
+        # True where the game can't go on: no spymaster found a clue on the board as it is
+        self.stalled = np.zeros(len(words), dtype=bool)
+
+    @classmethod
+    def concatenate(cls, batches: list):
+        """One GameBatch of the games of batches, which must share their vocabulary."""
+        games = cls(words=np.concatenate([batch.words for batch in batches]),
+                    colours=np.concatenate([batch.colours for batch in batches]), vocabulary=batches[0].vocabulary)
+        for attribute in ["revealed", "winner", "bomb", "turns", "stalled"]:
+            setattr(games, attribute, np.concatenate([getattr(batch, attribute) for batch in batches]))
+        return games
+
+    @classmethod
+    def from_factory(cls, factory: BoardFactory, start: int, stop: int):
+        """Games on boards start to stop (excluded) of factory."""
+        words, colours = factory.boards(start, stop)
+        return cls(words=words, colours=colours, vocabulary=factory.vocabulary)
+
+    @classmethod
+    def random(cls, vocabulary: list, n_games: int, board: Board = None, seed: int = None):
+        """Random games: distinct words drawn from vocabulary and the colours of board shuffled (see BoardFactory).
+
+        :param vocabulary: Words to draw from
+        :param n_games: Number of games
+        :param board: Board size and number of words of each colour. The standard 5x5 board by default
+        :param seed: Seed of the boards
+        :return: GameBatch
+        """
+        return cls.from_factory(BoardFactory(vocabulary, board, seed), 0, n_games)
+
+    @property
+    def finished(self) -> np.array:
+        return self.winner != 0
+
+    @property
+    def playing(self) -> np.array:
+        return ~self.finished & ~self.stalled
+
+    def remaining(self, colour: int, game_ixs: np.array = None) -> np.array:
+        """Number of words of colour not revealed yet in each game, or in each of games game_ixs."""
+        if game_ixs is None:
+            return np.count_nonzero((self.colours == colour) & ~self.revealed, axis=1)
+        return np.count_nonzero((self.colours[game_ixs] == colour) & ~self.revealed[game_ixs], axis=1)
+
+    def boards(self, game_ixs: np.array, team: int) -> list:
+        """What the spymaster of team sees in games game_ixs, as solve_many boards: the team's unrevealed words to hit
+        and every other unrevealed word to avoid.
+        """
+        words = self.vocabulary[self.words[game_ixs]]
+        hidden = ~self.revealed[game_ixs]
+        own = (self.colours[game_ixs] == team) & hidden
+        others = hidden & ~own
+        return [{"words_to_hit": game_words[game_own].tolist(), "words_to_avoid": game_words[game_others].tolist()}
+                for game_words, game_own, game_others in zip(words, own, others)]
+
+    def reveal(self, game_ixs: np.array, positions: np.array, team: int) -> np.array:
+        """Plays the guesses of team's operatives in games game_ixs, one guess of every game at a time. A game's
+        guesses stop at the first word that isn't the team's, or at a position of -1 or that is already revealed.
+        Revealing the black word loses the game; revealing a team's last word wins it for that team.
+
+        :param game_ixs: Games to play in
+        :param positions: (len(game_ixs), max guesses) board positions in the order they're guessed, padded with -1
+        :param team: Colour of the guessing team
+        :return: Number of words revealed in each game
+        """
+        game_ixs = np.asarray(game_ixs)
+        positions = np.asarray(positions)
+        n_revealed = np.zeros(len(game_ixs), dtype=np.int32)
+        guessing = np.flatnonzero(~self.finished[game_ixs])
+        for column in positions.T:
+            guessing = guessing[column[guessing] >= 0]
+            games, cells = game_ixs[guessing], column[guessing]
+            fresh = ~self.revealed[games, cells]
+            guessing, games, cells = guessing[fresh], games[fresh], cells[fresh]
+            if not len(guessing):
+                break
+
+            self.revealed[games, cells] = True
+            n_revealed[guessing] += 1
+            colours = self.colours[games, cells]
+            bombed = games[colours == Colour.BLACK]
+            self.winner[bombed] = opponent(team)
+            self.bomb[bombed] = True
+            self._update_winners(games)
+            keep = (colours == team) & ~self.finished[games]
+            guessing = guessing[keep]
+        return n_revealed
+
+    def _update_winners(self, games: np.array):
+        games = games[self.winner[games] == 0]
+        for team in TEAMS:
+            won = ~((self.colours[games] == team) & ~self.revealed[games]).any(axis=1)
+            self.winner[games[won]] = team
+            games = games[~won]
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+
+class IntendedWordsOperative:
+    """Guesses exactly the words a clue was meant to link, i.e. decodes every clue perfectly. Games then measure the
+    spymaster alone: how many turns its clues take to clear the board."""
+
+    def guess(self, games: GameBatch, game_ixs: np.array, clues: list) -> np.array:
+        """Positions to guess in games game_ixs given their clues.
+
+        :param games: GameBatch being played
+        :param game_ixs: Games to guess in
+        :param clues: Guess (as given by the bot) or None of each game
+        :return: (len(game_ixs), max guesses) board positions in guessing order, padded with -1
+        """
+        width = max((clue.num_words_linked for clue in clues if clue is not None), default=0)
+        positions = np.full(shape=(len(game_ixs), width), fill_value=-1, dtype=np.intp)
+        for row, (game_ix, clue) in enumerate(zip(game_ixs.tolist(), clues)):
+            if clue is None:
+                continue
+            board = {word: position for position, word in enumerate(games.vocabulary[games.words[game_ix]].tolist())}
+            positions[row, :clue.num_words_linked] = [board[word] for word in clue.linked_words]
+        return positions
+
+
+class SimulationResult:
+    def __init__(self, games: GameBatch, clues: int = 0, passes: int = 0, words_clued: int = 0, words_revealed: int = 0,
+                 own_words_revealed: int = 0, seconds: float = 0.):
+        """Outcome of a simulation.
+
+        :param games: The played GameBatch
+        :param clues: Number of clues given
+        :param passes: Number of turns where the spymaster found no clue
+        :param words_clued: Sum of the clue numbers
+        :param words_revealed: Words revealed by operatives
+        :param own_words_revealed: Of those, words of the guessing team
+        :param seconds: Wall time of the simulation
+        """
+        self.games = games
+        self.clues = clues
+        self.passes = passes
+        self.words_clued = words_clued
+        self.words_revealed = words_revealed
+        self.own_words_revealed = own_words_revealed
+        self.seconds = seconds
+
+    @classmethod
+    def merge(cls, results: list, seconds: float = None):
+        """One result for the games of results, e.g. simulated by different processes.
+
+        :param seconds: Wall time of the whole simulation. The sum of the results' times by default
+        """
+        counters = {name: sum(getattr(result, name) for result in results)
+                    for name in ["clues", "passes", "words_clued", "words_revealed", "own_words_revealed", "seconds"]}
+        if seconds is not None:
+            counters["seconds"] = seconds
+        return cls(GameBatch.concatenate([result.games for result in results]), **counters)
+
+    @property
+    def winner_turns(self) -> np.array:
+        """Turns the winning team played in each game (0 where nobody won): red plays the odd turns, blue the even."""
+        turns = self.games.turns
+        return np.where(self.games.winner == Colour.RED, (turns + 1) // 2,
+                        np.where(self.games.winner == Colour.BLUE, turns // 2, 0))
+
+    def summary(self) -> dict:
+        games = self.games
+        won = games.finished
+        n_games = max(len(games), 1)
+        winner_turns = self.winner_turns[won]
+        return {
+            "games": len(games),
+            "red_win_rate": int(np.count_nonzero(games.winner == Colour.RED)) / n_games,
+            "blue_win_rate": int(np.count_nonzero(games.winner == Colour.BLUE)) / n_games,
+            "bomb_rate": int(np.count_nonzero(games.bomb)) / n_games,
+            "stalled_rate": int(np.count_nonzero(games.stalled)) / n_games,
+            "unfinished_rate": int(np.count_nonzero(~won)) / n_games,
+            "turns_to_win": float(winner_turns.mean()) if len(winner_turns) else None,
+            "turns_to_win_p90": float(np.percentile(winner_turns, 90)) if len(winner_turns) else None,
+            "words_per_clue": self.words_clued / self.clues if self.clues else None,
+            "pass_rate": self.passes / (self.clues + self.passes) if self.clues + self.passes else None,
+            "guess_accuracy": self.own_words_revealed / self.words_revealed if self.words_revealed else None,
+            "games_per_second": len(games) / self.seconds if self.seconds else None
+        }
+
+
+class Simulator:
+    def __init__(self, spymaster, operative=None, opponent=None, max_turns: int = 50, batch_size: int = 1024):
+        """Plays GameBatches with bot spymasters. Each turn, the clues of all going games are found with solve_many,
+        batch_size games at a time, and their guesses played with GameBatch.reveal. Solvers are deterministic, so a game
+        where both teams in a row found no clue would never change again: it is stopped as stalled.
+
+        :param spymaster: Solver (CodeNamesSolverAlgorithm) giving red's clues, and blue's unless opponent is given
+        :param operative: Turns clues into guesses, with a guess(games, game_ixs, clues) method.
+        IntendedWordsOperative by default
+        :param opponent: Solver giving blue's clues. Self-play (spymaster) by default
+        :param max_turns: Games still going after this many turns are stopped without a winner
+        :param batch_size: Games whose clues are found with one solve_many
+        """
+        self.spymasters = {Colour.RED: spymaster, Colour.BLUE: opponent or spymaster}
+        self.operative = operative or IntendedWordsOperative()
+        self.max_turns = max_turns
+        self.batch_size = batch_size
+
+    def play(self, games: GameBatch) -> SimulationResult:
+        start_time = time.perf_counter()
+        result = SimulationResult(games)
+        passes = np.zeros(len(games), dtype=np.int32)
+        for turn in range(self.max_turns):
+            playing = np.flatnonzero(games.playing)
+            if not len(playing):
+                break
+            team = TEAMS[turn % 2]
+            games.turns[playing] += 1
+            for start in range(0, len(playing), self.batch_size):
+                game_ixs = playing[start:start + self.batch_size]
+                clues = self.give_clues(games, game_ixs, team)
+                own_before = games.remaining(team, game_ixs)
+                revealed = games.reveal(game_ixs, self.operative.guess(games, game_ixs, clues), team)
+
+                passed = np.array([clue is None for clue in clues], dtype=bool)
+                passes[game_ixs] = np.where(passed, passes[game_ixs] + 1, 0)
+                games.stalled[game_ixs] = passes[game_ixs] >= len(TEAMS)
+                result.clues += len(clues) - int(passed.sum())
+                result.passes += int(passed.sum())
+                result.words_clued += sum(clue.num_words_linked for clue in clues if clue is not None)
+                result.words_revealed += int(revealed.sum())
+                result.own_words_revealed += int((own_before - games.remaining(team, game_ixs)).sum())
+        result.seconds = time.perf_counter() - start_time
+        return result
+
+    def give_clues(self, games: GameBatch, game_ixs: np.array, team: int) -> list:
+        """Best clue of team's spymaster in each of games game_ixs, None where it found none."""
+        results = self.spymasters[team].solve_many(games.boards(game_ixs, team), n=1)
+        return [guesses[0] if guesses else None for guesses in results]
@@ -1,5 +1,9 @@
+import os
 import random
 
+# (absolute path, lower) -> (modification time, words) of every word list read, so each file is read once
+_word_lists = {}
+
 
 class WordList:
     def __init__(self, wordlist):
@@ -14,15 +18,25 @@ class WordListBuilder:
 
     def get_full_word_list(self):
         all_words = self._persist_words()
-        return WordList(wordlist=all_words)
+        return WordList(wordlist=list(all_words))
 
     def build(self):
         all_words = self._persist_words()
         wordlist = random.sample(all_words, self.n_words)
         return WordList(wordlist=wordlist)
 
-    def _persist_words(self):
-        all_words = open(self.path).read().split()
+    def _persist_words(self) -> tuple:
+        """Words of the file, read and split once per process and again only if the file changes."""
+        key = (os.path.abspath(self.path), self.lower)
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        cached = _word_lists.get(key)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+
+        with open(self.path) as file:
+            all_words = file.read().split()
         if self.lower:
-            return [word.lower() for word in all_words]
+            all_words = [word.lower() for word in all_words]
+        all_words = tuple(all_words)
+        _word_lists[key] = (mtime_ns, all_words)
         return all_words
@@ -0,0 +1,88 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join('..')))
+
+from bot import MeanIndividualDistance, SummedNearestNeighbour, Cosine, DotProduct, BruteForceIndex, IVFIndex
+from bot.solver import SolverBuilder
+from bot.utils import get_embeddings_glove_style, get_embeddings_paragram_style, get_embeddings_postspec_style
+from predict import get_test_cases
+
+PARSERS = {
+    "glove": get_embeddings_glove_style,
+    "postspec": get_embeddings_postspec_style,
+    "paragram": get_embeddings_paragram_style
+}
+
+
+def get_queries(builder: SolverBuilder, test_cases: list, algorithm, distance_metric) -> np.array:
+    """Query vectors of every word combination of every test case, as the solver would send them to the index."""
+    solver = builder.build(algorithm=algorithm, distance_metric=distance_metric)
+    queries = []
+    for case in test_cases:
+        words = [word for word in case["words_to_hit"] if word in builder.model]
+        if words:
+            _, membership = solver._get_combination_membership(len(words))
+            queries.append(solver._combination_queries(builder.model.rows(words), membership))
+    return np.vstack(queries)
+
+
+def recall_at_k(truth: np.array, found: np.array) -> float:
+    return float(np.mean([len(np.intersect1d(t, f)) / len(t) for t, f in zip(truth, found)]))
+
+
+def timed_search(index, queries: np.array, k: int) -> tuple:
+    start = time.perf_counter()
+    rows, _ = index.search(queries, k)
+    return rows, (time.perf_counter() - start) / len(queries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k and latency of nearest neighbour indexes against brute "
+                                                 "force, on the word combinations of the data/test cases.")
+    parser.add_argument("embedding_path")
+    parser.add_argument("--name", default="embeddings")
+    parser.add_argument("--style", choices=PARSERS.keys(), default="glove")
+    parser.add_argument("--k", type=int, default=100, help="Candidates per combination (n * search_space_multiplier)")
+    parser.add_argument("--n-lists", type=int, nargs="+", default=[0], help="IVF list counts, 0 for the default")
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--output", default="ann_recall.json")
+    args = parser.parse_args()
+
+    builder = SolverBuilder.with_embeddings(args.embedding_path, args.name, PARSERS[args.style])
+    test_cases = get_test_cases(os.path.join("..", "data", "test", "*"))
+
+    results = []
+    for algorithm in [MeanIndividualDistance, SummedNearestNeighbour]:
+        for distance_metric in [Cosine, DotProduct]:
+            queries = get_queries(builder, test_cases, algorithm, distance_metric)
+            brute_force = BruteForceIndex().build(builder.model, distance_metric)
+            truth, brute_force_latency = timed_search(brute_force, queries, args.k)
+            for n_lists in args.n_lists:
+                index = builder._prepare_index(IVFIndex(n_lists=n_lists or None), distance_metric)
+                for n_probe in args.n_probe:
+                    index.n_probe = n_probe
+                    found, latency = timed_search(index, queries, args.k)
+                    result = {
+                        "algorithm": algorithm.__name__,
+                        "distance": distance_metric.__name__,
+                        "n_lists": len(index.centroids),
+                        "n_probe": n_probe,
+                        "k": args.k,
+                        "n_queries": len(queries),
+                        "recall": recall_at_k(truth, found),
+                        "latency_ms": latency * 1000,
+                        "brute_force_latency_ms": brute_force_latency * 1000
+                    }
+                    print(f"{result['algorithm']:<25}{result['distance']:<12}lists={result['n_lists']:<6}"
+                          f"probe={n_probe:<4}recall@{args.k}={result['recall']:.3f}  "
+                          f"{result['latency_ms']:.3f}ms/query (brute force {result['brute_force_latency_ms']:.3f}ms)")
+                    results.append(result)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,232 @@
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join('..')))
+
+from bot import MeanIndividualDistance, SummedNearestNeighbour, Cosine, EmbeddingScorer
+from bot.solver import SolverBuilder
+from bot.utils import EmbeddingsDataLoader, get_embeddings_glove_style, get_embeddings_paragram_style, \
+    get_embeddings_postspec_style
+
+PARSERS = {
+    "glove": get_embeddings_glove_style,
+    "postspec": get_embeddings_postspec_style,
+    "paragram": get_embeddings_paragram_style
+}
+ALGORITHMS = [MeanIndividualDistance, SummedNearestNeighbour]
+LETTERS = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+
+
+def get_words(vocab_size: int, seed: int = 0) -> list:
+    """Distinct lowercase alphabetic words (so every parser keeps them) of 3 to 10 letters."""
+    rng = np.random.default_rng(seed)
+    words = {}
+    while len(words) < vocab_size:
+        lengths = rng.integers(3, 11, size=vocab_size)
+        letters = LETTERS[rng.integers(0, len(LETTERS), size=(vocab_size, 10))]
+        for row, length in zip(letters, lengths):
+            words.setdefault("".join(row[:length]), None)
+    return list(words)[:vocab_size]
+
+
+def generate_embeddings(path: str, style: str, vocab_size: int, dim: int, seed: int = 0, chunk_size: int = 10000):
+    """Writes random embeddings in the text format read by the style's parser:
+     - glove: "word v1 v2 ..."
+     - postspec: "en_word v1 v2 ..."
+     - paragram: a header line, then "word v1 v2 ..." in latin-1
+    """
+    rng = np.random.default_rng(seed)
+    words = get_words(vocab_size, seed)
+    prefix = "en_" if style == "postspec" else ""
+    with open(path, "w", encoding="latin-1") as file:
+        if style == "paragram":
+            file.write(f"{vocab_size} {dim}\n")
+        for start in range(0, vocab_size, chunk_size):
+            chunk = rng.standard_normal((min(chunk_size, vocab_size - start), dim)).astype(np.float32)
+            values = io.StringIO()
+            np.savetxt(values, chunk, fmt="%.5f")
+            for word, line in zip(words[start:start + chunk_size], values.getvalue().splitlines()):
+                file.write(f"{prefix}{word} {line}\n")
+
+
+class PeakRSS:
+    """Samples resident set size in a background thread, to get the peak of one stage rather than of the process."""
+    def __init__(self, interval: float = .002):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    @staticmethod
+    def current() -> int:
+        try:
+            with open("/proc/self/statm") as file:
+                return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            # No procfs: fall back to the peak over the process' lifetime (kilobytes on Linux, bytes on macOS)
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def measure(func, repeats: int = 3) -> dict:
+    """Times func over repeats runs, then runs it once more under tracemalloc to count allocations (which slows it
+    down, so it isn't timed).
+
+    :return: Wall times, peak RSS during the timed runs and peak traced allocations, in seconds and MiB
+    """
+    times = []
+    with PeakRSS() as rss:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak_allocated = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "wall_s_min": min(times),
+        "wall_s_median": float(np.median(times)),
+        "peak_rss_mib": rss.peak / 2 ** 20,
+        "peak_allocated_mib": peak_allocated / 2 ** 20
+    }
+
+
+def get_boards(words: list, sizes: list, n_boards: int, seed: int = 0) -> dict:
+    """n_boards random boards per size: words to hit of that size and 8 words to avoid."""
+    rng = np.random.default_rng(seed)
+    return {size: [(list(rng.choice(words, size, replace=False)), list(rng.choice(words, 8, replace=False)))
+                   for _ in range(n_boards)] for size in sizes}
+
+
+def run(data_dir: str, vocab_size: int, dim: int, styles: list, sizes: list, n_boards: int, n: int,
+        threshold: float, repeats: int) -> list:
+    results = []
+
+    def record(stage: str, func, **params):
+        result = {"stage": stage, **params, **measure(func, repeats)}
+        print(f"{stage:<10}{json.dumps(params):<75}{result['wall_s_min'] * 1000:>10.2f}ms"
+              f"{result['peak_rss_mib']:>10.0f}MiB rss{result['peak_allocated_mib']:>10.1f}MiB allocated")
+        results.append(result)
+
+    paths = {}
+    for style in styles:
+        paths[style] = os.path.join(data_dir, f"synthetic_{style}_{vocab_size}x{dim}.txt")
+        if not os.path.exists(paths[style]):
+            generate_embeddings(paths[style], style, vocab_size, dim)
+        loader = EmbeddingsDataLoader(paths[style])
+        record("load", lambda: loader.get_embeddings(PARSERS[style], style, cache=False), style=style, cached=False)
+        loader.convert(PARSERS[style])
+        record("load", lambda: loader.get_embeddings(PARSERS[style], style), style=style, cached=True)
+
+    builder = SolverBuilder.with_embeddings(paths[styles[0]], styles[0], PARSERS[styles[0]])
+    words = list(builder.model.words)
+    boards = get_boards(words, sizes, n_boards)
+    for algorithm in ALGORITHMS:
+        record("build", lambda: builder.build(algorithm=algorithm, threshold=threshold, distance_metric=Cosine),
+               algorithm=algorithm.__name__)
+        solver = builder.build(algorithm=algorithm, threshold=threshold, distance_metric=Cosine)
+        for size in sizes:
+            record("solve", lambda: [solver.solve(hit, avoid, n) for hit, avoid in boards[size]],
+                   algorithm=algorithm.__name__, board_size=size, n_boards=n_boards)
+            candidates = [(solver._get_candidates(hit, n), avoid) for hit, avoid in boards[size]]
+            record("score", lambda: [EmbeddingScorer(guesses, builder.model, avoid, n, threshold,
+                                                     distance_metric=Cosine).top_n_guesses()
+                                     for guesses, avoid in candidates],
+                   algorithm=algorithm.__name__, board_size=size, n_boards=n_boards)
+    return results
+
+
+def get_metadata(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        **{key: value for key, value in vars(args).items() if key not in ("output", "compare", "data_dir")}
+    }
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """Stages whose minimum wall time regressed by more than tolerance (a fraction) against baseline."""
+    key = lambda result: tuple((k, v) for k, v in result.items() if k in ("stage", "style", "cached", "algorithm",
+                                                                          "board_size"))
+    baseline = {key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = baseline.get(key(result))
+        if before is None:
+            continue
+        change = result["wall_s_min"] / before["wall_s_min"] - 1
+        print(f"{str(dict(key(result))):<90}{change:>+8.1%}")
+        if change > tolerance:
+            regressions.append(result)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times loading, building, solving and scoring on synthetic "
+                                                 "embeddings and writes the results as JSON.")
+    parser.add_argument("--vocab-size", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=300)
+    parser.add_argument("--styles", nargs="+", choices=PARSERS.keys(), default=list(PARSERS.keys()))
+    parser.add_argument("--board-sizes", type=int, nargs="+", default=list(range(1, 10)))
+    parser.add_argument("--boards", type=int, default=5, help="Boards solved per board size")
+    parser.add_argument("--n", type=int, default=10, help="Guesses per solve")
+    parser.add_argument("--threshold", type=float, default=.05)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--data-dir", default=None, help="Where synthetic embeddings are kept. A temporary directory "
+                                                          "by default")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", default=None, help="Earlier output to compare against. Exits with 1 if any "
+                                                        "stage is more than --tolerance slower")
+    parser.add_argument("--tolerance", type=float, default=.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        results = run(args.data_dir or temp_dir, args.vocab_size, args.dim, args.styles, args.board_sizes,
+                      args.boards, args.n, args.threshold, args.repeats)
+
+    with open(args.output, "w") as f:
+        json.dump({"metadata": get_metadata(args), "results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
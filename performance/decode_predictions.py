@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join('..')))
+
+from bot import Cosine, DotProduct
+from bot.solver import SolverBuilder
+from bot.utils import get_embeddings_glove_style, get_embeddings_paragram_style, get_embeddings_postspec_style
+from codenames.guess import EmbeddingOperative
+from predict import get_test_cases
+
+PARSERS = {
+    "glove": get_embeddings_glove_style,
+    "postspec": get_embeddings_postspec_style,
+    "paragram": get_embeddings_paragram_style
+}
+METRICS = {"Cosine": Cosine, "DotProduct": DotProduct}
+
+
+def decode_predictions(operative: EmbeddingOperative, predictions: list, boards: dict) -> list:
+    """Whether a guesser would have hit the intended words of each prediction. All predictions are decoded at once.
+
+    :param operative: EmbeddingOperative
+    :param predictions: Prediction records of predict.py
+    :param boards: Words to avoid of each test case, by tuple of its words to hit
+    :return: List of (number of intended words, intended words guessed, guesses of words to hit, guesses) per
+    prediction
+    """
+    clues = [prediction["prediction"]["clue"] for prediction in predictions]
+    numbers = [len(prediction["prediction"]["linked_words"]) for prediction in predictions]
+    case_boards = [prediction["words_to_hit"] + boards.get(tuple(prediction["words_to_hit"]), [])
+                   for prediction in predictions]
+    guesses = operative.decode_many(clues, case_boards, numbers)
+    outcomes = []
+    for prediction, guessed in zip(predictions, guesses):
+        intended, to_hit = set(prediction["prediction"]["linked_words"]), set(prediction["words_to_hit"])
+        outcomes.append((len(intended), len(intended.intersection(guessed)), len(to_hit.intersection(guessed)),
+                         len(guessed)))
+    return outcomes
+
+
+def summarise(predictions: list, outcomes: list) -> dict:
+    """Decoding rates per (model, threshold, algorithm):
+     - exact_rate: share of clues whose intended words are exactly the words guessed
+     - intended_recall: share of intended words guessed
+     - precision: share of guesses that are words to hit (rather than words to avoid)
+    """
+    groups = {}
+    for prediction, outcome in zip(predictions, outcomes):
+        key = (prediction["model_name"], prediction["threshold"], prediction["algorithm"])
+        groups.setdefault(key, []).append(outcome)
+    summaries = []
+    for (model_name, threshold, algorithm), group in groups.items():
+        n_intended, n_intended_guessed, n_hits, n_guessed = np.array(group).sum(axis=0).tolist()
+        summaries.append({
+            "model_name": model_name,
+            "threshold": threshold,
+            "algorithm": algorithm,
+            "predictions": len(group),
+            "exact_rate": sum(intended == guessed == total for intended, guessed, _, total in group) / len(group),
+            "intended_recall": n_intended_guessed / n_intended if n_intended else None,
+            "precision": n_hits / n_guessed if n_guessed else None
+        })
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scores predict.py results by whether a guesser (EmbeddingOperative) "
+                                                 "given each predicted clue and number, on the test case's board, "
+                                                 "would have guessed the words the clue was meant to link.")
+    parser.add_argument("results", nargs="+", help="results_<model>.json files written by predict.py")
+    parser.add_argument("--embedding-path", required=True, help="Embeddings of the guesser")
+    parser.add_argument("--name", default="glove")
+    parser.add_argument("--style", choices=PARSERS.keys(), default="glove")
+    parser.add_argument("--distance", choices=METRICS.keys(), default="Cosine")
+    parser.add_argument("--threshold", type=float, default=None, help="Confidence threshold of the guesser")
+    parser.add_argument("--output", default=None, help="Write the summaries as JSON")
+    args = parser.parse_args()
+
+    model = SolverBuilder.with_embeddings(args.embedding_path, args.name, PARSERS[args.style]).model
+    operative = EmbeddingOperative(model, METRICS[args.distance], args.threshold)
+    boards = {tuple(case["words_to_hit"]): case["words_to_avoid"]
+              for case in get_test_cases(os.path.join("..", "data", "test", "*"))}
+
+    summaries = []
+    for path in args.results:
+        with open(path, "r") as f:
+            predictions = [prediction for prediction in json.load(f) if isinstance(prediction["prediction"], dict)]
+        summaries.extend(summarise(predictions, decode_predictions(operative, predictions, boards)))
+    for summary in summaries:
+        print(f"{summary['model_name']:<12}{summary['threshold']:>8.3f}  {summary['algorithm']:<24}"
+              f"{summary['predictions']:>7}  exact {summary['exact_rate']:.3f}  recall "
+              f"{summary['intended_recall'] or 0:.3f}  precision {summary['precision'] or 0:.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summaries, f, indent=2)
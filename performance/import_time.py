@@ -0,0 +1,77 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+# Statement -> budget in milliseconds. `import bot` should cost next to nothing; building a solver needs numpy
+BUDGETS = {
+    "import bot": 50,
+    "from bot import SolverBuilder": 400,
+    "from bot.solver import SolverBuilder": 400
+}
+# Modules that importing the bot must not pull in
+FORBIDDEN = ["pandas", "tqdm"]
+
+CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": seconds, "peak_rss_mib": peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024,
+                  "modules": sorted(sys.modules)}}))
+"""
+
+
+def time_import(statement: str, repeats: int, root: str) -> dict:
+    """Times statement in repeats fresh interpreters (so nothing is already imported), run from root.
+
+    :return: Minimum and median wall time in milliseconds, peak RSS and the modules imported
+    """
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", CHILD.format(statement=statement)], cwd=root,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output))
+    times = [run["seconds"] * 1000 for run in runs]
+    return {
+        "statement": statement,
+        "ms_min": min(times),
+        "ms_median": float(np.median(times)),
+        "peak_rss_mib": max(run["peak_rss_mib"] for run in runs),
+        "modules": runs[-1]["modules"]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start import time of the bot, in fresh interpreters. Exits with "
+                                                 "1 if a statement is over its budget or imports a forbidden module.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1., help="Multiplies every budget, e.g. for slow machines")
+    parser.add_argument("--forbid", nargs="*", default=FORBIDDEN, help="Modules that must not be imported")
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    args = parser.parse_args()
+
+    root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    results, failures = [], []
+    for statement, budget in BUDGETS.items():
+        result = time_import(statement, args.repeats, root)
+        result["budget_ms"] = budget * args.scale
+        forbidden = [module for module in args.forbid if module in result["modules"]]
+        print(f"{statement:<40}{result['ms_min']:>9.1f}ms (median {result['ms_median']:.1f}ms, budget "
+              f"{result['budget_ms']:.0f}ms){result['peak_rss_mib']:>9.1f}MiB rss  {len(result['modules'])} modules"
+              + (f"  imports {', '.join(forbidden)}" if forbidden else ""))
+        if result["ms_min"] > result["budget_ms"] or forbidden:
+            failures.append(statement)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if failures:
+        print(f"{len(failures)} import(s) over budget or importing forbidden modules")
+        sys.exit(1)
@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# One BLAS thread per worker, so n workers use n cores rather than n * cores threads. Set before numpy is imported,
+# here and in the (spawned) workers, which inherit the environment
+BLAS_THREAD_VARIABLES = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "VECLIB_MAXIMUM_THREADS",
+                         "NUMEXPR_NUM_THREADS"]
+for variable in BLAS_THREAD_VARIABLES:
+    os.environ.setdefault(variable, "1")
+
+import numpy as np
+from tqdm import tqdm
+
+sys.path.append(os.path.abspath(os.path.join('..')))
+
+from bot import MeanIndividualDistance, SummedNearestNeighbour
+from bot.solver import SolverBuilder
+from bot.utils import get_embeddings_glove_style, get_embeddings_paragram_style, get_embeddings_postspec_style
+from predict import get_predictions, get_test_cases, get_yaml_config, solve_thresholds
+
+PARSERS = {
+    "get_embeddings_glove_style": get_embeddings_glove_style,
+    "get_embeddings_postspec_style": get_embeddings_postspec_style,
+    "get_embeddings_paragram_style": get_embeddings_paragram_style
+}
+ALGORITHMS = [MeanIndividualDistance, SummedNearestNeighbour]
+
+# Models opened by this worker, by position in the config
+_models = {}
+
+
+def get_model(model_config: dict) -> SolverBuilder:
+    """SolverBuilder for model_config. Embeddings are memory-mapped from their binary cache, so workers share the
+    same pages instead of each holding (or being sent) a copy.
+    """
+    return SolverBuilder.with_embeddings(model_config["embedding_path"], model_config["name"],
+                                         PARSERS[model_config["embeddings_parser"]])
+
+
+def run_task(model_ix: int, model_config: dict, algorithm_ix: int, case_ixs: list, test_cases: list,
+             thresholds: list) -> list:
+    """Threshold sweeps of one algorithm over a chunk of cases.
+
+    :return: List of (algorithm index, case index, sweep)
+    """
+    if model_ix not in _models:
+        _models.clear()
+        _models[model_ix] = get_model(model_config)
+    model = _models[model_ix]
+    return [(algorithm_ix, case_ix, solve_thresholds(model, test_cases[case_ix], thresholds, ALGORITHMS[algorithm_ix]))
+            for case_ix in case_ixs]
+
+
+def get_tasks(n_cases: int, chunk_size: int) -> list:
+    return [(algorithm_ix, list(range(start, min(start + chunk_size, n_cases))))
+            for algorithm_ix in range(len(ALGORITHMS)) for start in range(0, n_cases, chunk_size)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="predict.py over a process pool. Work is split into chunks of test "
+                                                 "cases per model and algorithm; results are identical to predict.py "
+                                                 "whatever the number of workers.")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=8, help="Test cases per task")
+    args = parser.parse_args()
+
+    conf = get_yaml_config(args.config)
+    thresholds = np.linspace(conf["threshold_min"], conf["threshold_max"], conf["n_thresholds"])
+    test_cases = get_test_cases(os.path.join("..", "data", "test", "*"))
+    tasks = get_tasks(len(test_cases), args.chunk_size)
+
+    # Workers are spawned rather than forked, so they don't inherit BLAS thread pools or the parent's models
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=get_context("spawn")) as executor:
+        for model_ix, model_config in enumerate(conf.get("models")):
+            # Parse once here and write the binary cache the workers memory-map
+            method = get_model(model_config).method
+
+            futures = [executor.submit(run_task, model_ix, model_config, algorithm_ix, case_ixs, test_cases,
+                                       thresholds) for algorithm_ix, case_ixs in tasks]
+            sweeps = {}
+            for future in tqdm(futures, desc=method):
+                for algorithm_ix, case_ix, sweep in future.result():
+                    sweeps[ALGORITHMS[algorithm_ix], case_ix] = sweep
+
+            predictions = get_predictions(method, thresholds, ALGORITHMS, test_cases, sweeps)
+            with open(f"results_{method}.json", "w") as f:
+                json.dump(predictions, f)
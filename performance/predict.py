@@ -18,15 +18,40 @@ from bot.solver import SolverBuilder
 from bot.utils import get_embeddings_glove_style, get_embeddings_paragram_style
 
 
-def solve_single(solver: SolverBuilder, test_case: dict, threshold: float = .3,
-                 algorithm: Type[CodeNamesSolverAlgorithm] = MeanIndividualDistance, n: int = 20) -> list:
-    runner = solver.build(threshold=threshold, algorithm=algorithm)
-    preds = runner.solve(words_to_hit=test_case["words_to_hit"], n=n)
-    for p in preds:
-        if isinstance(p, Guess):
-            yield p.as_dict()
-        else:
-            yield p
+def solve_thresholds(solver: SolverBuilder, test_case: dict, thresholds: list,
+                     algorithm: Type[CodeNamesSolverAlgorithm] = MeanIndividualDistance, n: int = 20) -> list:
+    """Predictions of test_case at every threshold, generating candidates only once (see solve_thresholds in the
+    algorithms).
+
+    :return: List with the predictions of each threshold
+    """
+    runner = solver.build(threshold=thresholds[0], algorithm=algorithm)
+    results = runner.solve_thresholds(words_to_hit=test_case["words_to_hit"], thresholds=thresholds, n=n)
+    return [[p.as_dict() if isinstance(p, Guess) else p for p in preds] for preds in results]
+
+
+def get_predictions(model_name: str, thresholds: list, algorithms: list, test_cases: list, sweeps: dict) -> list:
+    """Prediction records, one block per threshold, then algorithm, then case.
+
+    :param sweeps: solve_thresholds result per (algorithm, case index)
+    """
+    predictions = []
+    for threshold_ix, threshold in enumerate(thresholds):
+        for algo in algorithms:
+            for case_ix, case in enumerate(test_cases):
+                for pred in sweeps[algo, case_ix][threshold_ix]:
+                    try:
+                        predictions.append({
+                            "model_name": model_name,
+                            "threshold": threshold,
+                            "algorithm": algo.__name__,
+                            "words_to_hit": case["words_to_hit"],
+                            "true": case["answer"],
+                            "prediction": pred
+                        })
+                    except Exception as e:
+                        print(e)
+    return predictions
 
 
 def get_yaml_config(config_path: str) -> dict:
@@ -35,13 +60,14 @@ def get_yaml_config(config_path: str) -> dict:
 
 
 def get_test_cases(case_glob_path: str) -> list:
-    files = glob.glob(case_glob_path)
+    files = sorted(glob.glob(case_glob_path))
     cases = []
     for file in files:
         data = ast.literal_eval(json.load(open(file)))
         test_case = list(map(str.lower, data["selected_words"].split(";")))
+        unselected = [word.lower() for word in data.get("unselected_words", "").split(";") if word]
         answer = data["clue"].lower()
-        cases.append({"words_to_hit": test_case, "answer": answer})
+        cases.append({"words_to_hit": test_case, "words_to_avoid": unselected, "answer": answer})
     return cases
 
 
@@ -56,24 +82,12 @@ if __name__ == "__main__":
     test_cases = get_test_cases(test_cases_glob_path)
 
     for model_config in conf.get("models"):
-        predictions = []
         model_config["embeddings_parser"] = eval(model_config["embeddings_parser"])
         model = SolverBuilder.with_embeddings(**model_config)
-        for threshold in tqdm(thresholds):
-            for algo in algorithms:
-                for case in test_cases:
-                    for pred in solve_single(model, case, threshold, algo):
-                        try:
-                            predictions.append({
-                                "model_name": model.method,
-                                "threshold": threshold,
-                                "algorithm": algo.__name__,
-                                "words_to_hit": case["words_to_hit"],
-                                "true": case["answer"],
-                                "prediction": pred
-                            })
-                        except Exception as e:
-                            print(e)
+        # One sweep over all thresholds per (algorithm, case)
+        sweeps = {(algo, case_ix): solve_thresholds(model, case, thresholds, algo)
+                  for algo in tqdm(algorithms) for case_ix, case in enumerate(test_cases)}
+        predictions = get_predictions(model.method, thresholds, algorithms, test_cases, sweeps)
 
         with open(f"results_{model.method}.json", "w") as f:
             json.dump(predictions, f)
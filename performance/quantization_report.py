@@ -0,0 +1,115 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join('..')))
+
+from bot import MeanIndividualDistance, SummedNearestNeighbour, Cosine, DotProduct
+from bot.solver import SolverBuilder
+from bot.utils import get_embeddings_glove_style, get_embeddings_paragram_style, get_embeddings_postspec_style
+from benchmark import PeakRSS
+from predict import get_test_cases
+
+PARSERS = {
+    "glove": get_embeddings_glove_style,
+    "postspec": get_embeddings_postspec_style,
+    "paragram": get_embeddings_paragram_style
+}
+ALGORITHMS = {algorithm.__name__: algorithm for algorithm in [MeanIndividualDistance, SummedNearestNeighbour]}
+METRICS = {metric.__name__: metric for metric in [Cosine, DotProduct]}
+# (matrix dtype, quantization) of each configuration; the first is the reference
+CONFIGURATIONS = [("float64", None), ("float32", None), ("float32", "float16"), ("float32", "int8")]
+
+
+def solve_all(embedding_path: str, style: str, dtype: str, quantization: str, test_cases: list, n: int,
+              thresholds: dict) -> dict:
+    """Solves every test case with every algorithm and metric for one configuration. Run in a fresh process, so
+    resident memory isn't shared with other configurations.
+
+    :return: Top n (clue, linked words) of each solve, search matrix size, peak RSS and solve time
+    """
+    with PeakRSS() as rss:
+        builder = SolverBuilder.with_embeddings(embedding_path, style, PARSERS[style], dtype=np.dtype(dtype))
+        solvers = [builder.build(ALGORITHMS[algorithm], thresholds[metric], METRICS[metric], quantization=quantization)
+                   for algorithm in ALGORITHMS for metric in METRICS]
+        start = time.perf_counter()
+        predictions, rows_read = [], []
+        for solver in solvers:
+            solver.instrument = True
+            for case in test_cases:
+                guesses = solver.solve(case["words_to_hit"], n=n)
+                predictions.append([(guess.clue, list(guess.linked_words)) for guess in guesses])
+                rows_read.append(guesses.stats.counts.get("reranked_clues", 0) if quantization else
+                                 len(builder.model))
+        seconds = time.perf_counter() - start
+    search_matrix = builder.model.vectors if quantization is None else solvers[0].quantized
+    return {
+        "predictions": predictions,
+        "search_matrix_mib": search_matrix.nbytes / 2 ** 20,
+        # Pages of the full precision matrix a solve needs: all of them, or only those of the re-scored candidates
+        "full_precision_rows_per_solve": float(np.mean(rows_read)),
+        "peak_rss_mib": rss.peak / 2 ** 20,
+        **resident_memory(),
+        "solve_s": seconds
+    }
+
+
+def resident_memory() -> dict:
+    """Resident memory split into anonymous (private to this process) and file-backed (e.g. memory-mapped embeddings,
+    shared between processes and reclaimable) pages, in MiB. Empty without procfs."""
+    try:
+        with open("/proc/self/status") as file:
+            status = dict(line.split(":", 1) for line in file)
+    except OSError:
+        return {}
+    return {f"{key.lower()}_mib": int(status[key].split()[0]) / 1024 for key in ("RssAnon", "RssFile")
+            if key in status}
+
+
+def agreement(reference: list, predictions: list) -> dict:
+    """Mean overlap of each top n with the reference top n, and the fraction of identical top n lists."""
+    overlaps = []
+    for expected, found in zip(reference, predictions):
+        expected = {(clue, tuple(words)) for clue, words in expected}
+        found = {(clue, tuple(words)) for clue, words in found}
+        overlaps.append(len(expected & found) / len(expected) if expected else float(not found))
+    return {"top_n_overlap": float(np.mean(overlaps)),
+            "identical": float(np.mean([expected == found for expected, found in zip(reference, predictions)]))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory saved by quantized (float16/int8) candidate search and its "
+                                                 "top n agreement with the float64 path, on the data/test cases.")
+    parser.add_argument("embedding_path")
+    parser.add_argument("--style", choices=PARSERS.keys(), default="glove")
+    parser.add_argument("--n", type=int, default=10)
+    parser.add_argument("--cosine-threshold", type=float, default=.3)
+    parser.add_argument("--dot-product-threshold", type=float, default=10.)
+    parser.add_argument("--output", default="quantization_report.json")
+    args = parser.parse_args()
+
+    test_cases = get_test_cases(os.path.join("..", "data", "test", "*"))
+    thresholds = {"Cosine": args.cosine_threshold, "DotProduct": args.dot_product_threshold}
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for dtype, quantization in CONFIGURATIONS:
+        with context.Pool(1) as pool:
+            result = pool.apply(solve_all, (args.embedding_path, args.style, dtype, quantization, test_cases, args.n,
+                                            thresholds))
+        predictions = result.pop("predictions")
+        if not results:
+            reference = predictions
+        result = {"dtype": dtype, "quantization": quantization, **result, **agreement(reference, predictions)}
+        print(f"{dtype:<9}{str(quantization):<9}search matrix {result['search_matrix_mib']:>8.1f}MiB  "
+              f"full precision rows/solve {result['full_precision_rows_per_solve']:>9.0f}  "
+              f"peak rss {result['peak_rss_mib']:>8.1f}MiB  solve {result['solve_s']:>7.2f}s  "
+              f"top-{args.n} overlap {result['top_n_overlap']:.4f}  identical {result['identical']:.4f}")
+        results.append(result)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# One BLAS thread per worker, so n workers use n cores rather than n * cores threads. Set before numpy is imported,
+# here and in the (spawned) workers, which inherit the environment
+BLAS_THREAD_VARIABLES = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "VECLIB_MAXIMUM_THREADS",
+                         "NUMEXPR_NUM_THREADS"]
+for variable in BLAS_THREAD_VARIABLES:
+    os.environ.setdefault(variable, "1")
+
+sys.path.append(os.path.abspath(os.path.join('..')))
+
+from bot import MeanIndividualDistance, SummedNearestNeighbour, Cosine, DotProduct
+from bot.solver import SolverBuilder
+from bot.utils import get_embeddings_glove_style, get_embeddings_paragram_style, get_embeddings_postspec_style
+from codenames.board import BoardFactory
+from codenames.guess import EmbeddingOperative
+from codenames.simulator import GameBatch, IntendedWordsOperative, SimulationResult, Simulator
+
+PARSERS = {
+    "glove": get_embeddings_glove_style,
+    "postspec": get_embeddings_postspec_style,
+    "paragram": get_embeddings_paragram_style
+}
+ALGORITHMS = {"MeanIndividualDistance": MeanIndividualDistance, "SummedNearestNeighbour": SummedNearestNeighbour}
+METRICS = {"Cosine": Cosine, "DotProduct": DotProduct}
+
+# Embeddings opened by this worker
+_builders = {}
+
+
+def get_builder(embedding_path: str, name: str, style: str) -> SolverBuilder:
+    """SolverBuilder of the embeddings, opened once per worker. Embeddings are memory-mapped from their binary cache,
+    so workers share the same pages."""
+    key = (embedding_path, name, style)
+    if key not in _builders:
+        _builders.clear()
+        _builders[key] = SolverBuilder.with_embeddings(embedding_path, name, PARSERS[style])
+    return _builders[key]
+
+
+def get_factory(builder: SolverBuilder, word_list_path: str, seed: int) -> BoardFactory:
+    """Boards of the words of the word list that have an embedding, so every board word can be clued and guessed."""
+    return BoardFactory.from_word_list(word_list_path, keep=builder.model, seed=seed)
+
+
+def run_shard(args: argparse.Namespace, config: tuple, start: int, stop: int) -> SimulationResult:
+    """Self-play of one solver configuration on games start to stop."""
+    algorithm, distance = config
+    builder = get_builder(args.embedding_path, args.name, args.style)
+    solver = builder.build(ALGORITHMS[algorithm], args.threshold, METRICS[distance])
+    games = GameBatch.from_factory(get_factory(builder, args.word_list, args.seed), start, stop)
+    if args.operative == "embedding":
+        operative = EmbeddingOperative(builder.model, METRICS[distance], args.operative_threshold)
+    else:
+        operative = IntendedWordsOperative()
+    return Simulator(solver, operative, max_turns=args.max_turns, batch_size=args.batch_size).play(games)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Self-play of solver configurations on the same random games, "
+                                                 "sharded over a process pool. Reports win rates, turns to win and "
+                                                 "bomb rate per configuration.")
+    parser.add_argument("embedding_path")
+    parser.add_argument("--name", default="glove")
+    parser.add_argument("--style", choices=PARSERS.keys(), default="glove")
+    parser.add_argument("--word-list", default=os.path.join("..", "data", "wordlist-eng.txt"))
+    parser.add_argument("--algorithms", nargs="+", choices=ALGORITHMS.keys(), default=list(ALGORITHMS.keys()))
+    parser.add_argument("--distances", nargs="+", choices=METRICS.keys(), default=["Cosine"])
+    parser.add_argument("--threshold", type=float, default=.3)
+    parser.add_argument("--operative", choices=["intended", "embedding"], default="embedding",
+                        help="intended guesses the words each clue was meant to link; embedding ranks the board by "
+                             "similarity to the clue in the same embeddings")
+    parser.add_argument("--operative-threshold", type=float, default=None, help="Confidence threshold of the "
+                                                                                  "embedding operative")
+    parser.add_argument("--games", type=int, default=1000, help="Games per configuration")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=1024, help="Games whose clues are found with one solve_many")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--shard-games", type=int, default=2000, help="Games per task")
+    parser.add_argument("--output", default=None, help="Write the summaries as JSON")
+    args = parser.parse_args()
+
+    configs = [(algorithm, distance) for algorithm in args.algorithms for distance in args.distances]
+    # Every configuration plays the same games: board i of a seed doesn't depend on how games are sharded
+    shards = [(start, min(start + args.shard_games, args.games)) for start in range(0, args.games, args.shard_games)]
+
+    # Parse once here and write the binary cache the workers memory-map
+    get_builder(args.embedding_path, args.name, args.style)
+    summaries = {}
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=get_context("spawn")) as executor:
+        for config in configs:
+            start_time = time.perf_counter()
+            futures = [executor.submit(run_shard, args, config, start, stop) for start, stop in shards]
+            result = SimulationResult.merge([future.result() for future in futures],
+                                            seconds=time.perf_counter() - start_time)
+            summaries["/".join(config)] = summary = result.summary()
+            print(f"{'/'.join(config):<40}red {summary['red_win_rate']:.3f}  blue {summary['blue_win_rate']:.3f}  "
+                  f"bomb {summary['bomb_rate']:.3f}  stalled {summary['stalled_rate']:.3f}  turns to win "
+                  f"{summary['turns_to_win'] or float('nan'):.2f}  words/clue {summary['words_per_clue'] or 0:.2f}  "
+                  f"{summary['games_per_second']:.1f} games/s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summaries, f, indent=2)
@@ -0,0 +1,32 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join('..')))
+
+from bot.utils import EmbeddingsDataLoader, get_embeddings_glove_style, get_embeddings_postspec_style, \
+    get_embeddings_paragram_style, initialise_logger, read_word_list
+
+PARSERS = {
+    "glove": get_embeddings_glove_style,
+    "postspec": get_embeddings_postspec_style,
+    "paragram": get_embeddings_paragram_style
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert text embeddings to the binary (memory-mappable) cache.")
+    parser.add_argument("embedding_path")
+    parser.add_argument("--style", choices=PARSERS.keys(), default="glove")
+    parser.add_argument("--dtype", choices=["float32", "float64"], default="float32")
+    parser.add_argument("--vocabulary", default=None, help="Word list (one word per line) to restrict the cache to, "
+                                                           "e.g. ../data/google-10000-english.txt")
+    parser.add_argument("--workers", type=int, default=None, help="Parsing processes, the number of CPUs by default")
+    args = parser.parse_args()
+
+    logger = initialise_logger()
+    vocabulary = read_word_list(args.vocabulary) if args.vocabulary else None
+    cache_path = EmbeddingsDataLoader(args.embedding_path).convert(PARSERS[args.style], np.dtype(args.dtype),
+                                                                   vocabulary, args.workers)
+    logger.info(f"Wrote {cache_path}.npy, {cache_path}.vocab and {cache_path}.json")
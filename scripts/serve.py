@@ -0,0 +1,45 @@
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join('..')))
+
+from bot import MeanIndividualDistance, SummedNearestNeighbour, Cosine, DotProduct
+from bot.service import serve
+from bot.solver import SolverBuilder
+from bot.utils import get_embeddings_glove_style, get_embeddings_postspec_style, get_embeddings_paragram_style, \
+    initialise_logger
+
+PARSERS = {
+    "glove": get_embeddings_glove_style,
+    "postspec": get_embeddings_postspec_style,
+    "paragram": get_embeddings_paragram_style
+}
+ALGORITHMS = [MeanIndividualDistance, SummedNearestNeighbour]
+METRICS = {"Cosine": Cosine, "DotProduct": DotProduct}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve solves over HTTP from embeddings loaded once. Solvers are "
+                                                 "named <algorithm>/<distance>, e.g. MeanIndividualDistance/Cosine.")
+    parser.add_argument("embedding_path")
+    parser.add_argument("--name", default="glove", help="Model name, used to look up strategy thresholds")
+    parser.add_argument("--style", choices=PARSERS.keys(), default="glove")
+    parser.add_argument("--distance", choices=METRICS.keys(), nargs="+", default=["Cosine"])
+    parser.add_argument("--threshold", type=float, default=.3)
+    parser.add_argument("--strategy", default=None, help="Use the threshold of this strategy in --conf-path instead")
+    parser.add_argument("--conf-path", default=os.path.join("..", "data", "params.csv"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix-socket", default=None, help="Serve on this unix socket instead of host and port")
+    parser.add_argument("--max-queue", type=int, default=256, help="Requests waiting at most before rejecting (503)")
+    parser.add_argument("--max-batch", type=int, default=64, help="Requests coalesced into one solve_many at most")
+    parser.add_argument("--max-wait-ms", type=float, default=2., help="How long a batch waits for more requests")
+    args = parser.parse_args()
+
+    initialise_logger()
+    builder = SolverBuilder.with_embeddings(args.embedding_path, args.name, PARSERS[args.style])
+    solvers = {f"{algorithm.__name__}/{distance}": builder.build(algorithm, args.threshold, METRICS[distance],
+                                                                 strategy=args.strategy, conf_path=args.conf_path)
+               for distance in args.distance for algorithm in ALGORITHMS}
+    serve(solvers, args.host, args.port, args.unix_socket, max_queue=args.max_queue, max_batch=args.max_batch,
+          max_wait=args.max_wait_ms / 1000)
@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join('..')))
+
+from bot.service import RollingStats, ServiceClient
+from codenames.wordlist import WordListBuilder
+
+
+async def run_client(client: ServiceClient, boards: list, n: int, solver: str, latency_ms: RollingStats,
+                     statuses: dict):
+    for words_to_hit, words_to_avoid in boards:
+        start = time.perf_counter()
+        status, _ = await client.solve(words_to_hit, words_to_avoid, n, solver)
+        latency_ms.record((time.perf_counter() - start) * 1000)
+        statuses[status] = statuses.get(status, 0) + 1
+    await client.close()
+
+
+async def main(args):
+    words = WordListBuilder(os.path.join("..", "data", "wordlist-eng.txt")).get_full_word_list().wordlist
+    rng = random.Random(0)
+    boards = [(rng.sample(words, rng.randint(1, 4)), rng.sample(words, 8)) for _ in range(args.requests)]
+    clients = [ServiceClient(args.host, args.port, args.unix_socket) for _ in range(args.concurrency)]
+    latency_ms, statuses = RollingStats(), {}
+
+    start = time.perf_counter()
+    await asyncio.gather(*[run_client(client, boards[i::args.concurrency], args.n, args.solver, latency_ms, statuses)
+                           for i, client in enumerate(clients)])
+    seconds = time.perf_counter() - start
+
+    stats_client = ServiceClient(args.host, args.port, args.unix_socket)
+    _, service_stats = await stats_client.request("GET", "/stats")
+    await stats_client.close()
+    print(json.dumps({"requests": args.requests, "concurrency": args.concurrency, "seconds": seconds,
+                      "requests_per_s": args.requests / seconds, "statuses": statuses,
+                      "client_latency_ms": latency_ms.summary(), "service": service_stats}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sends random boards to a running scripts/serve.py from concurrent "
+                                                 "connections and prints client and service latency percentiles.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix-socket", default=None)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--n", type=int, default=10)
+    parser.add_argument("--solver", default=None, help="Solver name, the service's first by default")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,169 @@
+import itertools
+import string
+
+import numpy as np
+import pytest
+
+from bot import MeanIndividualDistance, SummedNearestNeighbour, Cosine, DotProduct
+from bot.candidates import CandidateStream, _FETCH_OVERHEAD
+from bot.embeddings import EmbeddingMatrix
+
+ALGORITHMS = [MeanIndividualDistance, SummedNearestNeighbour]
+# Thresholds at which a fair share of the random clues are connected to a word
+METRICS = [(Cosine, .1), (DotProduct, 1.)]
+N = 5
+# More words than one vocabulary block of the smallest size (_BLOCK_ALIGNMENT rows)
+VOCABULARY_SIZE = 2500
+
+
+@pytest.fixture(scope="module")
+def model() -> EmbeddingMatrix:
+    """Random float64 embeddings (so the search paths don't reorder near ties by rounding) of short words, plus
+    compounds of the first ones close to the sum of their parts (as catfish to cat and fish), so that the best clues
+    of a board of those words are illegal."""
+    rng = np.random.default_rng(0)
+    words = ["".join(letters) for letters in itertools.islice(itertools.product(string.ascii_lowercase, repeat=3),
+                                                              VOCABULARY_SIZE)]
+    embeddings = {word: rng.normal(size=16) for word in words}
+    for first, second in itertools.combinations(words[:8], 2):
+        embeddings[first + second] = embeddings[first] + embeddings[second] + rng.normal(scale=.5, size=16)
+    return EmbeddingMatrix.from_dict(embeddings, dtype=np.float64)
+
+
+@pytest.fixture(scope="module")
+def boards(model) -> list:
+    rng = np.random.default_rng(1)
+    boards = [{"words_to_hit": model.words[:4].tolist(), "words_to_avoid": model.words[4:6].tolist()}]
+    for _ in range(5):
+        words = rng.choice(model.words[:VOCABULARY_SIZE], 6, replace=False).tolist()
+        boards.append({"words_to_hit": words[:4], "words_to_avoid": words[4:]})
+    return boards
+
+
+def solve(solver, board: dict, n: int = N) -> list:
+    return solver.solve(board["words_to_hit"], board["words_to_avoid"], n)
+
+
+def assert_same_guesses(actual: list, expected: list):
+    assert [(guess.clue, tuple(guess.linked_words)) for guess in actual] == \
+        [(guess.clue, tuple(guess.linked_words)) for guess in expected]
+    assert [guess.score for guess in actual] == pytest.approx([guess.score for guess in expected])
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("metric, threshold", METRICS)
+@pytest.mark.parametrize("adaptive_depth", [True, False])
+def test_batched_matches_per_combination(model, boards, algorithm, metric, threshold, adaptive_depth):
+    batched = algorithm(model, threshold, distance_metric=metric, adaptive_depth=adaptive_depth)
+    per_combination = algorithm(model, threshold, distance_metric=metric, batched=False,
+                                adaptive_depth=adaptive_depth)
+    for board in boards:
+        expected = solve(per_combination, board)
+        assert expected
+        assert_same_guesses(solve(batched, board), expected)
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("metric, threshold", METRICS)
+def test_branch_and_bound_matches_exhaustive(model, boards, algorithm, metric, threshold):
+    exhaustive = algorithm(model, threshold, distance_metric=metric)
+    branch_and_bound = algorithm(model, threshold, distance_metric=metric, branch_and_bound=True)
+    for board in boards:
+        assert_same_guesses(solve(branch_and_bound, board), solve(exhaustive, board))
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("metric, threshold", METRICS)
+def test_solve_thresholds_matches_solve(model, boards, algorithm, metric, threshold):
+    thresholds = [threshold / 2, threshold, threshold * 2]
+    solver = algorithm(model, threshold, distance_metric=metric)
+    for board in boards:
+        results = solver.solve_thresholds(board["words_to_hit"], thresholds, board["words_to_avoid"], N)
+        for result, sweep_threshold in zip(results, thresholds):
+            assert_same_guesses(result, solve(algorithm(model, sweep_threshold, distance_metric=metric), board))
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("metric, threshold", METRICS)
+def test_solve_many_matches_solve(model, boards, algorithm, metric, threshold):
+    solver = algorithm(model, threshold, distance_metric=metric)
+    for result, board in zip(solver.solve_many(boards, N), boards):
+        assert_same_guesses(result, solve(solver, board))
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("metric, threshold", METRICS)
+def test_vocabulary_blocks_match_one_block(model, boards, algorithm, metric, threshold):
+    one_block = algorithm(model, threshold, distance_metric=metric)
+    # Blocks of the smallest size, so the vocabulary is streamed in several
+    blocked = algorithm(model, threshold, distance_metric=metric, max_block_bytes=1)
+    for board in boards:
+        assert_same_guesses(solve(blocked, board), solve(one_block, board))
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("metric, threshold", METRICS)
+def test_legality_index_matches_scorer_checks(model, boards, algorithm, metric, threshold):
+    masked = algorithm(model, threshold, distance_metric=metric)
+    unmasked = algorithm(model, threshold, distance_metric=metric, filter_illegal=False)
+    for board in boards:
+        assert_same_guesses(solve(masked, board), solve(unmasked, board))
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("metric, threshold", METRICS)
+@pytest.mark.parametrize("batched", [True, False])
+def test_adaptive_depth_matches_whole_vocabulary(model, boards, algorithm, metric, threshold, batched):
+    adaptive = algorithm(model, threshold, distance_metric=metric, batched=batched, search_space_multiplier=1)
+    exhaustive = algorithm(model, threshold, distance_metric=metric, batched=batched,
+                           search_space_multiplier=len(model), adaptive_depth=False)
+    for board in boards:
+        assert_same_guesses(solve(adaptive, board), solve(exhaustive, board))
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("metric, threshold", METRICS)
+@pytest.mark.parametrize("options", [{}, {"batched": False}, {"branch_and_bound": True}])
+def test_adaptive_depth_within_max_block_bytes_matches_whole_vocabulary(model, boards, algorithm, metric, threshold,
+                                                                        options, monkeypatch):
+    max_block_bytes = 2 ** 13
+    refills, scans = [], []
+    extend, scan_refill = CandidateStream.extend, CandidateStream.scan_refill
+
+    def record_extend(stream, columns, rows, scores, depth):
+        refills.append(_FETCH_OVERHEAD * (rows.itemsize + scores.itemsize) * len(columns) * depth)
+        extend(stream, columns, rows, scores, depth)
+
+    def record_scan_refill(stream, columns):
+        paging = scan_refill(stream, columns)
+        scans.append(len(columns) - len(paging))
+        return paging
+
+    monkeypatch.setattr(CandidateStream, "extend", record_extend)
+    monkeypatch.setattr(CandidateStream, "scan_refill", record_scan_refill)
+    # So little memory that buffers can't go deeper than a refill or two, past which combinations scan the vocabulary
+    bounded = algorithm(model, threshold, distance_metric=metric, search_space_multiplier=1,
+                        max_block_bytes=max_block_bytes, **options)
+    exhaustive = algorithm(model, threshold, distance_metric=metric, search_space_multiplier=len(model),
+                           adaptive_depth=False, **options)
+    for board in boards:
+        assert_same_guesses(solve(bounded, board), solve(exhaustive, board))
+    for result, board in zip(bounded.solve_many(boards, N), boards):
+        assert_same_guesses(result, solve(exhaustive, board))
+    assert refills and max(refills) <= max_block_bytes
+    assert sum(scans) > 0 or options.get("batched") is False
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("options", [{}, {"batched": False}, {"branch_and_bound": True}])
+def test_unknown_words_are_skipped(model, algorithm, options):
+    solver = algorithm(model, .1, **options)
+    words = model.words[:3].tolist()
+    assert_same_guesses(solver.solve(["unknown"] + words, n=N), solver.solve(words, n=N))
+    assert solver.solve(["unknown"], n=N) == []
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("options", [{}, {"batched": False}, {"branch_and_bound": True}])
+def test_no_guesses_for_n_0(model, algorithm, options):
+    assert algorithm(model, .1, **options).solve(model.words[:3].tolist(), n=0) == []
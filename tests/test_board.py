@@ -0,0 +1,80 @@
+import builtins
+import os
+
+import numpy as np
+import pytest
+
+from codenames.board import Board, BoardFactory
+from codenames.colours import Colour
+from codenames.game import GameBuilder
+from codenames.wordlist import WordListBuilder
+
+WORD_LIST_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "data", "wordlist-eng.txt")
+SMALL_BOARD = Board(board_size_x=2, board_size_y=3, n_board_words_red=2, n_board_words_blue=2,
+                    n_board_words_grey=1, n_board_words_black=1)
+
+
+@pytest.mark.parametrize("n_words", [40, 1000])
+def test_boards_have_distinct_words_and_all_colours(n_words):
+    # Few words are drawn by ranking random keys, many by redrawing repeats
+    factory = BoardFactory([f"word{i}" for i in range(n_words)], seed=0, block_boards=64)
+    words, colours = factory.boards(0, 200)
+    assert words.shape == colours.shape == (200, 25)
+    assert all(len(set(board)) == 25 for board in words.tolist())
+    assert words.min() >= 0 and words.max() < n_words
+    for colour, count in [(Colour.RED, 9), (Colour.BLUE, 8), (Colour.GREY, 7), (Colour.BLACK, 1)]:
+        assert ((colours == colour).sum(axis=1) == count).all()
+
+
+def test_boards_dont_depend_on_range_or_chunks():
+    factory = BoardFactory([f"word{i}" for i in range(100)], board=SMALL_BOARD, seed=1, block_boards=16)
+    words, colours = factory.boards(0, 100)
+    middle_words, middle_colours = factory.boards(37, 61)
+    np.testing.assert_array_equal(middle_words, words[37:61])
+    np.testing.assert_array_equal(middle_colours, colours[37:61])
+    chunks = list(factory.stream(90, chunk_boards=7, start=10))
+    np.testing.assert_array_equal(np.concatenate([chunk_words for chunk_words, _ in chunks]), words[10:])
+    np.testing.assert_array_equal(np.concatenate([chunk_colours for _, chunk_colours in chunks]), colours[10:])
+    assert factory.boards(5, 5)[0].shape == (0, 6)
+
+    same_seed = BoardFactory([f"word{i}" for i in range(100)], board=SMALL_BOARD, seed=1, block_boards=16)
+    np.testing.assert_array_equal(same_seed.boards(0, 100)[0], words)
+    other_seed = BoardFactory([f"word{i}" for i in range(100)], board=SMALL_BOARD, seed=2, block_boards=16)
+    assert not np.array_equal(other_seed.boards(0, 100)[0], words)
+
+
+def test_rejects_impossible_boards():
+    with pytest.raises(ValueError):
+        BoardFactory(["word"] * 30)
+    with pytest.raises(ValueError):
+        BoardFactory([f"word{i}" for i in range(30)], board=Board(n_board_words_grey=6))
+
+
+def test_word_list_is_read_once(tmp_path, monkeypatch):
+    path = tmp_path / "words.txt"
+    path.write_text("\n".join(f"WORD{i}" for i in range(30)) + "\n")
+    opened, open_ = [], builtins.open
+    monkeypatch.setattr(builtins, "open", lambda file, *args, **kwargs: opened.append(file) or
+                        open_(file, *args, **kwargs))
+
+    factory = BoardFactory.from_word_list(str(path), keep={f"word{i}" for i in range(28)}, seed=0)
+    assert factory.vocabulary.tolist() == [f"word{i}" for i in range(28)]
+    for _ in range(3):
+        assert len(WordListBuilder(str(path)).build().wordlist) == 25
+    assert WordListBuilder(str(path), lower=False).get_full_word_list().wordlist[0] == "WORD0"
+    # Once lowercased and once as is
+    assert opened == [str(path)] * 2
+
+    # Read again once the file changes
+    path.write_text("\n".join(f"OTHER{i}" for i in range(30)) + "\n")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert WordListBuilder(str(path)).get_full_word_list().wordlist[0] == "other0"
+
+
+def test_game_builder_deals_standard_boards():
+    game = GameBuilder(WORD_LIST_PATH).build()
+    assert game.words.shape == game.answers.shape == (5, 5)
+    assert len(set(game.words.ravel().tolist())) == 25
+    for colour, count in [(Colour.RED, 9), (Colour.BLUE, 8), (Colour.GREY, 7), (Colour.BLACK, 1)]:
+        assert (game.answers == colour).sum() == count
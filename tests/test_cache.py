@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from bot import MeanIndividualDistance
+from bot.cache import LRUCache, SolverCache, estimate_nbytes
+from bot.embeddings import EmbeddingMatrix
+from bot.index import IVFIndex
+
+
+@pytest.fixture(scope="module")
+def model() -> EmbeddingMatrix:
+    rng = np.random.default_rng(0)
+    words = [f"{first}{second}{third}" for first in "abcdefgh" for second in "abcdefgh" for third in "abcdefgh"]
+    return EmbeddingMatrix.from_dict({word: rng.normal(size=16) for word in words}, name="random")
+
+
+def test_hits_and_misses():
+    cache = LRUCache()
+    assert cache.get("a") is None
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b", "default") == "default"
+    assert cache.stats == {"entries": 1, "bytes": estimate_nbytes(1), "hits": 1, "misses": 2}
+
+
+def test_evicts_least_recently_used_entry():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert len(cache) == 2
+
+
+def test_evicts_by_bytes():
+    value = np.zeros(100)
+    cache = LRUCache(max_bytes=2 * estimate_nbytes(value))
+    for key in "abc":
+        cache.put(key, value.copy())
+    assert cache.get("a") is None and cache.get("b") is not None and cache.get("c") is not None
+    assert cache.nbytes == 2 * estimate_nbytes(value)
+    # Values larger than the whole cache aren't stored
+    cache.put("d", np.zeros(1000))
+    assert cache.get("d") is None and len(cache) == 2
+
+
+def test_replacing_an_entry_updates_bytes():
+    cache = LRUCache()
+    cache.put("a", np.zeros(100))
+    cache.put("a", np.zeros(10))
+    assert cache.nbytes == estimate_nbytes(np.zeros(10))
+
+
+def test_cached_results_are_immutable(model):
+    cache = SolverCache()
+    solver = MeanIndividualDistance(model, .1, cache=cache)
+    words = model.words[:3].tolist()
+    first = solver.solve(words, n=5)
+    first[0].clue = "changed"
+    first.clear()
+    again = solver.solve(words, n=5)
+    assert cache.results.hits == 1
+    assert again and again[0].clue != "changed"
+
+    key = cache.candidate_key(solver, ("a",), 10)
+    cache.put_candidates(key, np.arange(3), np.ones(3))
+    rows, scores = cache.get_candidates(key)
+    with pytest.raises(ValueError):
+        rows[0] = 1
+    with pytest.raises(ValueError):
+        scores[0] = 0.
+
+
+def test_cached_results_follow_word_order(model):
+    cache = SolverCache()
+    cached = MeanIndividualDistance(model, .1, cache=cache)
+    uncached = MeanIndividualDistance(model, .1)
+    words = model.words[:3].tolist()
+    cached.solve(words, n=5)
+    for order in (words, words[::-1]):
+        assert [(guess.clue, guess.linked_words) for guess in cached.solve(order, n=5)] == \
+            [(guess.clue, guess.linked_words) for guess in uncached.solve(order, n=5)]
+
+
+def test_solvers_with_different_results_share_a_cache(model):
+    cache = SolverCache()
+    approximate = MeanIndividualDistance(model, .1, cache=cache, index=IVFIndex(n_lists=16, n_probe=1).build(model))
+    exact = MeanIndividualDistance(model, .1, cache=cache)
+    branch_and_bound = MeanIndividualDistance(model, .1, cache=cache, branch_and_bound=True, bound_tolerance=.5)
+    words = model.words[:4].tolist()
+    approximate.solve(words, n=5)
+    branch_and_bound.solve(words, n=5)
+    exact.solve(words, n=5)
+    assert cache.results.hits == 0 and len(cache.results) == 3
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+from bot.candidates import CandidateStream, _FETCH_OVERHEAD
+
+VOCABULARY_SIZE = 1000
+N_COMBINATIONS = 6
+FIRST = 5
+FIRST_DEPTH = 10
+SCAN_BLOCK = 64
+ITEM_BYTES = np.dtype(np.intp).itemsize + np.dtype(np.float64).itemsize
+# Room for the first buffers and one refill four times deeper per combination, but not two
+MAX_BYTES = _FETCH_OVERHEAD * ITEM_BYTES * N_COMBINATIONS * (FIRST_DEPTH + 4 * FIRST_DEPTH + 10)
+
+
+@pytest.fixture
+def scores() -> np.array:
+    """(vocabulary size, n_combinations) similarities, with some clues masked out."""
+    rng = np.random.default_rng(0)
+    scores = rng.normal(size=(VOCABULARY_SIZE, N_COMBINATIONS))
+    scores[rng.random(scores.shape) < .1] = -np.inf
+    return scores
+
+
+def top_candidates(scores: np.array, depth: int) -> tuple:
+    rows = np.argsort(-scores, axis=0, kind="stable")[:depth].T
+    return rows, np.take_along_axis(scores.T, rows, axis=1)
+
+
+def masked(scores: np.array, columns: np.array, handed_out: list, start: int = 0) -> np.array:
+    scores = scores[:, columns].copy()
+    for position, handed_rows in enumerate(handed_out):
+        handed_rows = handed_rows[(handed_rows >= start) & (handed_rows < start + len(scores))]
+        scores[handed_rows - start, position] = -np.inf
+    return scores
+
+
+def make_stream(scores: np.array, max_bytes: int = None, with_scan: bool = True) -> tuple:
+    """CandidateStream over scores, and the (kind, n_columns, depth, buffered) of each of its refills, with buffered
+    the candidates of all buffers while fetching."""
+    refills = []
+
+    def fetch(columns, depth, handed_out):
+        others = stream.paged.copy()
+        others[columns] = False
+        refills.append(("fetch", len(columns), depth,
+                        stream._first_rows.size + int(stream.depth[others].sum()) + depth * len(columns)))
+        return top_candidates(masked(scores, columns, handed_out), depth)
+
+    def scan(columns, start, handed_out):
+        stop = min(start + SCAN_BLOCK, VOCABULARY_SIZE)
+        refills.append(("scan", len(columns), stop - start, None))
+        return np.arange(start, stop), masked(scores[start:stop], columns, handed_out, start).T, stop
+
+    stream = CandidateStream([(f"word{i}",) for i in range(N_COMBINATIONS)], *top_candidates(scores, FIRST_DEPTH),
+                             FIRST_DEPTH, VOCABULARY_SIZE, FIRST, fetch, max_bytes=max_bytes,
+                             scan=scan if with_scan else None)
+    return stream, refills
+
+
+def drain(stream: CandidateStream) -> list:
+    """Pulls every clue of stream, as EmbeddingScorer.advance would if no combination were ever skipped, checking
+    that none exceeds the upper bound of its combination.
+
+    :return: Rows handed out per combination
+    """
+    pulled = [[] for _ in range(len(stream))]
+    while True:
+        empty = np.flatnonzero((stream.remaining == 0) & ~stream.complete)
+        if len(empty):
+            stream.refill(empty)
+        columns = np.flatnonzero(stream.remaining > 0)
+        if not len(columns):
+            if not len(empty):
+                return pulled
+            continue
+        bounds = stream.upper_bounds()
+        guesses = stream.pull(columns)
+        assert (guesses.similarity <= bounds[guesses.combination_ids]).all()
+        for column, row in zip(guesses.combination_ids.tolist(), guesses.clue_rows.tolist()):
+            pulled[column].append(row)
+
+
+def assert_hands_out_every_clue_once(pulled: list, scores: np.array):
+    for column, rows in enumerate(pulled):
+        assert sorted(rows) == np.flatnonzero(np.isfinite(scores[:, column])).tolist()
+
+
+@pytest.mark.parametrize("max_bytes, with_scan", [(None, True), (MAX_BYTES, True), (MAX_BYTES, False)])
+def test_hands_out_every_clue_once(scores, max_bytes, with_scan):
+    stream, _ = make_stream(scores, max_bytes, with_scan)
+    assert_hands_out_every_clue_once(drain(stream), scores)
+    assert stream.complete.all() and (stream.upper_bounds() == -np.inf).all()
+
+
+def test_refills_go_deeper_without_max_bytes(scores):
+    stream, refills = make_stream(scores)
+    drain(stream)
+    depths = [depth for _, _, depth, _ in refills]
+    assert {kind for kind, _, _, _ in refills} == {"fetch"}
+    assert depths == sorted(depths) and depths[0] == 4 * FIRST_DEPTH and depths[-1] == VOCABULARY_SIZE
+
+
+def test_buffers_stay_within_max_bytes_then_scan(scores):
+    stream, refills = make_stream(scores, MAX_BYTES)
+    drain(stream)
+    fetched = [refill for refill in refills if refill[0] == "fetch"]
+    assert fetched and all(_FETCH_OVERHEAD * ITEM_BYTES * buffered <= MAX_BYTES for _, _, _, buffered in fetched)
+    assert max(depth for _, _, depth, _ in fetched) == 4 * FIRST_DEPTH
+    # Past max_bytes, every combination scans the vocabulary once in blocks instead
+    scanned = [refill for refill in refills if refill[0] == "scan"]
+    assert sum(n_columns * depth for _, n_columns, depth, _ in scanned) == N_COMBINATIONS * VOCABULARY_SIZE
+    assert max(depth for _, _, depth, _ in scanned) <= SCAN_BLOCK
+
+
+def test_refills_without_scan_stay_within_max_bytes(scores):
+    stream, refills = make_stream(scores, MAX_BYTES, with_scan=False)
+    drain(stream)
+    assert all(_FETCH_OVERHEAD * ITEM_BYTES * buffered <= MAX_BYTES or depth == FIRST
+               for _, _, depth, buffered in refills)
+
+
+def test_restart_hands_out_the_same_clues(scores):
+    stream, _ = make_stream(scores, MAX_BYTES)
+    first = drain(stream.restart())
+    assert drain(stream.restart()) == first == drain(stream)
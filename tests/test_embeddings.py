@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pytest
+
+from bot import utils
+from bot.embeddings import EmbeddingMatrix
+from bot.utils import EmbeddingsDataLoader, get_embeddings_glove_style
+
+TEXT = "cat 1 2 3\ndog 4 5 6\nfish 7 8 9\n"
+
+
+@pytest.fixture
+def embedding_path(tmp_path) -> str:
+    path = tmp_path / "embeddings.txt"
+    path.write_text(TEXT)
+    return str(path)
+
+
+def test_save_load_round_trip(tmp_path):
+    embeddings = EmbeddingMatrix.from_dict({"cat": np.ones(3), "dog": np.zeros(3)})
+    embeddings.save(str(tmp_path / "cache"), source_sha256="abc")
+    loaded = EmbeddingMatrix.load(str(tmp_path / "cache"))
+    assert loaded.words.tolist() == ["cat", "dog"]
+    np.testing.assert_array_equal(loaded.vectors, embeddings.vectors)
+    assert loaded.source_sha256 == "abc"
+
+
+@pytest.mark.parametrize("vocabulary", [["zzz"], []])
+def test_empty_vocabulary_loads_empty(embedding_path, vocabulary):
+    loader = EmbeddingsDataLoader(embedding_path)
+    for _ in range(2):
+        # Parsed, then loaded from the cache
+        embeddings = loader.get_embeddings(get_embeddings_glove_style, "test", vocabulary=vocabulary)
+        assert len(embeddings) == len(embeddings.vectors) == 0
+        assert embeddings.index == {}
+
+
+def test_cache_is_checksummed_once_after_source_is_touched(embedding_path, monkeypatch):
+    loader = EmbeddingsDataLoader(embedding_path)
+    loader.get_embeddings(get_embeddings_glove_style, "test")
+    # Same contents, new mtime
+    stat = os.stat(embedding_path)
+    os.utime(embedding_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    checksums, file_checksum = [], utils.file_checksum
+    monkeypatch.setattr(utils, "file_checksum", lambda path: checksums.append(path) or file_checksum(path))
+    for _ in range(2):
+        embeddings = loader.get_embeddings(get_embeddings_glove_style, "test")
+        assert embeddings.words.tolist() == ["cat", "dog", "fish"]
+    assert len(checksums) == 1
+
+
+def test_cache_is_rebuilt_when_source_changes(embedding_path):
+    loader = EmbeddingsDataLoader(embedding_path)
+    loader.get_embeddings(get_embeddings_glove_style, "test")
+    with open(embedding_path, "w") as file:
+        file.write(TEXT.replace("dog 4 5 6", "cow 4 5 6"))
+    assert loader.get_embeddings(get_embeddings_glove_style, "test").words.tolist() == ["cat", "cow", "fish"]
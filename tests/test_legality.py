@@ -0,0 +1,55 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from bot.legality import LegalityIndex
+from bot.scorer import EmbeddingScorer
+
+
+@pytest.fixture(scope="module")
+def words() -> np.array:
+    """Short words, their compounds, and words with multi-byte characters, some longer than the suffixes kept."""
+    rng = np.random.default_rng(0)
+    short = ["".join(letters) for letters in itertools.product("abc", repeat=2)] + ["é", "aé", "éclair", "naïve"]
+    compounds = ["".join(rng.choice(short, rng.integers(2, 5))) for _ in range(300)]
+    return np.array(list(dict.fromkeys(short + compounds + ["ab" * 20, "café" * 5])))
+
+
+def queries(words: np.array) -> list:
+    return words[::7].tolist() + ["ca", "abcabcabcabcabcabc", "éé", "unknown", "ïv", "b" * 30]
+
+
+@pytest.mark.parametrize("max_suffix_bytes", [16, 4, 1])
+def test_matches_scorer_checks(words, max_suffix_bytes):
+    index = LegalityIndex(words, max_suffix_bytes=max_suffix_bytes, cache_size=8)
+    for word in queries(words):
+        expected = np.flatnonzero(EmbeddingScorer._check_all_legal(words, [word])[:, 0])
+        # Twice, the second time from the cache
+        for _ in range(2):
+            np.testing.assert_array_equal(index.illegal_rows(word), expected)
+
+
+def test_illegal_rows_are_read_only(words):
+    with pytest.raises(ValueError):
+        LegalityIndex(words).illegal_rows("ab")[0] = 0
+
+
+def test_combination_mask_matches_scorer_checks(words):
+    index = LegalityIndex(words)
+    board = ["ab", "ca", "éclair", "unknown"]
+    combinations = [combination for size in range(1, len(board) + 1)
+                    for combination in itertools.combinations(range(len(board)), size)]
+    membership = np.array([[position in combination for combination in combinations]
+                           for position in range(len(board))])
+    rows, masked = index.combination_mask(board, membership)
+    illegal = EmbeddingScorer._check_all_legal(words, board)
+    expected = (illegal.astype(int) @ membership.astype(int)) > 0
+    np.testing.assert_array_equal(rows, np.flatnonzero(expected.any(axis=1)))
+    np.testing.assert_array_equal(masked, expected[rows])
+    np.testing.assert_array_equal(index.illegal_mask(board), illegal.any(axis=1))
+
+
+def test_empty_vocabulary():
+    index = LegalityIndex(np.array([], dtype=str))
+    assert len(index) == 0 and len(index.illegal_rows("ab")) == 0
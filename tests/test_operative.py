@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from bot import Cosine, DotProduct
+from bot.embeddings import EmbeddingMatrix
+from bot.guess import Guess
+from bot.utils import np_cosine
+from codenames.guess import EmbeddingOperative
+from codenames.simulator import GameBatch
+
+WORDS = [f"{first}{second}" for first in "abcdefgh" for second in "abcdefgh"]
+SIMILARITIES = {Cosine: np_cosine, DotProduct: np.dot}
+
+
+@pytest.fixture(scope="module")
+def model() -> EmbeddingMatrix:
+    rng = np.random.default_rng(0)
+    return EmbeddingMatrix.from_dict({word: rng.normal(size=8) for word in WORDS}, dtype=np.float64)
+
+
+def decode_one_by_one(model: EmbeddingMatrix, metric, threshold: float, clue: str, board: list, number: int) -> list:
+    """Ranks the board's words by similarity to the clue one word at a time."""
+    if clue not in model.index:
+        return []
+    similarity = SIMILARITIES[metric]
+    ranked = sorted((word for word in board if word in model.index),
+                    key=lambda word: -similarity(model.vectors[model.index[clue]], model.vectors[model.index[word]]))
+    guessed = []
+    for word in ranked[:number]:
+        if guessed and threshold is not None and \
+                similarity(model.vectors[model.index[clue]], model.vectors[model.index[word]]) < threshold:
+            break
+        guessed.append(word)
+    return guessed
+
+
+@pytest.mark.parametrize("metric, threshold", [(Cosine, None), (Cosine, .2), (DotProduct, None), (DotProduct, 1.)])
+def test_decode_many_matches_one_by_one(model, metric, threshold):
+    rng = np.random.default_rng(1)
+    operative = EmbeddingOperative(model, metric, threshold)
+    clues, boards, numbers = [], [], []
+    for _ in range(50):
+        # Boards of different sizes, some with words and clues without an embedding
+        board = rng.choice(WORDS, rng.integers(1, 12), replace=False).tolist() + ["unknown"] * rng.integers(0, 2)
+        clues.append(str(rng.choice(WORDS + ["unknown"])))
+        boards.append(board)
+        numbers.append(int(rng.integers(0, 5)))
+    assert operative.decode_many(clues, boards, numbers) == \
+        [decode_one_by_one(model, metric, threshold, clue, board, number)
+         for clue, board, number in zip(clues, boards, numbers)]
+    assert operative.decode(clues[0], boards[0], numbers[0]) == \
+        decode_one_by_one(model, metric, threshold, clues[0], boards[0], numbers[0])
+
+
+def test_decode_many_without_clues(model):
+    assert EmbeddingOperative(model).decode_many([], [], []) == []
+    assert EmbeddingOperative(model).decode_many(["aa"], [[]], [3]) == [[]]
+
+
+def test_guesses_unrevealed_words_of_games(model):
+    games = GameBatch.random(WORDS, 20, seed=0)
+    games.revealed[:, ::3] = True
+    operative = EmbeddingOperative(model, threshold=.1)
+    game_ixs = np.arange(1, 20, 2)
+    clues = [None if ix % 3 == 0 else Guess(clue=WORDS[ix], similarity=1., linked_words=["x"] * (ix % 4 + 1),
+                                            score=1.) for ix in game_ixs.tolist()]
+    positions = operative.guess(games, game_ixs, clues)
+    for game_ix, clue, game_positions in zip(game_ixs.tolist(), clues, positions.tolist()):
+        board = games.vocabulary[games.words[game_ix]].tolist()
+        hidden = [word for word, revealed in zip(board, games.revealed[game_ix]) if not revealed]
+        expected = [] if clue is None else \
+            decode_one_by_one(model, Cosine, .1, clue.clue, hidden, clue.num_words_linked)
+        assert [board[position] for position in game_positions if position >= 0] == expected
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from bot.embeddings import EmbeddingMatrix
+from bot.parsing import parse_embeddings
+from bot.utils import get_embeddings_glove_style, get_embeddings_paragram_style, get_embeddings_postspec_style
+
+PARSERS = {"glove": get_embeddings_glove_style, "postspec": get_embeddings_postspec_style,
+           "paragram": get_embeddings_paragram_style}
+
+
+def embeddings_text(style: str) -> str:
+    """Lines of every style's quirks: words its parser skips, and a repeated word (whose vector is the last one
+    read, in the row of the first)."""
+    rng = np.random.default_rng(0)
+    words = [f"word{letter}" if style != "glove" else f"word{letter}" * 2 for letter in "abcdefghijklmnopqrst"]
+    words += [words[3], "with-dash", words[7]]
+    lines = []
+    for word in words:
+        if style == "postspec":
+            word = f"de_{word}" if word == "with-dash" else f"en_{word}"
+        lines.append(" ".join([word] + [f"{value:.6f}" for value in rng.normal(size=4)]))
+    if style == "paragram":
+        lines.insert(0, f"{len(words)} 4")
+    return "\n".join(lines) + "\n"
+
+
+@pytest.fixture(params=list(PARSERS))
+def style_path(request, tmp_path) -> tuple:
+    path = tmp_path / f"{request.param}.txt"
+    path.write_text(embeddings_text(request.param))
+    return request.param, str(path)
+
+
+def assert_same_embeddings(actual: EmbeddingMatrix, expected: EmbeddingMatrix):
+    assert actual.words.tolist() == expected.words.tolist()
+    np.testing.assert_array_equal(actual.vectors, expected.vectors)
+    assert actual.vectors.dtype == expected.vectors.dtype
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+# Small chunks so the file is parsed in many ranges
+@pytest.mark.parametrize("chunk_bytes", [2 ** 23, 64])
+def test_matches_dict_parsers(style_path, workers, chunk_bytes):
+    style, path = style_path
+    expected = EmbeddingMatrix.from_dict(PARSERS[style](path))
+    assert_same_embeddings(parse_embeddings(path, style, workers=workers, chunk_bytes=chunk_bytes), expected)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_keeps_only_vocabulary(style_path, workers):
+    style, path = style_path
+    embeddings = PARSERS[style](path)
+    kept = list(embeddings)[::3]
+    expected = EmbeddingMatrix.from_dict({word: embeddings[word] for word in kept}, dtype=np.float64)
+    assert_same_embeddings(parse_embeddings(path, style, keep=kept + ["unknown"], dtype=np.float64,
+                                            workers=workers, chunk_bytes=64), expected)
+    assert_same_embeddings(parse_embeddings(path, style, keep=set(kept).__contains__, dtype=np.float64,
+                                            workers=1, chunk_bytes=64), expected)
+
+
+def test_writes_output_file(style_path, tmp_path):
+    style, path = style_path
+    output_path = str(tmp_path / "vectors.npy")
+    parsed = parse_embeddings(path, style, workers=1, output_path=output_path, chunk_bytes=64)
+    assert_same_embeddings(parsed, EmbeddingMatrix.from_dict(PARSERS[style](path)))
+    np.testing.assert_array_equal(np.load(output_path), parsed.vectors)
+
+
+def test_rejects_unknown_style(style_path):
+    with pytest.raises(ValueError):
+        parse_embeddings(style_path[1], "word2vec")
+
+
+def test_rejects_ragged_lines(tmp_path):
+    path = tmp_path / "ragged.txt"
+    path.write_text("cat 1 2 3\ndog 4 5\n")
+    with pytest.raises(ValueError):
+        parse_embeddings(str(path), workers=1)
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from bot import MeanIndividualDistance
+from bot.embeddings import EmbeddingMatrix
+from bot.quantization import QUANTIZED_DTYPES, QuantizedMatrix
+
+N = 5
+
+
+@pytest.fixture(scope="module")
+def model() -> EmbeddingMatrix:
+    rng = np.random.default_rng(0)
+    words = [f"{first}{second}{third}" for first in "abcdefghijklm" for second in "abcdefghijklm"
+             for third in "abcdefghijklm"]
+    embeddings = EmbeddingMatrix.from_dict({word: rng.normal(size=16) for word in words})
+    embeddings.source_sha256 = "source"
+    return embeddings
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float16", 1e-3), ("int8", 2e-2)])
+def test_dot_products_approximate_full_precision(model, dtype, tolerance):
+    # Blocks smaller than the vocabulary, so rows are quantized and converted in several
+    quantized = QuantizedMatrix.from_embeddings(model, dtype, block_rows=1000)
+    assert quantized.dtype == np.dtype(dtype) and len(quantized) == len(model)
+    queries = model.vectors[:3]
+    exact = model.vectors @ queries.T
+    approximate = quantized.dot_products(queries, chunk_rows=512)
+    scale = np.linalg.norm(model.vectors, axis=1)[:, None] * np.linalg.norm(queries, axis=1)
+    assert np.abs(approximate - exact).max(initial=0) <= tolerance * scale.max()
+    np.testing.assert_allclose(quantized.dot_products(queries, 100, 300), approximate[100:300])
+    np.testing.assert_array_equal(quantized.sq_norms, model.sq_norms)
+
+
+def test_zero_rows_quantize_to_zero():
+    embeddings = EmbeddingMatrix.from_dict({"cat": np.zeros(4), "dog": np.ones(4)})
+    quantized = QuantizedMatrix.from_embeddings(embeddings, "int8")
+    np.testing.assert_array_equal(quantized.dot_products(np.ones((1, 4)))[:, 0], [0, 4])
+
+
+def test_rejects_unknown_dtype(model):
+    with pytest.raises(ValueError):
+        QuantizedMatrix.from_embeddings(model, "int4")
+
+
+@pytest.mark.parametrize("dtype", QUANTIZED_DTYPES)
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_load_round_trip(model, tmp_path, dtype, mmap):
+    path = QuantizedMatrix.cache_path(str(tmp_path / "embeddings.txt"), model, dtype)
+    quantized = QuantizedMatrix.from_embeddings(model, dtype)
+    quantized.save(path)
+    loaded = QuantizedMatrix.load(path, model, dtype, mmap=mmap)
+    np.testing.assert_array_equal(loaded.vectors, quantized.vectors)
+    np.testing.assert_array_equal(loaded.sq_norms, quantized.sq_norms)
+    np.testing.assert_array_equal(loaded.dot_products(model.vectors[:2]), quantized.dot_products(model.vectors[:2]))
+    assert loaded.nbytes == quantized.nbytes
+
+
+def test_load_rejects_other_embeddings(model, tmp_path):
+    path = str(tmp_path / "quantized")
+    assert QuantizedMatrix.load(path, model, "int8") is None
+    QuantizedMatrix.from_embeddings(model, "int8").save(path)
+
+    other_source = EmbeddingMatrix(vectors=model.vectors, words=model.words)
+    other_source.source_sha256 = "other source"
+    other_vocabulary = EmbeddingMatrix(vectors=model.vectors, words=model.words[::-1].copy())
+    other_vocabulary.source_sha256 = model.source_sha256
+    unknown_source = EmbeddingMatrix(vectors=model.vectors, words=model.words)
+    for embeddings in (other_source, other_vocabulary, unknown_source):
+        assert QuantizedMatrix.load(path, embeddings, "int8") is None
+    assert QuantizedMatrix.load(path, model, "float16") is None
+    assert QuantizedMatrix.load(path, model, "int8") is not None
+
+
+@pytest.mark.parametrize("dtype", QUANTIZED_DTYPES)
+def test_reranked_solutions_are_exact_and_recalled(model, dtype):
+    exact = MeanIndividualDistance(model, .1)
+    quantized = MeanIndividualDistance(model, .1, quantized=QuantizedMatrix.from_embeddings(model, dtype))
+    rng = np.random.default_rng(1)
+    recalled = 0
+    for _ in range(5):
+        words = rng.choice(model.words, 6, replace=False).tolist()
+        expected = exact.solve(words[:4], words[4:], N)
+        # Every solution is scored in full precision, as the exact solver would score it
+        exact_scores = {(guess.clue, tuple(guess.linked_words)): guess.score
+                        for guess in exact.solve(words[:4], words[4:], len(model))}
+        guesses = quantized.solve(words[:4], words[4:], N)
+        assert len(guesses) == len(expected)
+        for guess in guesses:
+            assert guess.score == pytest.approx(exact_scores[(guess.clue, tuple(guess.linked_words))])
+        recalled += len({(guess.clue, tuple(guess.linked_words)) for guess in guesses} &
+                        {(guess.clue, tuple(guess.linked_words)) for guess in expected})
+    assert recalled >= .9 * 5 * N
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from bot.guess import Guess
+from bot.service import SolverService
+
+
+class EchoSolver:
+    """Answers each board with one guess linking its words to hit, once released."""
+    def __init__(self):
+        self.released = threading.Event()
+        self.released.set()
+        self.batches = []
+
+    def solve_many(self, boards: list, n: int = 10) -> list:
+        self.released.wait()
+        self.batches.append(len(boards))
+        return [[Guess(clue="clue", similarity=1., linked_words=board["words_to_hit"], score=1.)][:n]
+                for board in boards]
+
+
+def route(service: SolverService, body, method: str = "POST", path: str = "/solve") -> tuple:
+    return service._route(method, path, json.dumps(body).encode("utf-8"))
+
+
+def run(test, **kwargs):
+    """Runs test(service, solver) with a started service."""
+    async def main():
+        solver = EchoSolver()
+        service = SolverService({"echo": solver}, **kwargs)
+        service.start()
+        try:
+            return await test(service, solver)
+        finally:
+            solver.released.set()
+            await service.close()
+    return asyncio.run(main())
+
+
+def test_solve():
+    async def test(service, solver):
+        status, response = await route(service, {"words_to_hit": ["cat", "dog"], "words_to_avoid": ["fish"]})
+        assert status == 200
+        assert response["guesses"][0]["linked_words"] == ["cat", "dog"]
+    run(test)
+
+
+def test_concurrent_requests_are_coalesced():
+    async def test(service, solver):
+        results = await asyncio.gather(*[route(service, {"words_to_hit": [f"word{i}"]}) for i in range(8)])
+        assert [response["guesses"][0]["linked_words"] for _, response in results] == \
+            [[f"word{i}"] for i in range(8)]
+        assert solver.batches == [8]
+    run(test, max_wait=.05)
+
+
+@pytest.mark.parametrize("body", [
+    {"words_to_hit": "cat"},
+    {"words_to_hit": ["cat", 1]},
+    {"words_to_hit": ["cat"], "words_to_avoid": "dog"},
+    {"words_to_hit": ["cat"], "n": "many"},
+    {"words_to_hit": ["cat"], "solver": "unknown"},
+    {"words_to_avoid": ["cat"]},
+    ["cat"],
+])
+def test_bad_requests(body):
+    async def test(service, solver):
+        status, response = await route(service, body)
+        assert status == 400
+        assert solver.batches == []
+    run(test)
+
+
+def test_rejects_when_queue_is_full():
+    async def test(service, solver):
+        solver.released.clear()
+        # Taken by the batcher, which then waits on the solver
+        first = asyncio.ensure_future(route(service, {"words_to_hit": ["a"]}))
+        await asyncio.sleep(.05)
+        queued = asyncio.ensure_future(route(service, {"words_to_hit": ["b"]}))
+        await asyncio.sleep(0)
+        status, _ = await route(service, {"words_to_hit": ["c"]})
+        assert status == 503
+        assert service.stats["rejected"] == 1
+        solver.released.set()
+        assert [(await first)[0], (await queued)[0]] == [200, 200]
+    run(test, max_queue=1, max_wait=0.)
+
+
+@pytest.mark.parametrize("method, path, status", [("GET", "/health", 200), ("GET", "/stats", 200),
+                                                  ("GET", "/solve", 405), ("GET", "/unknown", 404)])
+def test_routes(method, path, status):
+    async def test(service, solver):
+        assert (await route(service, None, method, path))[0] == status
+    run(test)
@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+from bot import MeanIndividualDistance
+from bot.embeddings import EmbeddingMatrix
+from bot.guess import Guess
+from codenames.board import Board, BoardFactory
+from codenames.colours import Colour
+from codenames.game import Game
+from codenames.simulator import GameBatch, SimulationResult, Simulator
+
+WORDS = [f"{first}{second}" for first in "abcdefgh" for second in "abcdefgh"]
+
+
+class ScriptedSpymaster:
+    """Clues the first `per_clue` words to hit of every board, or nothing when `passes`."""
+    def __init__(self, per_clue: int = 2, passes: bool = False):
+        self.per_clue = per_clue
+        self.passes = passes
+
+    def solve_many(self, boards: list, n: int = 10) -> list:
+        if self.passes:
+            return [[] for _ in boards]
+        return [[Guess(clue="clue", similarity=1., linked_words=board["words_to_hit"][:self.per_clue], score=1.)]
+                for board in boards]
+
+
+def test_reveal_matches_game_win_checks():
+    """Random guesses played on a GameBatch and, one game at a time, on Game, which checks wins word by word."""
+    rng = np.random.default_rng(0)
+    games = GameBatch.random(WORDS, 200, seed=0)
+    reference = [Game(words=None, word_colours=colours.reshape(5, 5).astype(float), state=np.zeros((5, 5)))
+                 for colours in games.colours]
+    for turn in range(12):
+        team = (Colour.RED, Colour.BLUE)[turn % 2]
+        positions = np.stack([rng.permutation(25)[:4] for _ in range(len(games))])
+        positions[rng.random(positions.shape) < .1] = -1
+        playing = np.flatnonzero(~games.finished)
+        revealed = games.reveal(playing, positions[playing], team)
+        for game_ix, n_revealed in zip(playing.tolist(), revealed.tolist()):
+            game = reference[game_ix]
+            expected = 0
+            for position in positions[game_ix].tolist():
+                x, y = divmod(position, 5)
+                if position < 0 or game.state[x, y] != 0:
+                    break
+                expected += 1
+                if game.guess(x, y, team) != team or game._is_finished():
+                    break
+            assert n_revealed == expected
+    for game, game_ix in zip(reference, range(len(games))):
+        np.testing.assert_array_equal(games.revealed[game_ix], game.state.ravel() != 0)
+        winners = [team for team in (Colour.RED, Colour.BLUE) if game._check_if_player_has_won(team)]
+        assert [games.winner[game_ix]] == winners or (games.winner[game_ix] == 0 and not winners)
+        assert games.bomb[game_ix] == (game.landed_on_bomb() is not None)
+    assert games.finished.any() and games.bomb.any()
+
+
+def test_boards_show_unrevealed_words():
+    games = GameBatch.random(WORDS, 3, seed=1)
+    games.revealed[:, :5] = True
+    for board, game_words, colours in zip(games.boards(np.arange(3), Colour.RED), games.vocabulary[games.words],
+                                          games.colours):
+        assert board["words_to_hit"] == [word for word, colour in zip(game_words[5:], colours[5:])
+                                         if colour == Colour.RED]
+        assert sorted(board["words_to_hit"] + board["words_to_avoid"]) == sorted(game_words[5:])
+
+
+def test_perfect_clues_win_on_the_first_turn():
+    games = GameBatch.random(WORDS, 10, seed=0)
+    result = Simulator(ScriptedSpymaster(per_clue=25), batch_size=3).play(games)
+    assert (games.winner == Colour.RED).all() and (games.turns == 1).all()
+    summary = result.summary()
+    assert summary["red_win_rate"] == 1 and summary["guess_accuracy"] == 1 and summary["words_per_clue"] == 9
+
+
+def test_clues_of_two_words_take_turns():
+    games = GameBatch.random(WORDS, 10, seed=0)
+    result = Simulator(ScriptedSpymaster(per_clue=2)).play(games)
+    # Blue clears its 8 words in 4 turns (turn 8), before red clears its 9 in 5 (turn 9)
+    assert (games.winner == Colour.BLUE).all() and (result.winner_turns == 4).all() and (games.turns == 8).all()
+    assert result.clues == 10 * 8 and result.words_revealed == result.own_words_revealed == 10 * 16
+
+
+def test_games_without_clues_stall():
+    games = GameBatch.random(WORDS, 4, seed=0)
+    result = Simulator(ScriptedSpymaster(passes=True)).play(games)
+    assert games.stalled.all() and (games.turns == 2).all() and result.passes == 8
+    assert result.summary()["stalled_rate"] == 1
+
+
+def test_merged_results_count_every_game():
+    factory = BoardFactory(WORDS, seed=2)
+    simulator = Simulator(ScriptedSpymaster())
+    results = [simulator.play(GameBatch.from_factory(factory, start, start + 5)) for start in (0, 5)]
+    merged = SimulationResult.merge(results)
+    whole = simulator.play(GameBatch.from_factory(factory, 0, 10))
+    np.testing.assert_array_equal(merged.games.words, whole.games.words)
+    assert {key: value for key, value in merged.summary().items() if key != "games_per_second"} == \
+        {key: value for key, value in whole.summary().items() if key != "games_per_second"}
+
+
+def test_self_play_with_a_solver():
+    rng = np.random.default_rng(0)
+    model = EmbeddingMatrix.from_dict({word: rng.normal(size=16) for word in WORDS})
+    board = Board(board_size_x=3, board_size_y=3, n_board_words_red=3, n_board_words_blue=2, n_board_words_grey=3)
+    games = GameBatch.random(WORDS, 20, board=board, seed=0)
+    result = Simulator(MeanIndividualDistance(model, .1), max_turns=20).play(games)
+    assert (games.finished | games.stalled).all()
+    # The operative only guesses the intended words, so it never reveals the black word
+    assert result.summary()["guess_accuracy"] == 1 and not games.bomb.any()
+    for game_ix in np.flatnonzero(games.finished):
+        assert games.remaining(games.winner[game_ix], np.array([game_ix]))[0] == 0
+
+
+@pytest.mark.parametrize("batch_size", [1, 7])
+def test_batch_size_doesnt_change_games(batch_size):
+    games = GameBatch.random(WORDS, 10, seed=3)
+    expected = GameBatch.random(WORDS, 10, seed=3)
+    Simulator(ScriptedSpymaster(per_clue=3), batch_size=batch_size).play(games)
+    Simulator(ScriptedSpymaster(per_clue=3)).play(expected)
+    np.testing.assert_array_equal(games.revealed, expected.revealed)
+    np.testing.assert_array_equal(games.winner, expected.winner)
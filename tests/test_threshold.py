@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from bot import MeanIndividualDistance, Cosine
+from bot.threshold import CalibrationTable, Threshold, ThresholdTable
+
+DATA = os.path.join(os.path.dirname(__file__), os.pardir, "data")
+PARAMS_PATH = os.path.join(DATA, "params.csv")
+CALIBRATION_PATH = os.path.join(DATA, "all_param_data.csv")
+
+
+def test_thresholds_match_pandas():
+    pd = pytest.importorskip("pandas")
+    params = pd.read_csv(PARAMS_PATH, float_precision="round_trip")
+    table = ThresholdTable.for_path(PARAMS_PATH)
+    for _, row in params.iterrows():
+        expected = params[(params["model"] == row["model"]) & (params["distance"] == row["distance"]) &
+                          (params["algorithm"] == row["algorithm"]) & (params["strategy"] == row["strategy"])]
+        assert table.get(row["model"], row["distance"], row["algorithm"], row["strategy"]) == \
+            expected["threshold"].iloc[0]
+    assert table.get("unknown", "Cosine", "MeanIndividualDistance", "risky") is None
+
+
+def test_calibration_matches_pandas():
+    pd = pytest.importorskip("pandas")
+    data = pd.read_csv(CALIBRATION_PATH, float_precision="round_trip")
+    data["model"] = data["model"].map(CalibrationTable.model_name)
+    table = CalibrationTable.for_path(CALIBRATION_PATH)
+    for (model, distance, algorithm), group in data.groupby(["model", "distance", "algorithm"]):
+        expected = group.sort_values("n", kind="stable")[["n", "mean", "count", "word_proportion"]]
+        assert table.get(model, distance, algorithm) == expected.to_dict("records")
+        for row in expected.to_dict("records"):
+            assert table.word_proportion(model, distance, algorithm, row["n"]) == \
+                expected[expected["n"] == row["n"]]["word_proportion"].iloc[0]
+    assert table.get("unknown", "Cosine", "MeanIndividualDistance") == []
+
+
+def test_tables_are_shared_per_class_and_path():
+    assert ThresholdTable.for_path(PARAMS_PATH) is ThresholdTable.for_path(os.path.abspath(PARAMS_PATH))
+    assert CalibrationTable.for_path(PARAMS_PATH) is not ThresholdTable.for_path(PARAMS_PATH)
+
+
+def test_table_is_parsed_again_when_file_changes(tmp_path):
+    path = tmp_path / "params.csv"
+    path.write_text("distance,model,algorithm,strategy,threshold\nCosine,glove,MeanIndividualDistance,risky,0.3\n"
+                    "Cosine,glove,MeanIndividualDistance,risky,0.9\n")
+    table = ThresholdTable.for_path(str(path))
+    assert table.get("glove", "Cosine", "MeanIndividualDistance", "risky") == .3
+    path.write_text("distance,model,algorithm,strategy,threshold\nCosine,glove,MeanIndividualDistance,risky,0.5\n")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert table.get("glove", "Cosine", "MeanIndividualDistance", "risky") == .5
+
+
+def test_threshold_from_config(tmp_path):
+    path = tmp_path / "params.csv"
+    path.write_text("distance,model,algorithm,strategy,threshold\nCosine,glove,MeanIndividualDistance,safe,0.6\n")
+    assert Threshold.from_config("glove", Cosine, "safe", MeanIndividualDistance, str(path)).threshold == .6
+    assert Threshold.from_config("glove", Cosine, "risky", MeanIndividualDistance, str(path)).threshold == .3
+    assert Threshold.from_config("glove", Cosine, "safe", MeanIndividualDistance, None, .2).threshold == .2